@@ -0,0 +1,101 @@
+"""
+Per-frame cost of the RGB -> photoreceptor excitation step.
+
+Compares the batched transform engine against the original per-pixel pysilsub loop.
+The loop is timed on a small patch and extrapolated to the full frame.
+
+    python -m benchmarks.bench_excitation --width 1920 --height 1080
+"""
+import argparse
+import time
+
+import numpy as np
+
+from model.utils.excitation_engine import (
+    apply_excitation_transform,
+    clear_transform_cache,
+    get_excitation_transform,
+)
+
+
+def legacy_excitation_loop(image: np.ndarray) -> np.ndarray:
+    """
+    The per-pixel implementation that compute_photoreceptor_excitation used to run.
+
+    Melanopsin is ignored as well so the problem validates with current pysilsub
+    releases.
+    """
+    from pysilsub.observers import ColorimetricObserver
+    from pysilsub.problems import SilentSubstitutionProblem
+
+    observer = ColorimetricObserver(age=32, field_size=10)
+    ssp = SilentSubstitutionProblem.from_package_data('STLAB_1_York')
+    ssp.observer = observer
+    ssp.ignore = ['rh', 'mel']
+    ssp.silence = ['mc', 'lc']
+    ssp.target = ['sc']
+    ssp.target_contrast = 0.2
+    ssp.background = [0.5] * ssp.nprimaries
+
+    height, width, _ = image.shape
+    excitations = np.zeros((height, width, len(ssp.observer.photoreceptors)))
+    for x in range(height):
+        for y in range(width):
+            try:
+                excitations[x, y] = ssp.linalg_solve()
+            except Exception:
+                excitations[x, y] = np.zeros(len(ssp.observer.photoreceptors))
+    return excitations
+
+
+def _best_of(fn, repeats):
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark RGB -> photoreceptor excitation."
+    )
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument(
+        "--patch", type=int, default=8, help="Patch side used to time the legacy loop"
+    )
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    frame = rng.random((args.height, args.width, 3))
+    n_pixels = args.height * args.width
+
+    clear_transform_cache()
+    start = time.perf_counter()
+    transform = get_excitation_transform()
+    first_call = time.perf_counter() - start
+    engine = _best_of(
+        lambda: apply_excitation_transform(frame, transform), args.repeats
+    )
+    frame32 = frame.astype(np.float32)
+    engine32 = _best_of(
+        lambda: apply_excitation_transform(frame32, transform), args.repeats
+    )
+
+    patch = frame[:args.patch, :args.patch]
+    legacy_patch = _best_of(lambda: legacy_excitation_loop(patch), 1)
+    legacy = legacy_patch * n_pixels / patch.shape[0] / patch.shape[1]
+
+    print(f"Frame {args.width}x{args.height} ({n_pixels} pixels)")
+    print(f"  transform lookup (first call):  {first_call * 1e3:10.1f} ms")
+    print(f"  engine, float64:                {engine * 1e3:10.1f} ms/frame")
+    print(f"  engine, float32:                {engine32 * 1e3:10.1f} ms/frame")
+    print(f"  legacy loop (extrapolated):     {legacy:10.1f} s/frame")
+    print(f"  speedup:                        {legacy / engine:10.0f}x")
+
+
+if __name__ == "__main__":
+    main()
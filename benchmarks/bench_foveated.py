@@ -0,0 +1,76 @@
+"""
+Foveated (masked) kinetics against the full frame, as a function of fovea_radius.
+
+The full path multiplies every frame by the cone density map and runs AfterimageState;
+the foveated path integrates only the region where the density exceeds
+density_threshold(). Times are per frame after `--warmup` frames (the first frame also
+builds the density map); the difference is the largest afterimage difference.
+
+    python -m benchmarks.bench_foveated --width 1920 --height 1080 --radii 100 400
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from model.core.anatomical import apply_anatomical_constraints, get_cone_density_map
+from model.processing.afterimage_batch import AfterimageState
+from model.processing.foveated import FoveatedAfterimageState
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark foveated kinetics against the full frame."
+    )
+    parser.add_argument("--width", type=int, default=3840)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument(
+        "--radii", type=float, nargs="+", default=[50, 100, 200, 400, 800]
+    )
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--frames", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    frames = [
+        cv2.resize(
+            rng.integers(0, 256, (9, 32, 3), dtype=np.uint8),
+            (args.width, args.height),
+            interpolation=cv2.INTER_CUBIC,
+        )
+        for _ in range(args.warmup + args.frames)
+    ]
+    center = (args.width // 2, args.height // 2)
+
+    print(f"{args.width}x{args.height}, fovea at {center}")
+    print(
+        f"{'radius':>7} {'region':>7} {'full ms':>8} {'fovea ms':>9} {'speedup':>8} "
+        f"{'max diff':>9}"
+    )
+    for radius in args.radii:
+        density = get_cone_density_map(frames[0].shape[:2], center, radius)[..., None]
+        full = AfterimageState(ring=1)
+        foveated = FoveatedAfterimageState(center, radius, ring=1)
+        times, difference = np.zeros(2), 0.0
+        for i, frame in enumerate(frames):
+            start = time.perf_counter()
+            radiance = apply_anatomical_constraints(
+                frame * np.float32(1 / 255), density.astype(np.float32)
+            )
+            expected, _ = full.step(radiance, overlay=False)
+            middle = time.perf_counter()
+            afterimage, _ = foveated.step(frame, overlay=False)
+            if i >= args.warmup:
+                times += (middle - start, time.perf_counter() - middle)
+            difference = max(difference, float(np.abs(afterimage - expected).max()))
+        times *= 1e3 / args.frames
+        print(
+            f"{radius:>7g} {foveated.active_fraction:>6.1%} "
+            f"{times[0]:>8.1f} {times[1]:>9.1f} "
+            f"{times[0] / times[1]:>7.1f}x {difference:>9.5f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
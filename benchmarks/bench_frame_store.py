@@ -0,0 +1,86 @@
+"""
+Frame store reads against decoding a folder of JPEG frames.
+
+Random frames are written as frame_XXXX.jpg and packed into a frame store
+(model.utils.frame_store). The report gives the time to list and read every frame of
+both in order, a random access into each, and the sizes on disk. Store reads are views,
+so every frame read is summed to touch all of its pages (for both, to keep it fair).
+
+    python -m benchmarks.bench_frame_store --width 1920 --height 1080 --frames 120
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+from model.utils.frame_store import FrameStore, ImageFolder, pack_images
+
+
+def _folder_size(path):
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path)
+               if os.path.isfile(os.path.join(path, name)))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark frame store reads against JPEG decoding."
+    )
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--frames", type=int, default=120)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    # Smooth frames compress like video frames rather than noise.
+    coarse = (args.height // 16, args.width // 16, 3)
+    base = cv2.resize(
+        rng.integers(0, 256, coarse, dtype=np.uint8), (args.width, args.height)
+    )
+    with tempfile.TemporaryDirectory() as folder:
+        images = os.path.join(folder, "frames")
+        os.makedirs(images)
+        for i in range(args.frames):
+            frame = np.roll(base, 4 * i, axis=1)
+            cv2.imwrite(os.path.join(images, f"frame_{i:04d}.jpg"), frame)
+        store_path = os.path.join(folder, "frames.frames")
+        start = time.perf_counter()
+        pack_images(images, store_path)
+        pack = time.perf_counter() - start
+
+        results = {}
+        for label, open_store in (("JPEG folder", lambda: ImageFolder(images)),
+                                  ("frame store", lambda: FrameStore(store_path))):
+            start = time.perf_counter()
+            frames = open_store()
+            total = sum(
+                int(frames.frame(name, 'BGR').sum(dtype=np.uint64))
+                for name in frames.names
+            )
+            sequential = time.perf_counter() - start
+            start = time.perf_counter()
+            for i in rng.integers(0, len(frames), 20):
+                frames[int(i)].sum(dtype=np.uint64)
+            random_access = (time.perf_counter() - start) / 20
+            results[label] = (sequential, random_access, total)
+        sizes = (_folder_size(images), _folder_size(store_path))
+
+    size = f"{args.width}x{args.height}"
+    print(f"{args.frames} frames of {size} (packed in {pack:.2f} s)")
+    jpeg_time = results["JPEG folder"][0]
+    for label, (sequential, random_access, _) in results.items():
+        print(
+            f"  {label:12s} {sequential / args.frames * 1000:7.2f} ms per frame in "
+            f"order ({jpeg_time / sequential:.1f}x), {random_access * 1000:7.2f} ms "
+            f"per random frame"
+        )
+    print(
+        f"  on disk: JPEG folder {sizes[0] / 2**20:.0f} MB, frame store "
+        f"{sizes[1] / 2**20:.0f} MB (raw, lossless)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Per-frame cost of a moving fovea: get_cone_density_map against gaze_density_map views.
+
+For a gaze that moves every frame, the report gives the time per frame to obtain the
+density map and the kinetics input modulated by it (AfterimageState.advance with
+density), and the bytes allocated per frame after the first (tracemalloc).
+
+    python -m benchmarks.bench_gaze --width 3840 --height 2160
+"""
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+
+from model.core.anatomical import density_canvas, gaze_density_map, get_cone_density_map
+from model.processing.afterimage_batch import AfterimageState
+
+
+def _run(frames, gazes, density_for):
+    state = AfterimageState()
+    state.advance(frames[0], density=density_for(gazes[0]))
+    tracemalloc.start()
+    start = time.perf_counter()
+    for frame, gaze in zip(frames[1:], gazes[1:]):
+        state.advance(frame, density=density_for(gaze))
+    elapsed = (time.perf_counter() - start) / (len(frames) - 1)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark gaze-contingent density maps."
+    )
+    parser.add_argument("--width", type=int, default=3840)
+    parser.add_argument("--height", type=int, default=2160)
+    parser.add_argument("--radius", type=float, default=200)
+    parser.add_argument("--frames", type=int, default=6)
+    args = parser.parse_args()
+
+    shape = (args.height, args.width)
+    rng = np.random.default_rng(0)
+    frames = [
+        rng.integers(0, 256, shape + (3,), dtype=np.uint8) for _ in range(args.frames)
+    ]
+    gazes = [
+        (rng.uniform(0, args.width), rng.uniform(0, args.height))
+        for _ in range(args.frames)
+    ]
+
+    start = time.perf_counter()
+    density_canvas(shape, args.radius)
+    print(f"{args.width}x{args.height}, radius {args.radius:g}: canvas built once in "
+          f"{(time.perf_counter() - start) * 1e3:.1f} ms")
+
+    def full_map(gaze):
+        return get_cone_density_map(shape, gaze, args.radius).astype(np.float32)
+
+    def view(gaze):
+        return gaze_density_map(shape, gaze, args.radius)
+
+    for name, density_for in (("get_cone_density_map", full_map),
+                              ("gaze_density_map", view)):
+        elapsed, peak = _run(frames, gazes, density_for)
+        print(f"  {name:<21} {elapsed * 1e3:8.1f} ms per frame  "
+              f"{peak / 2 ** 20:8.1f} MB allocated per frame")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Incremental (change-driven) updates against the full kinetics on a static scene.
+
+A smooth static background with a small moving square is run through AfterimageState
+and IncrementalAfterimageState. Per block of frames, the report gives the time per
+frame of both, the fraction of pixels the incremental state integrated and the largest
+afterimage difference.
+
+    python -m benchmarks.bench_incremental --width 1280 --height 720 --frames 120
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from model.processing.afterimage_batch import AfterimageState
+from model.processing.incremental import IncrementalAfterimageState
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark incremental afterimage updates."
+    )
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--frames", type=int, default=120)
+    parser.add_argument("--block", type=int, default=20)
+    parser.add_argument("--tile", type=int, default=None)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    background = cv2.resize(
+        rng.integers(0, 256, (9, 16, 3), dtype=np.uint8),
+        (args.width, args.height),
+        interpolation=cv2.INTER_CUBIC,
+    )
+    size = args.height // 7
+    full = AfterimageState(ring=1)
+    incremental = IncrementalAfterimageState(ring=1, tile=args.tile)
+
+    print(
+        f"{args.frames} frames of {args.width}x{args.height}, tile {incremental.tile}"
+    )
+    print(
+        f"{'frames':>9} {'full ms':>8} {'incr ms':>8} {'speedup':>8} "
+        f"{'integrated':>11} {'max diff':>9}"
+    )
+    for block in range(0, args.frames, args.block):
+        times, fractions, difference = np.zeros(2), [], 0.0
+        for i in range(block, min(block + args.block, args.frames)):
+            frame = background.copy()
+            x = (10 * i) % (args.width - size)
+            frame[args.height // 2:args.height // 2 + size, x:x + size] = 255
+            start = time.perf_counter()
+            expected, _ = full.step(frame)
+            middle = time.perf_counter()
+            afterimage, _ = incremental.step(frame)
+            times += (middle - start, time.perf_counter() - middle)
+            fractions.append(incremental.active_fraction)
+            difference = max(difference, float(np.abs(afterimage - expected).max()))
+        times *= 1e3 / len(fractions)
+        print(
+            f"{block:>4}-{block + len(fractions) - 1:<4} "
+            f"{times[0]:>8.1f} {times[1]:>8.1f} {times[0] / times[1]:>7.1f}x "
+            f"{np.mean(fractions):>10.1%} {difference:>9.5f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Speed and accuracy of the closed-form opsin integrators against the iterated Euler path.
+
+For each ITERATIONS setting, one frame of kinetics is run three ways:
+N calls to update_opsin_concentration, advance_opsin(method='euler') and
+advance_opsin(method='exact'). Errors are max |difference| to the iterated result.
+
+    python -m benchmarks.bench_kinetics --width 1920 --height 1080
+"""
+import argparse
+import time
+
+import numpy as np
+
+from model.core.receptor_kinetics import advance_opsin, update_opsin_concentration
+from model.model_config import ModelConfig
+
+
+def _timed(fn, repeats):
+    best, result = float('inf'), None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def iterate(opsin, radiance, steps):
+    for _ in range(steps):
+        opsin = update_opsin_concentration(opsin, radiance)
+    return opsin
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark closed-form opsin integration."
+    )
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument(
+        "--iterations", type=int, nargs="+", default=[1, 5, 10, 20, 50, 100]
+    )
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    radiance = rng.random((args.height, args.width, 3))
+    opsin = rng.random((args.height, args.width, 3))
+
+    print(f"Frame {args.width}x{args.height}, dt={ModelConfig.TIME_STEP}")
+    print(
+        f"{'N':>5} {'iterated ms':>12} {'euler ms':>9} {'exact ms':>9} {'speedup':>8} "
+        f"{'euler err':>10} {'exact err':>10}"
+    )
+    for steps in args.iterations:
+        t_iter, reference = _timed(
+            lambda: iterate(opsin, radiance, steps), args.repeats
+        )
+        t_euler, euler = _timed(
+            lambda: advance_opsin(opsin, radiance, steps, method='euler'), args.repeats
+        )
+        t_exact, exact = _timed(
+            lambda: advance_opsin(opsin, radiance, steps, method='exact'), args.repeats
+        )
+        print(
+            f"{steps:>5} {t_iter * 1e3:>12.1f} {t_euler * 1e3:>9.1f} "
+            f"{t_exact * 1e3:>9.1f} "
+            f"{t_iter / t_exact:>7.1f}x {np.abs(euler - reference).max():>10.2e} "
+            f"{np.abs(exact - reference).max():>10.2e}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Speed of the LMS / oRGB diffusion engine against a dense per-step convolution.
+
+The dense variant runs the notebook's structure on the CPU: a k x k cv2.filter2D per
+blur and one colour matrix per stage. The engine uses separable blurs, a precomputed
+Euler update and folded colour matrices. Errors are the max |difference| of the final
+outputs.
+
+    python -m benchmarks.bench_opponent --width 1920 --height 1080
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from model.core.opponent_afterimage import (
+    M_LMS_TO_ORGB,
+    M_LMS_TO_RGB,
+    M_ORGB_TO_LMS,
+    M_RGB_TO_LMS,
+    gaussian_kernel_1d,
+    simulate_opponent_afterimage,
+)
+from model.model_config import ModelConfig
+
+
+def dense_pipeline(image, p):
+    eye = np.outer(*[gaussian_kernel_1d(p['kernel_size'], p['sigma_blur'])] * 2)
+    diffusion = np.outer(
+        *[gaussian_kernel_1d(p['kernel_size_diff'], p['N_sigma'] / np.sqrt(30))] * 2
+    )
+    radiance = cv2.filter2D(image, -1, eye, borderType=cv2.BORDER_CONSTANT)
+    radiance_lms = cv2.transform(radiance, M_RGB_TO_LMS)
+    r_lms = np.zeros_like(radiance_lms)
+    for _ in range(p['num_steps']):
+        r_dot = p['c_a'] * radiance_lms * (1 - r_lms) - p['c_d'] * r_lms
+        r_lms = np.clip(r_lms + p['dt'] * r_dot, 0, 1)
+        r_lms = cv2.filter2D(r_lms, -1, diffusion, borderType=cv2.BORDER_CONSTANT)
+    afterimage_orgb = -cv2.transform(r_lms, M_LMS_TO_ORGB)
+    afterimage_lms = cv2.transform(afterimage_orgb, M_ORGB_TO_LMS)
+    afterimage_rgb = np.clip(cv2.transform(afterimage_lms, M_LMS_TO_RGB), 0, 1)
+    return np.clip((1 - p['alpha']) * radiance + p['alpha'] * afterimage_rgb, 0, 1)
+
+
+def _timed(fn, repeats):
+    best, result = float('inf'), None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the LMS / oRGB diffusion engine."
+    )
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    image = rng.random((args.height, args.width, 3)).astype(np.float32)
+    params = ModelConfig.OPPONENT_PARAMS
+    t_dense, dense = _timed(lambda: dense_pipeline(image, params), args.repeats)
+    t_engine, engine = _timed(lambda: simulate_opponent_afterimage(image), args.repeats)
+    print(f"Frame {args.width}x{args.height}, {params['num_steps']} steps")
+    print(f"dense   {t_dense * 1e3:8.1f} ms")
+    error = np.abs(engine - dense).max()
+    print(
+        f"engine  {t_engine * 1e3:8.1f} ms  "
+        f"({t_dense / t_engine:.1f}x, max error {error:.2e})"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Out-of-core tiled HDR processing against loading the whole image.
+
+A smooth random HDR image is written as a Radiance .hdr file and its afterimage computed
+twice, each in a fresh process: with load_hdr_image and hdr_afterimage on the whole
+image, then with process_hdr_tiled under `--memory_mb`. The report gives the wall time
+of both, their peak RSS above that of the process with the model loaded (Linux only:
+the peak is reset through /proc/self/clear_refs) and the largest difference between
+the afterimages.
+
+    python -m benchmarks.bench_out_of_core --width 6000 --height 4000 --memory_mb 256
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import cv2
+import numpy as np
+
+from model.processing.out_of_core import MODELS
+
+# Runs in a child process, so its peak RSS is its own.
+CHILD = """
+import gc, json, sys, time
+import numpy as np
+from model.core.hdr_processing import load_hdr_image
+from model.processing.out_of_core import hdr_afterimage, process_hdr_tiled
+
+def status(field):
+    with open('/proc/self/status') as f:
+        return next(int(line.split()[1]) / 1024 for line in f if line.startswith(field))
+
+mode, source, target, model, memory_mb = sys.argv[1:]
+hdr_afterimage(np.ones((4, 4, 3), np.float32), model)
+gc.collect()
+with open('/proc/self/clear_refs', 'w') as f:
+    f.write('5')  # Reset the peak RSS to the current RSS
+baseline = status('VmRSS')
+start = time.perf_counter()
+stats = None
+if mode == 'whole':
+    np.save(target, hdr_afterimage(load_hdr_image(source), model))
+else:
+    stats = process_hdr_tiled(source, target, model, memory_mb=float(memory_mb))
+print(json.dumps({'seconds': time.perf_counter() - start, 'baseline_mb': baseline,
+                  'peak_mb': status('VmHWM') - baseline, 'stats': stats}))
+"""
+
+
+def _run(mode, source, target, model, memory_mb):
+    result = subprocess.run(
+        [sys.executable, "-c", CHILD, mode, source, target, model, str(memory_mb)],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark out-of-core tiled HDR processing."
+    )
+    parser.add_argument("--width", type=int, default=6000)
+    parser.add_argument("--height", type=int, default=4000)
+    parser.add_argument("--model", choices=MODELS, default="spectral")
+    parser.add_argument("--memory_mb", type=float, default=256)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    coarse = (args.height // 64 + 1, args.width // 64 + 1, 3)
+    small = (rng.random(coarse) ** 3 * 20).astype(np.float32)
+    with tempfile.TemporaryDirectory(dir=".") as folder:
+        source = os.path.join(folder, "panorama.hdr")
+        cv2.imwrite(source, cv2.resize(small, (args.width, args.height)))
+        del small
+        whole_path = os.path.join(folder, "whole.npy")
+        tiled_path = os.path.join(folder, "tiled.npy")
+        whole = _run('whole', source, whole_path, args.model, args.memory_mb)
+        tiled = _run('tiled', source, tiled_path, args.model, args.memory_mb)
+        difference = float(
+            np.abs(
+                np.load(whole_path, mmap_mode='r') - np.load(tiled_path, mmap_mode='r')
+            ).max()
+        )
+
+    stats = tiled['stats']
+    print(
+        f"{args.width}x{args.height} HDR, {args.model} model (peak RSS above the "
+        f"{whole['baseline_mb']:.0f} MB of a process with the model loaded)"
+    )
+    print(
+        f"  whole image: {whole['seconds']:6.2f} s, "
+        f"peak RSS +{whole['peak_mb']:6.0f} MB"
+    )
+    print(
+        f"  tiled:       {tiled['seconds']:6.2f} s, "
+        f"peak RSS +{tiled['peak_mb']:6.0f} MB (budget {args.memory_mb:.0f} MB, "
+        f"{stats['tiles']} tiles of {stats['tile']} px, halo {stats['halo']} px, "
+        f"{stats['overhead']:.2f}x the pixels)"
+    )
+    print(f"  largest difference {difference:.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Pyramid-level opsin state against the full-resolution kinetics.
+
+A test image is panned across the frame to make a moving sequence. For each level the
+sequence is run through AfterimageState and the afterimages are compared with level 0;
+times are per frame for the kinetics alone (with the downsampling) and for the whole
+step (with the upsampling of the afterimage).
+
+    python -m benchmarks.bench_pyramid --width 3840 --height 2160 --levels 0 1 2 3
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from model.processing.afterimage_batch import AfterimageState
+from model.utils.image_metrics import psnr, ssim
+
+
+def _frames(path, width, height, count):
+    image = cv2.resize(
+        cv2.imread(path), (width + 8 * count, height), interpolation=cv2.INTER_AREA
+    )
+    return [np.ascontiguousarray(image[:, 8 * i:8 * i + width]) for i in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the pyramid-level opsin state."
+    )
+    parser.add_argument(
+        "--image", default="data/afterimage/0_1_frame_prototype/input/1.jpg"
+    )
+    parser.add_argument("--width", type=int, default=3840)
+    parser.add_argument("--height", type=int, default=2160)
+    parser.add_argument("--frames", type=int, default=5)
+    parser.add_argument("--levels", type=int, nargs="+", default=[0, 1, 2, 3])
+    args = parser.parse_args()
+
+    frames = _frames(args.image, args.width, args.height, args.frames)
+    results = {}
+    for level in args.levels:
+        state = AfterimageState(ring=1, level=level)
+        kinetics_only = AfterimageState(level=level)
+        afterimages, kinetics, total = [], 0.0, 0.0
+        for frame in frames:
+            start = time.perf_counter()
+            kinetics_only.advance(frame)
+            kinetics += time.perf_counter() - start
+            start = time.perf_counter()
+            afterimage, _ = state.step(frame, overlay=False)
+            total += time.perf_counter() - start
+            afterimages.append(afterimage.copy())
+        results[level] = (kinetics / len(frames), total / len(frames), afterimages)
+
+    print(f"{len(frames)} frames of {args.width}x{args.height}")
+    print(
+        f"{'level':>5} {'kinetics ms':>12} {'step ms':>8} {'speedup':>8} "
+        f"{'PSNR dB':>8} {'SSIM':>7}"
+    )
+    _, base_total, base = results[0] if 0 in results else (None, None, None)
+    for level, (kinetics, total, afterimages) in results.items():
+        speedup = f"{base_total / total:7.1f}x" if base is not None else ""
+        quality = ""
+        if base is not None:
+            quality = (
+                f"{np.mean([psnr(a, b) for a, b in zip(afterimages, base)]):>8.2f} "
+                f"{np.mean([ssim(a, b) for a, b in zip(afterimages, base)]):>7.4f}"
+            )
+        timings = f"{kinetics * 1e3:>12.1f} {total * 1e3:>8.1f}"
+        print(f"{level:>5} {timings} {speedup:>8} {quality}")
+
+
+if __name__ == "__main__":
+    main()
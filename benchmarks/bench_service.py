@@ -0,0 +1,98 @@
+"""
+Warm afterimage service against one CLI process per image.
+
+Small random images are rendered first by running python -m model.processing.afterimage
+once per image, as a script would, then through a running afterimage service with
+`--clients` concurrent clients. The report gives the wall time per image of both, the
+service's latency percentiles and its mean batch size.
+
+    python -m benchmarks.bench_service --images 64 --size 256 --clients 8
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from model.processing.afterimage_service import request
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the warm afterimage service."
+    )
+    parser.add_argument("--images", type=int, default=64)
+    parser.add_argument("--size", type=int, default=256)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument(
+        "--cli_images",
+        type=int,
+        default=8,
+        help="Images rendered with one process each",
+    )
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as folder:
+        inputs = []
+        for i in range(args.images):
+            path = os.path.join(folder, f"input_{i:04d}.png")
+            image = rng.integers(0, 256, (args.size, args.size, 3), dtype=np.uint8)
+            cv2.imwrite(path, image)
+            inputs.append(path)
+
+        start = time.perf_counter()
+        for path in inputs[:args.cli_images]:
+            command = [sys.executable, "-m", "model.processing.afterimage"]
+            subprocess.run(
+                command + [path, path + ".cli.png"],
+                check=True,
+                stdout=subprocess.DEVNULL,
+            )
+        cli = (time.perf_counter() - start) / args.cli_images
+
+        socket_path = os.path.join(folder, "service.sock")
+        start = time.perf_counter()
+        command = [sys.executable, "-m", "model.processing.afterimage_service"]
+        server = subprocess.Popen(
+            command + ["--socket", socket_path, "serve"],
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        server.stdout.readline()  # ready
+        warmup = time.perf_counter() - start
+        try:
+            def render(path):
+                job = {'input': path, 'output': path + ".service.png"}
+                return request(job, socket_path)
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(args.clients) as clients:
+                replies = list(clients.map(render, inputs))
+            service = (time.perf_counter() - start) / args.images
+            stats = request({'op': 'stats'}, socket_path)
+        finally:
+            request({'op': 'shutdown'}, socket_path)
+            server.wait()
+
+    assert all(reply['ok'] for reply in replies)
+    latency = stats['latency_ms']
+    print(f"{args.images} images of {args.size}x{args.size}, {args.clients} clients")
+    print(f"  one process per image: {cli * 1000:.1f} ms per image")
+    print(
+        f"  warm service:          {service * 1000:.1f} ms per image "
+        f"({cli / service:.1f}x), start-up {warmup:.2f} s once"
+    )
+    print(
+        f"  latency p50 {latency['p50']:.1f} ms, p90 {latency['p90']:.1f} ms, "
+        f"p99 {latency['p99']:.1f} ms, mean batch {stats['mean_batch']:.1f}"
+    )
+
+
+if __name__ == "__main__":
+    main()
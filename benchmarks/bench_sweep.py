@@ -0,0 +1,65 @@
+"""
+Parameter sweep in one pass against one AfterimageState run per setting.
+
+Both process the same JPEG-encoded frames for a ca_scale x cd_scale grid; the sweep
+decodes each frame once and advances all settings with one broadcast advance_opsin call.
+The kinetics cost the same per setting either way (they are bound by memory bandwidth),
+so the gain is the decoding and per-call overhead that the separate runs repeat.
+
+    python -m benchmarks.bench_sweep --ca_scale 0.5 1 2 --cd_scale 0.5 1
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from model.model_config import ModelConfig
+from model.processing.afterimage_batch import AfterimageState
+from model.processing.parameter_sweep import ParameterSweep, parameter_grid
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark batched parameter sweeps.")
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--frames", type=int, default=5)
+    parser.add_argument("--ca_scale", type=float, nargs="+", default=[0.5, 1.0, 2.0])
+    parser.add_argument("--cd_scale", type=float, nargs="+", default=[0.5, 1.0])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    shape = (args.height, args.width, 3)
+    frames = [
+        cv2.imencode(".jpg", rng.integers(0, 256, shape, dtype=np.uint8))[1]
+        for _ in range(args.frames)
+    ]
+    settings = parameter_grid(args.ca_scale, args.cd_scale)
+
+    start = time.perf_counter()
+    for setting in settings:
+        ModelConfig.CA_RGB, ModelConfig.CD_RGB = setting['ca'], setting['cd']
+        state = AfterimageState(ring=1)
+        for frame in frames:
+            state.step(cv2.imdecode(frame, cv2.IMREAD_COLOR))
+    separate = time.perf_counter() - start
+
+    start = time.perf_counter()
+    sweep = ParameterSweep(settings)
+    for frame in frames:
+        sweep.step(cv2.imdecode(frame, cv2.IMREAD_COLOR))
+    batched = time.perf_counter() - start
+
+    per_frame = 1e3 / (len(frames) * len(settings))
+    print(
+        f"{len(settings)} settings, {len(frames)} frames of {args.width}x{args.height}"
+    )
+    print(f"  separate runs {separate * per_frame:7.1f} ms per frame and setting")
+    print(
+        f"  one sweep     {batched * per_frame:7.1f} ms per frame and setting  "
+        f"({separate / batched:.2f}x)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+Scaling of the tile-parallel kinetics engine with the number of band workers.
+
+Frames are synthetic and kept in memory so only kinetics and compositing are timed.
+
+    python -m benchmarks.bench_tile_parallel --workers 1 2 4 8
+"""
+import argparse
+import time
+
+import numpy as np
+
+from model.processing.tile_parallel import TileParallelEngine
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the tile-parallel kinetics engine."
+    )
+    parser.add_argument("--width", type=int, default=3840)
+    parser.add_argument("--height", type=int, default=2160)
+    parser.add_argument("--frames", type=int, default=10)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--tile_rows", type=int, default=None)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    frames = [rng.random((args.height, args.width, 3)) for _ in range(2)]
+
+    print(f"Frame {args.width}x{args.height}, {args.frames} frames")
+    baseline = None
+    for workers in args.workers:
+        with TileParallelEngine(frames[0].shape, workers, args.tile_rows) as engine:
+            engine.process(frames[0])
+            start = time.perf_counter()
+            for i in range(args.frames):
+                engine.process(frames[i % 2])
+            per_frame = (time.perf_counter() - start) / args.frames
+        baseline = baseline or per_frame
+        print(
+            f"  {workers:>3} workers: {per_frame * 1e3:8.1f} ms/frame  "
+            f"({baseline / per_frame:4.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,7 @@
 import numpy as np
 
+_CANVASES = {}
+
 
 def get_cone_density_map(image_shape: tuple, fovea_center: tuple, fovea_radius: float) -> np.ndarray:
     """
@@ -13,8 +15,81 @@ def get_cone_density_map(image_shape: tuple, fovea_center: tuple, fovea_radius:
     return density / np.max(density)
 
 
+def cone_density_tile(
+    image_shape: tuple,
+    fovea_center: tuple,
+    fovea_radius: float,
+    rows: slice,
+    columns: slice,
+) -> np.ndarray:
+    """
+    get_cone_density_map(image_shape, ...)[rows, columns] without building the full map,
+    for images processed in tiles. The Gaussian is separable, so the tile is the outer
+    product of a row and a column profile, and the normalization by the map's maximum is
+    the product of the profiles' maxima over the whole image. float32.
+    """
+    height, width = image_shape[:2]
+    sigma = fovea_radius / 2.0
+
+    def profile(indices, centre, size):
+        values = np.exp(-0.5 * ((indices - centre) / sigma) ** 2)
+        nearest = min(max(round(centre), 0), size - 1)
+        return values / np.exp(-0.5 * ((nearest - centre) / sigma) ** 2)
+
+    row_profile = profile(np.arange(height)[rows], fovea_center[1], height)
+    column_profile = profile(np.arange(width)[columns], fovea_center[0], width)
+    return np.outer(row_profile, column_profile).astype(np.float32)
+
+
 def apply_anatomical_constraints(effective_radiance: np.ndarray, density_map: np.ndarray) -> np.ndarray:
     """
     Modulate effective radiance by cone density.
     """
     return effective_radiance * density_map
+
+
+def density_region(density_map: np.ndarray, threshold: float) -> tuple:
+    """
+    Bounding box (top, bottom, left, right) of the pixels whose density is at least
+    `threshold`; an empty box (0, 0, 0, 0) if there are none.
+    """
+    rows = np.flatnonzero((density_map >= threshold).any(axis=1))
+    columns = np.flatnonzero((density_map >= threshold).any(axis=0))
+    if rows.size == 0:
+        return 0, 0, 0, 0
+    return int(rows[0]), int(rows[-1]) + 1, int(columns[0]), int(columns[-1]) + 1
+
+
+def density_canvas(image_shape: tuple, fovea_radius: float) -> np.ndarray:
+    """
+    Cone density map of twice the image size with the fovea at its centre (row H, column
+    W), built once per (shape, radius) and cached (read-only, float32).
+
+    The Gaussian is separable, so the canvas is the outer product of a row and a column
+    profile.
+    """
+    key = (tuple(image_shape[:2]), float(fovea_radius))
+    canvas = _CANVASES.get(key)
+    if canvas is None:
+        height, width = key[0]
+        sigma = fovea_radius / 2.0
+        rows = np.exp(-0.5 * ((np.arange(2 * height) - height) / sigma) ** 2)
+        columns = np.exp(-0.5 * ((np.arange(2 * width) - width) / sigma) ** 2)
+        canvas = _CANVASES[key] = np.outer(rows, columns).astype(np.float32)
+        canvas.flags.writeable = False
+    return canvas
+
+
+def gaze_density_map(
+    image_shape: tuple, gaze: tuple, fovea_radius: float
+) -> np.ndarray:
+    """
+    get_cone_density_map for a fovea at `gaze` = (x, y), served as a view of the cached
+    density_canvas, so moving the fovea every frame costs no computation or allocation.
+    The gaze is rounded to whole pixels and clamped to the image.
+    """
+    height, width = image_shape[:2]
+    x = min(max(int(round(gaze[0])), 0), width - 1)
+    y = min(max(int(round(gaze[1])), 0), height - 1)
+    canvas = density_canvas(image_shape, fovea_radius)
+    return canvas[height - y:2 * height - y, width - x:2 * width - x]
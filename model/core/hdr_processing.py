@@ -1,6 +1,11 @@
+import os
+
 import cv2
 import numpy as np
 
+# Suffixes of Radiance RGBE files, which iter_hdr_rows reads one scanline at a time.
+RGBE_SUFFIXES = ('.hdr', '.pic')
+
 
 def load_hdr_image(path: str) -> np.ndarray:
     """
@@ -17,3 +22,145 @@ def convert_to_effective_radiance(hdr_image: np.ndarray, exposure: float = 1.0)
     Scale HDR image with an exposure factor.
     """
     return hdr_image * exposure
+
+
+def read_hdr_header(stream) -> tuple:
+    """
+    Read the header of a Radiance RGBE file from a binary stream, up to the pixels.
+
+    Returns:
+        tuple: (height, width). Only the standard top-down, left-to-right orientation
+        ("-Y height +X width") and the 32-bit_rle_rgbe format are supported; anything
+        else raises ValueError.
+    """
+    magic = stream.readline()
+    if not magic.startswith((b"#?RADIANCE", b"#?RGBE")):
+        raise ValueError("Not a Radiance RGBE file")
+    while True:
+        line = stream.readline()
+        if not line:
+            raise ValueError("Truncated RGBE header")
+        line = line.strip()
+        if not line:
+            break
+        if line.startswith(b"FORMAT=") and line != b"FORMAT=32-bit_rle_rgbe":
+            raise ValueError(f"Unsupported RGBE format {line[7:].decode()}")
+    resolution = stream.readline().split()
+    if len(resolution) != 4 or resolution[0] != b"-Y" or resolution[2] != b"+X":
+        orientation = b' '.join(resolution).decode()
+        raise ValueError(f"Unsupported RGBE orientation {orientation}")
+    return int(resolution[1]), int(resolution[3])
+
+
+def _decode_rle_channel(data: bytes, position: int, width: int) -> tuple:
+    """
+    Decode one run-length encoded channel of a scanline from data[position:]. The runs
+    are joined as bytes, several times faster than assigning them into an array.
+
+    Returns:
+        tuple: (the channel's `width` bytes, the position after the channel).
+    """
+    runs = []
+    x = 0
+    while x < width:
+        count = data[position]
+        if count > 128:
+            count -= 128
+            runs.append(data[position + 1:position + 2] * count)
+            position += 2
+        else:
+            runs.append(data[position + 1:position + 1 + count])
+            position += count + 1
+        x += count
+        if count == 0:
+            raise ValueError("Corrupt RGBE scanline")
+    channel = b"".join(runs)
+    if len(channel) != width:
+        raise ValueError("Corrupt RGBE scanline")
+    return channel, position
+
+
+def iter_hdr_rows(path: str):
+    """
+    Yield the rows of a Radiance RGBE (.hdr) file one at a time as BGR float32 (W x 3),
+    the values cv2.imread(path, -1) gives, so an image of any size is decoded in the
+    memory of one scanline.
+
+    Flat and run-length encoded scanlines are read; the obsolete RLE variant raises a
+    ValueError.
+    """
+    with open(path, 'rb') as stream:
+        height, width = read_hdr_header(stream)
+        channels = [None] * 4
+        # The longest encoding of a scanline: 4 channels of literal runs of 128 bytes.
+        longest = 4 + 4 * (width + -(-width // 128))
+        data, position = b"", 0
+        for _ in range(height):
+            # Decode from an in-memory buffer holding at least one scanline, rather than
+            # reading the stream a byte at a time.
+            if len(data) - position < longest:
+                data = data[position:] + stream.read(max(longest, 1 << 16))
+                position = 0
+            start = data[position:position + 4]
+            if len(start) < 4:
+                raise ValueError(f"Truncated RGBE file {path}")
+            encoded = start[:2] == b"\x02\x02" and (start[2] << 8 | start[3]) == width
+            if 8 <= width < 32768 and encoded:
+                position += 4
+                try:
+                    for c in range(4):
+                        channel, position = _decode_rle_channel(data, position, width)
+                        channels[c] = channel
+                except (IndexError, ValueError):
+                    message = f"Corrupt or truncated RGBE scanline in {path}"
+                    raise ValueError(message) from None
+                planes = np.frombuffer(b"".join(channels), dtype=np.uint8)
+                pixels = planes.reshape(4, width).T
+            else:
+                if start[:3] == b"\x01\x01\x01":
+                    raise ValueError(f"Old-style RLE in {path} is not supported")
+                if len(data) - position < 4 * width:
+                    raise ValueError(f"Truncated RGBE file {path}")
+                pixels = np.frombuffer(
+                    data, dtype=np.uint8, count=4 * width, offset=position
+                )
+                pixels = pixels.reshape(width, 4)
+                position += 4 * width
+            # OpenCV's rgbe2float: mantissa * 2^(exponent - 136), 0 for a zero exponent.
+            exponent = pixels[:, 3].astype(np.int32)
+            scale = np.ldexp(np.float32(1), exponent - 136)
+            scale = np.where(exponent > 0, scale, 0).astype(np.float32)
+            yield pixels[:, 2::-1] * scale[:, None]
+
+
+def hdr_to_npy(path: str, npy_path: str) -> tuple:
+    """
+    Decode an HDR image into a memory-mappable .npy file (H x W x 3 float32, BGR).
+
+    RGBE files are streamed with iter_hdr_rows and written row by row through a plain
+    file handle, in the memory of one scanline. Other formats (e.g. OpenEXR) are decoded
+    whole by OpenCV first.
+
+    Returns:
+        tuple: The image shape.
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"HDR image not found: {path}")
+    if not path.lower().endswith(RGBE_SUFFIXES):
+        hdr = load_hdr_image(path)
+        if hdr.ndim == 2:
+            hdr = cv2.cvtColor(hdr, cv2.COLOR_GRAY2BGR)
+        np.save(npy_path, np.asarray(hdr[:, :, :3], dtype=np.float32))
+        return hdr.shape[:2] + (3,)
+    with open(path, 'rb') as stream:
+        shape = read_hdr_header(stream) + (3,)
+    header = np.lib.format.open_memmap(
+        npy_path, mode='w+', dtype=np.float32, shape=shape
+    )
+    offset = header.offset
+    del header
+    with open(npy_path, 'r+b') as f:
+        f.seek(offset)
+        for row in iter_hdr_rows(path):
+            f.write(row.tobytes())
+    return shape
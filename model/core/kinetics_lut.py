@@ -0,0 +1,199 @@
+import cv2
+import numpy as np
+
+from model.core.receptor_kinetics import advance_opsin
+from model.model_config import ModelConfig
+from model.utils.frame_format import channel_params, check_layout
+
+# Number of 8-bit input values a table covers.
+LUT_SIZE = 256
+
+_AFTERIMAGE_LUTS = {}
+_OPSIN_LUTS = {}
+
+
+def _config_key(layout: str = 'RGB') -> tuple:
+    """
+    The ModelConfig fields and the channel layout the tables are built for.
+    """
+    return (tuple(ModelConfig.CA_RGB), tuple(ModelConfig.CD_RGB), ModelConfig.TIME_STEP,
+            ModelConfig.ITERATIONS, ModelConfig.INTEGRATOR, check_layout(layout))
+
+
+def _advance_ramp(states: np.ndarray, layout: str) -> np.ndarray:
+    """
+    advance_opsin over every 8-bit input value, with rate constants in `layout` order.
+    """
+    return advance_opsin(
+        states,
+        np.broadcast_to(_input_ramp(), states.shape),
+        ca=channel_params(ModelConfig.CA_RGB, layout),
+        cd=channel_params(ModelConfig.CD_RGB, layout),
+    )
+
+
+def _input_ramp() -> np.ndarray:
+    """
+    Every 8-bit input value as a (1, 256, 3) radiance map, normalized like read_image.
+    """
+    return np.repeat(np.arange(LUT_SIZE)[None, :, None] / 255.0, 3, axis=2)
+
+
+def get_afterimage_lut(layout: str = 'RGB') -> np.ndarray:
+    """
+    Return the per-channel table mapping an 8-bit input value to the afterimage of one
+    frame seen with fresh photoreceptors.
+
+    Starting from opsin = ones, the afterimage after ModelConfig.ITERATIONS steps
+    depends only on the input value of each channel, so the whole kinetics loop
+    collapses to a 256-entry table per channel. Tables are cached per ModelConfig
+    setting (INTENSITY included) and channel layout.
+
+    Returns:
+        np.ndarray: float32 table with shape (1, 256, 3), values in [0, 1], for cv2.LUT.
+    """
+    key = _config_key(layout) + (ModelConfig.INTENSITY,)
+    lut = _AFTERIMAGE_LUTS.get(key)
+    if lut is None:
+        opsin = _advance_ramp(np.ones((1, LUT_SIZE, 3)), layout)
+        lut = np.clip((1.0 - opsin) * ModelConfig.INTENSITY, 0, 1).astype(np.float32)
+        _AFTERIMAGE_LUTS[key] = lut
+    return lut
+
+
+def generate_afterimage_lut(image: np.ndarray, layout: str = 'RGB') -> np.ndarray:
+    """
+    Afterimage of a single image (channels in `layout` order) with fresh
+    photoreceptors: clip((1 - opsin) * INTENSITY, 0, 1) after advancing opsin = ones
+    over the image with advance_opsin.
+
+    uint8 images, whose values lie on the table's grid, take one table gather and match
+    advance_opsin up to float32 rounding. Other images (e.g. float radiance in [0, 1])
+    are off the grid and fall back to advance_opsin.
+
+    Returns:
+        np.ndarray: float32 afterimage in [0, 1], in `layout` order.
+    """
+    if image.dtype == np.uint8:
+        return cv2.LUT(image, get_afterimage_lut(layout))
+    opsin = advance_opsin(
+        np.ones(image.shape),
+        image,
+        ca=channel_params(ModelConfig.CA_RGB, layout),
+        cd=channel_params(ModelConfig.CD_RGB, layout),
+    )
+    afterimage = np.clip((1.0 - opsin) * ModelConfig.INTENSITY, 0, 1)
+    return afterimage.astype(np.float32)
+
+
+class OpsinLUT:
+    """
+    Interpolated (previous state x input) table for the sequential video kinetics.
+
+    table[i, v, c] holds the state reached from opsin = i / (levels - 1) under 8-bit
+    input v in channel c; states in between are interpolated linearly.
+
+    Error bound: within a frame the update is affine in the previous state
+    (r' = a(v) * r + b(v)) for the exact integrator and for stable Euler steps
+    (k * dt <= 1), so linear interpolation is exact and two levels suffice; the only
+    error is float32 rounding of the table, below 1e-6. When the clamped Euler fallback
+    is active the update is only piecewise affine and the interpolation error is at most
+    half the state spacing times the Lipschitz constant; `max_error` holds the deviation
+    measured against advance_opsin when the table is built.
+
+    Channels follow `layout` ('RGB' or 'BGR'), i.e. the channel order of the frames.
+    """
+
+    def __init__(self, levels: int = None, layout: str = 'RGB'):
+        if levels is None:
+            levels = 2 if _is_affine() else 65
+        if levels < 2:
+            raise ValueError("An opsin lookup table needs at least two state levels")
+        self.levels = levels
+        self.layout = check_layout(layout)
+
+        initial = np.linspace(0.0, 1.0, levels)[:, None, None]
+        states = initial * np.ones((1, LUT_SIZE, 3))
+        self.table = _advance_ramp(states, self.layout).astype(np.float32)
+        # Between neighbouring levels: r' = offset + gain * (fractional position).
+        self.offset = self.table[:-1]
+        self.gain = self.table[1:] - self.table[:-1]
+        self.max_error = self._measure_error()
+
+    def _measure_error(self, samples: int = 4) -> float:
+        fractions = (np.arange(samples) + 0.5) / samples
+        knots = np.arange(self.levels - 1)[:, None]
+        initial = ((knots + fractions) / (self.levels - 1)).reshape(-1, 1, 1)
+        states = initial * np.ones((1, LUT_SIZE, 3))
+        expected = _advance_ramp(states, self.layout)
+        inputs = np.broadcast_to(
+            np.arange(LUT_SIZE)[None, :, None], states.shape
+        ).astype(np.uint8)
+        return float(
+            np.abs(self.advance(states.astype(np.float32), inputs) - expected).max()
+        )
+
+    def advance(
+        self, opsin: np.ndarray, frame: np.ndarray, out: np.ndarray = None, arena=None
+    ) -> np.ndarray:
+        """
+        Advance the opsin state over one frame of uint8 input.
+
+        The result goes to `out` if given (it may be `opsin`). With two levels and an
+        `arena` (model.utils.frame_arena.FrameArena) for the gathered tables, no
+        frame-sized arrays are allocated.
+
+        Parameters:
+            opsin : np.ndarray
+                Current opsin state (H x W x 3), float32 in [0, 1].
+            frame : np.ndarray
+                Input frame (H x W x 3), uint8.
+        Returns:
+            np.ndarray: Updated opsin state, float32.
+        """
+        if self.levels == 2:
+            gain_buffer = offset_buffer = None
+            if arena is not None:
+                gain_buffer = arena.get(('opsin_lut', 'gain'), frame.shape, np.float32)
+                offset_buffer = arena.get(
+                    ('opsin_lut', 'offset'), frame.shape, np.float32
+                )
+            gain = cv2.LUT(frame, self.gain.reshape(1, LUT_SIZE, 3), dst=gain_buffer)
+            offset = cv2.LUT(
+                frame, self.offset.reshape(1, LUT_SIZE, 3), dst=offset_buffer
+            )
+            result = np.multiply(gain, opsin, out=out)
+            result += offset
+            return result
+
+        position = opsin * (self.levels - 1)
+        knot = np.minimum(position.astype(np.intp), self.levels - 2)
+        index = (knot * LUT_SIZE + frame) * 3 + np.arange(3)
+        gain = self.gain.ravel()[index]
+        offset = self.offset.ravel()[index]
+        result = np.multiply(gain, position - knot, out=out)
+        result += offset
+        return result
+
+
+def _is_affine() -> bool:
+    """
+    Whether one frame of kinetics is affine in the previous state under ModelConfig.
+    """
+    if ModelConfig.INTEGRATOR == 'exact':
+        return True
+    rate = np.asarray(ModelConfig.CA_RGB) + np.asarray(ModelConfig.CD_RGB)
+    return bool(np.all(rate * ModelConfig.TIME_STEP <= 1))
+
+
+def get_opsin_lut(levels: int = None, layout: str = 'RGB') -> OpsinLUT:
+    """
+    Return the cached OpsinLUT for the current ModelConfig setting and channel layout.
+    """
+    if levels is None:
+        levels = 2 if _is_affine() else 65
+    key = _config_key(layout) + (levels,)
+    lut = _OPSIN_LUTS.get(key)
+    if lut is None:
+        lut = _OPSIN_LUTS[key] = OpsinLUT(levels, layout)
+    return lut
@@ -0,0 +1,213 @@
+import cv2
+import numpy as np
+
+from model.model_config import ModelConfig
+from model.utils.frame_format import check_layout
+
+# Colour matrices of the notebook pipeline; rows are output channels.
+M_RGB_TO_LMS = np.array([[0.3811, 0.5783, 0.0402],
+                         [0.1967, 0.7244, 0.0782],
+                         [0.0241, 0.1288, 0.8444]])
+M_LMS_TO_RGB = np.linalg.inv(M_RGB_TO_LMS)
+M_LMS_TO_ORGB = np.array([[1 / np.sqrt(3), 1 / np.sqrt(3), 1 / np.sqrt(3)],
+                          [1 / np.sqrt(6), 1 / np.sqrt(6), -2 / np.sqrt(6)],
+                          [1 / np.sqrt(2), -1 / np.sqrt(2), 0]])
+M_ORGB_TO_LMS = np.linalg.inv(M_LMS_TO_ORGB)
+# The afterimage is the bleaching negated in the opponent space.
+OPPONENT_INVERSION = -np.eye(3)
+
+# Intermediate outputs of process_image_debug, in pipeline order.
+STAGES = (
+    'original',
+    'effective_radiance',
+    'effective_radiance_lms',
+    'r_lms',
+    'bleaching_orgb',
+    'afterimage_orgb',
+    'afterimage_lms',
+    'afterimage_rgb',
+    'final_output',
+)
+
+
+def gaussian_kernel_1d(kernel_size: int, sigma: float) -> np.ndarray:
+    """
+    Normalized 1D Gaussian whose outer product with itself is the notebook's 2D
+    gaussian_kernel(kernel_size, sigma), so a dense blur becomes two 1D passes.
+    """
+    if kernel_size % 2 == 0:
+        raise ValueError(f"Gaussian kernels need an odd size, got {kernel_size}")
+    ax = np.arange(kernel_size) - kernel_size // 2
+    kernel = np.exp(-ax ** 2 / (2.0 * sigma ** 2))
+    return (kernel / kernel.sum()).astype(np.float32)
+
+
+def _blur(image: np.ndarray, kernel: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+    """
+    Separable zero-padded Gaussian blur, like the notebook's conv2d(padding=k // 2).
+    """
+    return cv2.sepFilter2D(
+        image, -1, kernel, kernel, dst=out, borderType=cv2.BORDER_CONSTANT
+    )
+
+
+def opponent_transforms(layout: str = 'RGB') -> tuple:
+    """
+    The pipeline's colour matrices for images with channels in `layout` order.
+
+    Returns:
+        tuple: (input_to_lms, lms_to_afterimage). The second folds LMS -> oRGB, the
+        opponent inversion, oRGB -> LMS and LMS -> RGB into one 3x3 matrix.
+    """
+    input_to_lms = M_RGB_TO_LMS
+    lms_to_afterimage = (
+        M_LMS_TO_RGB @ M_ORGB_TO_LMS @ OPPONENT_INVERSION @ M_LMS_TO_ORGB
+    )
+    if check_layout(layout) == 'BGR':
+        input_to_lms = input_to_lms[:, ::-1]
+        lms_to_afterimage = lms_to_afterimage[::-1]
+    return input_to_lms.astype(np.float32), lms_to_afterimage.astype(np.float32)
+
+
+def _params(params: dict = None) -> dict:
+    p = dict(ModelConfig.OPPONENT_PARAMS)
+    if params:
+        p.update(params)
+    return p
+
+
+def effective_radiance(image: np.ndarray, params: dict = None) -> np.ndarray:
+    """
+    Stage 1, eye dynamics: the image blurred by the eye's Gaussian, float32 in [0, 1].
+    Integer images are taken as 8-bit levels.
+    """
+    p = _params(params)
+    radiance = _blur(
+        image.astype(np.float32, copy=False),
+        gaussian_kernel_1d(p['kernel_size'], p['sigma_blur']),
+    )
+    if np.issubdtype(image.dtype, np.integer):
+        radiance *= np.float32(1 / 255.0)
+    return radiance
+
+
+def opponent_kinetics(
+    radiance: np.ndarray,
+    params: dict = None,
+    initial_state: np.ndarray = None,
+    layout: str = 'RGB',
+) -> np.ndarray:
+    """
+    Stages 2 to 4: RGB -> LMS and the kinetics with a diffusion blur after every step.
+    Returns the LMS opsin state r_lms (float32).
+    """
+    p = _params(params)
+    input_to_lms, _ = opponent_transforms(layout)
+    return _kinetics(cv2.transform(radiance, input_to_lms), p, initial_state)
+
+
+def _kinetics(
+    radiance_lms: np.ndarray, p: dict, initial_state: np.ndarray = None
+) -> np.ndarray:
+    dt, c_a = p['dt'], p['c_a']
+    drive = radiance_lms * np.float32(dt * c_a)
+    gain = 1 - drive - np.float32(dt * p['c_d'])
+    if initial_state is None:
+        r_lms = np.zeros_like(radiance_lms)
+    else:
+        r_lms = initial_state.astype(np.float32)
+    spare = np.empty_like(r_lms)
+    diffusion_kernel = gaussian_kernel_1d(
+        p['kernel_size_diff'], p['N_sigma'] / np.sqrt(30)
+    )
+    for _ in range(p['num_steps']):
+        r_lms *= gain
+        r_lms += drive
+        np.clip(r_lms, 0, 1, out=r_lms)
+        r_lms, spare = _blur(r_lms, diffusion_kernel, out=spare), r_lms
+    return r_lms
+
+
+def opponent_composite(
+    radiance: np.ndarray, r_lms: np.ndarray, params: dict = None, layout: str = 'RGB'
+) -> tuple:
+    """
+    Stages 5 and 6: the opponent-colour inversion of the opsin state, blended with the
+    effective radiance by `alpha`.
+
+    Returns:
+        tuple: (afterimage, final_output), float32 in [0, 1].
+    """
+    p = _params(params)
+    _, lms_to_afterimage = opponent_transforms(layout)
+    afterimage = cv2.transform(r_lms, lms_to_afterimage)
+    np.clip(afterimage, 0, 1, out=afterimage)
+    final_output = cv2.addWeighted(radiance, 1 - p['alpha'], afterimage, p['alpha'], 0)
+    np.clip(final_output, 0, 1, out=final_output)
+    return afterimage, final_output
+
+
+def simulate_opponent_afterimage(
+    image: np.ndarray,
+    params: dict = None,
+    initial_state: np.ndarray = None,
+    layout: str = 'RGB',
+    return_stages: bool = False,
+):
+    """
+    CPU port of the notebook's process_image_debug (LMS kinetics with diffusion and an
+    opponent-colour inversion).
+
+    Stages: Gaussian eye blur, RGB -> LMS, `num_steps` Euler steps of
+    dr/dt = c_a * E * (1 - r) - c_d * r, each followed by a Gaussian diffusion blur,
+    inversion in oRGB space, and a blend of the afterimage with the blurred input.
+
+    The blurs are separable (two 1D passes instead of a dense k x k convolution), the
+    Euler step is precomputed as r <- r * a + b with per-pixel a and b, and the colour
+    matrices after the kinetics are folded into one 3x3 transform. Results match the
+    notebook up to float32 rounding. The stages are also available separately
+    (effective_radiance, opponent_kinetics, opponent_composite), e.g. for caching.
+
+    Parameters:
+        image: np.ndarray
+            Input image (H x W x 3), float in [0, 1] or uint8.
+        params: dict, optional
+            Overrides for ModelConfig.OPPONENT_PARAMS (the notebook's parameter names).
+        initial_state: np.ndarray, optional
+            LMS opsin state to start from (default: zeros, as in the notebook).
+        layout: str
+            Channel order of `image` and the outputs, 'RGB' or 'BGR'.
+        return_stages: bool
+            Return a dict with every stage in STAGES instead of the final output only.
+
+    Returns:
+        np.ndarray: Final composite in [0, 1], float32 (or a dict of stages).
+    """
+    p = _params(params)
+    input_to_lms, _ = opponent_transforms(layout)
+    radiance = effective_radiance(image, p)
+    radiance_lms = cv2.transform(radiance, input_to_lms)
+    r_lms = _kinetics(radiance_lms, p, initial_state)
+    afterimage, final_output = opponent_composite(radiance, r_lms, p, layout)
+    if not return_stages:
+        return final_output
+
+    bleaching_orgb = cv2.transform(r_lms, M_LMS_TO_ORGB.astype(np.float32))
+    afterimage_orgb = cv2.transform(
+        bleaching_orgb, OPPONENT_INVERSION.astype(np.float32)
+    )
+    return {
+        'original': (
+            image / np.float32(255) if np.issubdtype(image.dtype, np.integer) else image
+        ),
+        'effective_radiance': radiance,
+        'effective_radiance_lms': radiance_lms,
+        'r_lms': r_lms,
+        'bleaching_orgb': bleaching_orgb,
+        'afterimage_orgb': afterimage_orgb,
+        'afterimage_lms': cv2.transform(
+            afterimage_orgb, M_ORGB_TO_LMS.astype(np.float32)
+        ),
+        'afterimage_rgb': afterimage,
+        'final_output': final_output,
+    }
@@ -1,11 +1,13 @@
 import numpy as np
 
+from model.core.receptor_kinetics import advance_opsin, integrate_adaptive
 from model.model_config import ModelConfig
 from model.utils.pysilsub_integration import compute_photoreceptor_excitation
 
 
 def simulate_spectral_temporal_bleaching(image: np.ndarray, initial_state: np.ndarray = None,
-                                         dt: float = None, iterations: int = None) -> np.ndarray:
+                                         dt: float = None, iterations: int = None,
+                                         method: str = None) -> np.ndarray:
     """
     Simulate the spectral temporal bleaching of photoreceptors using PySilSub.
 
@@ -18,27 +20,54 @@ def simulate_spectral_temporal_bleaching(image: np.ndarray, initial_state: np.nd
             Time step (defaults to ModelConfig.TIME_STEP).
         iterations: int, optional
             Number of iterations (defaults to ModelConfig.ITERATIONS).
+        method: str, optional
+            Kinetics integrator, 'exact' or 'euler' (defaults to
+            ModelConfig.INTEGRATOR).
 
     Returns:
         np.ndarray: Final opsin state with shape (H, W, 4) (for L, M, S cones, and rods).
     """
-    if dt is None:
-        dt = ModelConfig.TIME_STEP
-    if iterations is None:
-        iterations = ModelConfig.ITERATIONS
+    excitations, initial_state = _spectral_inputs(image, initial_state)
+    return advance_opsin(initial_state, excitations, steps=iterations, dt=dt,
+                         ca=ModelConfig.CA_PS, cd=ModelConfig.CD_PS, method=method)
 
+
+def simulate_spectral_temporal_bleaching_adaptive(
+    image: np.ndarray,
+    tolerance: float,
+    initial_state: np.ndarray = None,
+    dt: float = None,
+    iterations: int = None,
+    method: str = None,
+) -> tuple:
+    """
+    simulate_spectral_temporal_bleaching stepped adaptively with integrate_adaptive,
+    stopping early where the state has settled to within `tolerance`.
+
+    Returns:
+        tuple: (final opsin state (H, W, 4), steps taken, bound on the deviation from
+        fixed stepping), as from integrate_adaptive.
+    """
+    excitations, initial_state = _spectral_inputs(image, initial_state)
+    return integrate_adaptive(
+        initial_state,
+        excitations,
+        steps=iterations,
+        dt=dt,
+        ca=ModelConfig.CA_PS,
+        cd=ModelConfig.CD_PS,
+        method=method,
+        tolerance=tolerance,
+    )
+
+
+def _spectral_inputs(image: np.ndarray, initial_state: np.ndarray = None) -> tuple:
+    """
+    Photoreceptor excitations of an RGB image and initial opsin state (ones if None).
+    """
     # Get excitations from PySilSub
     excitations = compute_photoreceptor_excitation(image)
     # Initialize state if not provided (full sensitivity)
     if initial_state is None:
         initial_state = np.ones_like(excitations)
-
-    ca = np.array(ModelConfig.CA_PS)  # shape (4,)
-    cd = np.array(ModelConfig.CD_PS)  # shape (4,)
-
-    state = initial_state
-    for _ in range(iterations):
-        dstate_dt = ca * excitations * (1 - state) - cd * state
-        state = state + dt * dstate_dt
-        state = np.clip(state, 0, 1)
-    return state
+    return excitations, initial_state
@@ -1,6 +1,9 @@
 import numpy as np
 
 from model.model_config import ModelConfig
+from model.utils.frame_format import channel_params
+
+INTEGRATORS = ('exact', 'euler')
 
 
 def update_opsin_concentration(opsin: np.ndarray, radiance: np.ndarray) -> np.ndarray:
@@ -28,3 +31,301 @@ def update_opsin_concentration(opsin: np.ndarray, radiance: np.ndarray) -> np.nd
 
     new_opsin = opsin + dt * dr_dt
     return np.clip(new_opsin, 0, 1)
+
+
+def advance_opsin(
+    opsin: np.ndarray,
+    radiance: np.ndarray,
+    steps: int = None,
+    dt: float = None,
+    ca=None,
+    cd=None,
+    method: str = None,
+    out: np.ndarray = None,
+    arena=None,
+) -> np.ndarray:
+    """
+    Advance opsin concentration over `steps` steps of constant radiance in one pass.
+
+    With the radiance held fixed, dr/dt = ca * L * (1 - r) - cd * r is linear in r with
+    rate k = ca * L + cd and steady state r_inf = ca * L / k, so:
+
+       'exact':  r(T) = r_inf + (r0 - r_inf) * exp(-k * T),        T = steps * dt
+       'euler':  r_N  = r_inf + (r0 - r_inf) * (1 - k * dt) ** N
+
+    The 'euler' mode is the closed form of N calls to update_opsin_concentration and
+    reproduces the old outputs up to rounding. When k * dt > 1 the explicit Euler step
+    overshoots and the clamp to [0, 1] matters, so it falls back to iterating.
+
+    The result has the dtype of the state (at least float32). Integer radiance is read
+    as 8-bit levels and its 1/255 scale is folded into ca, so uint8 frames are used
+    without a conversion.
+
+    All arithmetic is done in place: the result goes to `out` (which may be `opsin`
+    itself) and the temporaries come from `arena` (a FrameArena, see
+    model.utils.frame_arena), so with both given a call allocates no frame-sized arrays.
+
+    Every argument broadcasts, so K parameter sets run in one pass when ca, cd, steps
+    and dt carry a leading parameter axis (see stack_parameters): a (H x W x C) radiance
+    and (K x 1 x 1 x C) rate constants give a (K x H x W x C) state. Each row matches a
+    call with that row's parameters, except that in 'euler' mode the whole batch
+    iterates when any row needs the fallback.
+
+    Parameters:
+        opsin : np.ndarray
+            Current opsin concentration (H x W x C).
+        radiance : np.ndarray
+            Input radiance map (H x W x C), float in [0, 1] or uint8.
+        steps : int or np.ndarray, optional
+            Number of time steps (defaults to ModelConfig.ITERATIONS).
+        dt : float or np.ndarray, optional
+            Time step (defaults to ModelConfig.TIME_STEP).
+        ca, cd : sequence of float, optional
+            Per-channel rate constants (default ModelConfig.CA_RGB / CD_RGB).
+        method : str, optional
+            'exact' or 'euler' (defaults to ModelConfig.INTEGRATOR).
+        out : np.ndarray, optional
+            Array for the result, e.g. `opsin` to update the state in place.
+        arena : FrameArena, optional
+            Reused scratch buffers (default: temporaries are allocated per call).
+    Returns:
+        np.ndarray: Updated opsin concentrations in [0, 1].
+    """
+    if steps is None:
+        steps = ModelConfig.ITERATIONS
+    if dt is None:
+        dt = ModelConfig.TIME_STEP
+    if ca is None:
+        ca = ModelConfig.CA_RGB
+    if cd is None:
+        cd = ModelConfig.CD_RGB
+    if method is None:
+        method = ModelConfig.INTEGRATOR
+    if method not in INTEGRATORS:
+        raise ValueError(
+            f"Unknown integrator '{method}', expected one of {INTEGRATORS}"
+        )
+
+    dtype = np.result_type(opsin.dtype, np.float32)
+    ca = np.asarray(ca, dtype=dtype)
+    cd = np.asarray(cd, dtype=dtype)
+    radiance = np.asarray(radiance)
+    if np.ndim(steps) or np.ndim(dt):
+        # Per-setting values in the state dtype, as Python scalars are used below.
+        steps, dt, duration = (
+            np.asarray(steps, dtype=dtype),
+            np.asarray(dt, dtype=dtype),
+            np.multiply(steps, dt).astype(dtype),
+        )
+    else:
+        duration = steps * dt
+    shape = np.broadcast_shapes(
+        opsin.shape, radiance.shape, ca.shape, cd.shape, np.shape(steps), np.shape(dt)
+    )
+
+    def scratch(name, scratch_dtype=dtype):
+        if arena is None:
+            return np.empty(shape, dtype=scratch_dtype)
+        return arena.get(('advance_opsin', name), shape, scratch_dtype)
+
+    if np.issubdtype(radiance.dtype, np.integer):
+        ca = ca / dtype.type(255)
+    elif radiance.dtype != dtype:
+        radiance_buffer = scratch('radiance')
+        np.copyto(radiance_buffer, radiance)
+        radiance = radiance_buffer
+    if out is None:
+        out = np.empty(shape, dtype=dtype)
+
+    drive = np.multiply(ca, radiance, out=scratch('drive'))
+    rate = np.add(drive, cd, out=scratch('rate'))
+    decay = scratch('decay')
+    steady = scratch('steady')
+    if method == 'euler':
+        np.multiply(rate, dt, out=decay)
+        if decay.max(initial=0) > 1:
+            np.copyto(out, opsin)
+            for i in range(int(np.max(steps))):
+                change = np.subtract(1, out, out=steady)
+                change *= drive
+                change -= np.multiply(out, cd, out=decay)
+                change *= dt
+                if np.ndim(steps):
+                    change *= np.less(i, steps)  # settings with fewer steps are done
+                out += change
+                np.clip(out, 0, 1, out=out)
+            return out
+        np.subtract(1, decay, out=decay)
+        np.power(decay, steps, out=decay)
+    else:
+        np.negative(rate, out=decay)
+        decay *= duration
+        np.exp(decay, out=decay)
+
+    # r_inf * (1 - decay), guarding k == 0 (no drive, no decay) where r stays put.
+    steady[...] = 0
+    np.divide(
+        drive, rate, out=steady, where=np.greater(rate, 0, out=scratch('driven', bool))
+    )
+    np.multiply(opsin, decay, out=out)
+    np.subtract(1, decay, out=decay)
+    steady *= decay
+    out += steady
+    return np.clip(out, 0, 1, out=out)
+
+
+def stack_parameters(settings, layout: str = 'RGB') -> dict:
+    """
+    Stack K kinetics settings along a leading parameter axis for advance_opsin.
+
+    Parameters:
+        settings : sequence of dict
+            Each with any of 'ca', 'cd' (per-channel, RGB order), 'dt' and 'steps';
+            missing entries default to ModelConfig.CA_RGB, CD_RGB, TIME_STEP and
+            ITERATIONS.
+        layout : str
+            Channel order of the frames, 'RGB' or 'BGR'; the rate constants are
+            reordered to match.
+    Returns:
+        dict: advance_opsin keyword arguments ca, cd (K x 1 x 1 x 3) and dt, steps
+        (K x 1 x 1 x 1).
+    """
+    if not settings:
+        raise ValueError("No parameter settings given")
+
+    def column(name, default, per_channel=False):
+        values = [setting.get(name, default) for setting in settings]
+        if per_channel:
+            values = [channel_params(value, layout) for value in values]
+        return np.array(values).reshape(len(settings), 1, 1, -1)
+
+    return {
+        'ca': column('ca', ModelConfig.CA_RGB, per_channel=True),
+        'cd': column('cd', ModelConfig.CD_RGB, per_channel=True),
+        'dt': column('dt', ModelConfig.TIME_STEP),
+        'steps': column('steps', ModelConfig.ITERATIONS),
+    }
+
+
+def integrate_adaptive(
+    opsin: np.ndarray,
+    radiance: np.ndarray,
+    steps: int = None,
+    dt: float = None,
+    ca=None,
+    cd=None,
+    method: str = None,
+    tolerance: float = None,
+    out: np.ndarray = None,
+) -> tuple:
+    """
+    Step the kinetics one step at a time, dropping every pixel whose state has settled.
+
+    With the radiance held fixed a step is affine, r' = a * r + b (clamped to [0, 1] in
+    'euler' mode), with a = exp(-k * dt) ('exact') or 1 - k * dt ('euler') and
+    k = ca * L + cd. For |a| < 1 it contracts towards r_inf, so after a step that moved
+    r by |r' - r| the fixed-step result is at most |r' - r| * |a| / (1 - |a|) away
+    (twice that when a < 0 and the state oscillates). Each pixel and channel is stepped
+    until that bound falls below `tolerance`, or never changes again, and then left
+    out: the still-active values are compacted into a shrinking working set with index
+    arrays, and the loop stops once it is empty or after `steps` steps. Mostly saturated
+    or dark frames settle in a few steps instead of `steps`.
+
+    Every value of the result is within `tolerance` of advance_opsin with the same
+    arguments ('euler' with the clamp, as in its fallback for k * dt > 1). Unlike
+    advance_opsin, `steps` and `dt` are scalars; the rate constants broadcast as usual.
+
+    Parameters:
+        opsin, radiance, steps, dt, ca, cd, method, out :
+            As for advance_opsin.
+        tolerance : float, optional
+            Largest allowed deviation of the state (default
+            ModelConfig.ADAPTIVE_TOLERANCE).
+    Returns:
+        tuple: (opsin, iterations, residual): the new state, the number of steps taken
+        and the largest bound on its deviation from the fixed-step result.
+    """
+    if steps is None:
+        steps = ModelConfig.ITERATIONS
+    if dt is None:
+        dt = ModelConfig.TIME_STEP
+    if ca is None:
+        ca = ModelConfig.CA_RGB
+    if cd is None:
+        cd = ModelConfig.CD_RGB
+    if method is None:
+        method = ModelConfig.INTEGRATOR
+    if tolerance is None:
+        tolerance = ModelConfig.ADAPTIVE_TOLERANCE
+    if method not in INTEGRATORS:
+        raise ValueError(
+            f"Unknown integrator '{method}', expected one of {INTEGRATORS}"
+        )
+    if np.ndim(steps) or np.ndim(dt):
+        raise ValueError("Adaptive stepping takes a single step count and time step")
+
+    dtype = np.result_type(opsin.dtype, np.float32)
+    ca = np.asarray(ca, dtype=dtype)
+    cd = np.asarray(cd, dtype=dtype)
+    radiance = np.asarray(radiance)
+    if np.issubdtype(radiance.dtype, np.integer):
+        ca = ca / dtype.type(255)
+    shape = np.broadcast_shapes(opsin.shape, radiance.shape, ca.shape, cd.shape)
+    if out is None:
+        out = np.empty(shape, dtype=dtype)
+
+    # Per-value step coefficients over the whole frame; `state` holds the working set.
+    drive = np.broadcast_to(np.multiply(ca, radiance, dtype=dtype), shape).reshape(-1)
+    rate = drive + np.broadcast_to(cd, shape).reshape(-1)
+    state = np.array(np.broadcast_to(opsin, shape), dtype=dtype).reshape(-1)
+    if method == 'exact':
+        scale = np.exp(-rate * dtype.type(dt))
+        offset = np.zeros_like(state)
+        np.divide(drive, rate, out=offset, where=rate > 0)
+        offset *= 1 - scale
+    else:
+        scale = 1 - rate * dtype.type(dt)
+        offset = drive * dtype.type(dt)
+    contraction = np.abs(scale)
+    # Pixels with |a| >= 1 never settle by the bound, only once unchanged.
+    gain = np.full_like(state, np.finfo(dtype).max)
+    np.divide(contraction, 1 - contraction, out=gain, where=contraction < 1)
+    gain[(scale < 0) & (contraction < 1)] *= 2
+    index = np.arange(state.size)
+    result = out if out.flags.c_contiguous else np.empty(shape, dtype=dtype)
+    flat_out = result.reshape(-1)
+    stepped = np.empty_like(state)
+    bound = np.empty_like(state)
+
+    iterations = 0
+    residual = 0.0
+    active = state.size
+    while active and iterations < steps:
+        iterations += 1
+        new, old, error = stepped[:active], state[:active], bound[:active]
+        np.multiply(scale[:active], old, out=new)
+        new += offset[:active]
+        if method == 'euler':
+            np.clip(new, 0, 1, out=new)
+        np.subtract(new, old, out=error)
+        np.abs(error, out=error)
+        with np.errstate(over='ignore'):
+            error *= gain[:active]
+        state, stepped = stepped, state
+        settled = error <= tolerance
+        count = np.count_nonzero(settled)
+        # Compacting costs a pass over the working set, so wait until it shrinks by an
+        # eighth. After the last step the working set is the fixed-step result and needs
+        # no compacting.
+        if count and count * 8 >= active and iterations < steps:
+            residual = max(residual, float(error[settled].max()))
+            flat_out[index[:active][settled]] = state[:active][settled]
+            keep = ~settled
+            remaining = active - count
+            for array in (state, scale, offset, gain, index):
+                array[:remaining] = array[:active][keep]
+            active = remaining
+    flat_out[index[:active]] = state[:active]
+    if result is not out:
+        np.copyto(out, result)
+    return out, iterations, residual
@@ -3,10 +3,82 @@ class ModelConfig:
     CA_RGB = (0.2, 0.3, 0.5)
     CD_RGB = (0.1, 0.15, 0.2)
 
+    # Photoreceptor kinetics parameters for the spectral model (L, M, S cones, rods)
+    CA_PS = (0.2, 0.3, 0.5, 0.1)
+    CD_PS = (0.1, 0.15, 0.2, 0.05)
+
+    # Observer and display used to derive the RGB -> photoreceptor excitation transform
+    OBSERVER_AGE = 32
+    OBSERVER_FIELD_SIZE = 10
+    DISPLAY_PRIMARIES = "CRT"
+    EXCITATION_CACHE_DIR = ".cache/excitation"
+
+    # On-disk cache of intermediate stage outputs (see model/utils/stage_cache.py)
+    STAGE_CACHE_DIR = ".cache/stages"
+    STAGE_CACHE_MB = 2048
+
     # Simulation parameters
     TIME_STEP = 0.05
     ITERATIONS = 20
     INTENSITY = 2.0
+    # Kinetics integrator: 'euler' (the iterated model, in closed form where the step
+    # does not overshoot) or 'exact' (the continuous-time solution; changes the outputs
+    # slightly, opt in)
+    INTEGRATOR = "euler"
+    # Largest deviation of the opsin state from the fixed-step result allowed to the
+    # adaptive stepping of integrate_adaptive (model/core/receptor_kinetics.py).
+    ADAPTIVE_TOLERANCE = 1e-4
+
+    # LMS / oRGB diffusion model (process_image_debug in
+    # notebooks/afterimage_test_finetune.ipynb), with the notebook's parameter names.
+    # The diffusion sigma is N_sigma / sqrt(30 fps).
+    OPPONENT_PARAMS = {
+        'kernel_size': 5,
+        'sigma_blur': 1.5,
+        'c_a': 0.3,
+        'c_d': 1.0,
+        'dt': 1.0 / 30.0,
+        'num_steps': 30,
+        'N_sigma': 10,
+        'kernel_size_diff': 5,
+        'alpha': 0.5,
+    }
+
+    # Frame representation: frames stay uint8 in OpenCV's channel order ("BGR") from
+    # decoding to encoding, and the opsin state is kept in STATE_DTYPE. The per-channel
+    # parameters above are in RGB order and are reordered to the frame layout.
+    FRAME_LAYOUT = "BGR"
+    STATE_DTYPE = "float32"
+    # Pyramid level of the opsin state: 0 is full resolution, n keeps it at 1 / 2 ** n
+    # of the frame size and upsamples the afterimage (see AfterimageState).
+    PYRAMID_LEVEL = 0
+    # Incremental mode (model/processing/incremental.py): a tile of INCREMENTAL_TILE
+    # pixels is skipped while its input has changed by at most INCREMENTAL_THRESHOLD
+    # (fraction of full scale) and its opsin state is within INCREMENTAL_EPSILON of the
+    # steady state.
+    INCREMENTAL_TILE = 32
+    INCREMENTAL_THRESHOLD = 2 / 255
+    INCREMENTAL_EPSILON = 1e-3
+    # Frames between checkpoints of the sequence state (model/utils/checkpoint.py).
+    CHECKPOINT_INTERVAL = 500
+    # Fovea radius in pixels of the cone density map (model/core/anatomical.py) used for
+    # gaze-contingent video processing.
+    FOVEA_RADIUS = 100
+
+    # Afterimage service (model/processing/afterimage_service.py): its Unix socket, and
+    # the largest batch of jobs and how long the batcher waits for a batch to fill.
+    SERVICE_SOCKET = ".cache/afterimage_service.sock"
+    SERVICE_MAX_BATCH = 16
+    SERVICE_BATCH_WINDOW_MS = 5
+
+    # Multi-video batches (model/video/batch_scheduler.py): memory of a worker process
+    # before its frame buffers, and the share of the available memory given to the jobs.
+    SCHEDULER_PROCESS_MB = 64
+    SCHEDULER_MEMORY_FRACTION = 0.8
+
+    # Out-of-core HDR processing (model/processing/out_of_core.py): memory budget of the
+    # tiles an image is streamed through, halos included.
+    TILE_MEMORY_MB = 512
 
     # Default I/O directories (adjust as needed)
     DEFAULT_INPUT_DIR = "data/afterimage/1_batch_prototype/input"
@@ -16,3 +88,40 @@ class ModelConfig:
     # Video settings
     FPS = 10
     ALPHA_BLEND = 0.5
+
+
+def load_config(path: str) -> dict:
+    """
+    Apply ModelConfig overrides from a JSON file of {field: value}, such as the fitted
+    parameters written by model.processing.calibration. Lists become tuples.
+
+    Returns:
+        dict: The overrides that were applied.
+    """
+    import json
+    with open(path) as f:
+        overrides = json.load(f)
+    unknown = [name for name in overrides if not hasattr(ModelConfig, name)]
+    if unknown:
+        raise ValueError(f"Unknown ModelConfig fields {unknown} in {path}")
+    apply_config(overrides)
+    return overrides
+
+
+def config_snapshot() -> dict:
+    """
+    The current ModelConfig fields, overrides included, as {field: value}.
+
+    Worker processes started with spawn or forkserver import ModelConfig afresh and do
+    not see overrides applied in the parent (load_config, tests); pools pass this to
+    their workers through apply_config as the initializer.
+    """
+    return {name: value for name, value in vars(ModelConfig).items() if name.isupper()}
+
+
+def apply_config(overrides: dict) -> None:
+    """
+    Set ModelConfig fields from {field: value}. Lists become tuples.
+    """
+    for name, value in overrides.items():
+        setattr(ModelConfig, name, tuple(value) if isinstance(value, list) else value)
@@ -1,8 +1,17 @@
 import numpy as np
 
+from model.core.kinetics_lut import generate_afterimage_lut
+from model.core.opponent_afterimage import (
+    effective_radiance,
+    opponent_composite,
+    opponent_kinetics,
+)
 from model.core.photoreceptor_model import simulate_spectral_temporal_bleaching
+from model.core.receptor_kinetics import advance_opsin
 from model.model_config import ModelConfig
-from model.utils.file_utils import read_image, save_image
+from model.utils.file_utils import read_frame, save_frame
+from model.utils.pysilsub_integration import compute_photoreceptor_excitation
+from model.utils.stage_cache import StageCache, file_digest, run_stage
 
 
 def generate_afterimage_with_spectral_bleaching(input_image: np.ndarray, params: dict) -> np.ndarray:
@@ -29,18 +38,114 @@ def generate_afterimage_with_spectral_bleaching(input_image: np.ndarray, params:
     return np.clip(afterimage, 0, 1)
 
 
+def render_afterimage(
+    input_path: str, model: str = 'spectral', cache: StageCache = None
+) -> np.ndarray:
+    """
+    Afterimage of an image file as a BGR image with values in [0, 1].
+
+    'spectral' runs generate_afterimage_with_spectral_bleaching with the ModelConfig
+    settings, 'opponent' the LMS / oRGB diffusion model (composited with the input) and
+    'rgb' the per-channel kinetics of the frame batch (CA_RGB, CD_RGB), as for the first
+    frame of a sequence, through the lookup table of generate_afterimage_lut.
+    With a StageCache, every stage before the final compositing is loaded from the cache
+    when its inputs and settings are unchanged, so e.g. a new INTENSITY only repeats the
+    compositing.
+    """
+    digest = file_digest(input_path) if cache is not None else None
+    frame, decode_key = run_stage(
+        cache, 'decode', (digest, 'BGR'), lambda: read_frame(input_path, layout='BGR')
+    )
+
+    if model == 'opponent':
+        radiance, radiance_key = run_stage(cache, 'effective_radiance', (decode_key,),
+                                           lambda: effective_radiance(frame))
+        r_lms, _ = run_stage(cache, 'opponent_opsin', (radiance_key, 'BGR'),
+                             lambda: opponent_kinetics(radiance, layout='BGR'))
+        return opponent_composite(radiance, r_lms, layout='BGR')[1]
+    if model == 'rgb':
+        return generate_afterimage_lut(frame, layout='BGR')
+
+    rgb = frame[:, :, ::-1] / 255.0
+    excitations, excitation_key = run_stage(
+        cache,
+        'excitation',
+        (decode_key,),
+        lambda: compute_photoreceptor_excitation(rgb),
+    )
+    final_state, _ = run_stage(
+        cache,
+        'spectral_opsin',
+        (excitation_key,),
+        lambda: advance_opsin(
+            np.ones_like(excitations),
+            excitations,
+            ca=ModelConfig.CA_PS,
+            cd=ModelConfig.CD_PS,
+        ),
+    )
+    return spectral_composite(final_state)
+
+
+def spectral_composite(final_state: np.ndarray) -> np.ndarray:
+    """
+    BGR afterimage in [0, 1] from the spectral opsin state (..., 4).
+    """
+    # Cone channels (L, M, S) are in RGB order; reverse them for the BGR output.
+    afterimage = (1.0 - final_state[..., 2::-1]) * ModelConfig.INTENSITY
+    return np.clip(afterimage, 0, 1)
+
+
+def spectral_afterimages(frames: list) -> list:
+    """
+    render_afterimage(model='spectral') for several decoded BGR uint8 frames at once.
+
+    Every stage of the spectral model is per pixel, so the pixels of all frames,
+    whatever their sizes, are concatenated and run through the excitation transform and
+    the kinetics together.
+
+    Returns:
+        list: The BGR afterimages in [0, 1], in the order of `frames`.
+    """
+    pixels = np.concatenate([frame.reshape(-1, 1, 3) for frame in frames])
+    rgb = pixels[:, :, ::-1] / 255.0
+    excitations = compute_photoreceptor_excitation(rgb)
+    final_state = advance_opsin(
+        np.ones_like(excitations),
+        excitations,
+        ca=ModelConfig.CA_PS,
+        cd=ModelConfig.CD_PS,
+        out=excitations,
+    )
+    afterimages = spectral_composite(final_state)
+    ends = np.cumsum([frame.shape[0] * frame.shape[1] for frame in frames])
+    pieces = np.split(afterimages, ends[:-1])
+    return [piece.reshape(frame.shape) for frame, piece in zip(frames, pieces)]
+
+
 def main():
     import argparse
     parser = argparse.ArgumentParser(description="Generate an afterimage using spectral temporal bleaching.")
     parser.add_argument("input_image", help="Path to the input image")
     parser.add_argument("output_image", help="Path to save the afterimage")
+    parser.add_argument(
+        "--model",
+        choices=("spectral", "opponent", "rgb"),
+        default="spectral",
+        help="'spectral': photoreceptor bleaching (default); "
+        "'opponent': LMS kinetics with diffusion and oRGB inversion, composited; "
+        "'rgb': per-channel RGB kinetics as one table lookup",
+    )
+    parser.add_argument("--cache", action="store_true",
+                        help="Reuse unchanged stages from ModelConfig.STAGE_CACHE_DIR")
     args = parser.parse_args()
 
-    input_img = read_image(args.input_image, color=True)
-    params = {'intensity': 2.0, 'iterations': 20}
-    output_img = generate_afterimage_with_spectral_bleaching(input_img, params)
-    save_image(args.output_image, output_img)
+    cache = StageCache() if args.cache else None
+    output_img = render_afterimage(args.input_image, args.model, cache)
+    save_frame(args.output_image, output_img, layout='BGR')
     print("Afterimage saved to:", args.output_image)
+    if cache is not None:
+        print(cache.report())
 
 
 if __name__ == "__main__":
@@ -3,15 +3,430 @@ import os
 import cv2
 import numpy as np
 
-from model.core.receptor_kinetics import update_opsin_concentration
-from model.model_config import ModelConfig
-from model.utils.file_utils import read_image, save_image, list_images
+from model.core.kinetics_lut import get_opsin_lut
+from model.core.receptor_kinetics import advance_opsin, integrate_adaptive
+from model.model_config import ModelConfig, load_config
+from model.utils.file_utils import read_frame, save_frame, to_uint8
+from model.utils.checkpoint import CHECKPOINT_DIR, SequenceCheckpoint
+from model.utils.frame_arena import (
+    BufferPool,
+    FrameArena,
+    format_memory_report,
+    memory_report,
+)
+from model.utils.frame_format import channel_params, check_layout, state_dtype
+from model.utils.frame_store import (
+    STORE_SUFFIX,
+    FrameStore,
+    FrameStoreWriter,
+    frame_digest,
+    is_frame_store,
+    open_frames,
+)
+from model.utils.image_metrics import psnr, ssim
+from model.utils.stage_cache import StageCache, file_digest, run_stage, stage_key
+from model.utils.staged_pipeline import MAX_IN_FLIGHT, format_stage_report, run_staged
 
 # You can add a persistent overlay blending weight to your config, or define it here:
 PERSISTENT_ALPHA = 0.5  # Weight for the previous frame's afterimage in the overlay
 
 
-def process_frame_sequence(input_folder: str = None, output_folder: str = None):
+def compute_afterimage(
+    opsin: np.ndarray, out: np.ndarray = None, intensity=None
+) -> np.ndarray:
+    """
+    Afterimage from the opsin state: per-channel bleaching scaled by `intensity`
+    (default ModelConfig.INTENSITY; an array broadcasts, e.g. one per parameter set).
+    With `out` the afterimage is computed in that buffer.
+    """
+    if intensity is None:
+        intensity = ModelConfig.INTENSITY
+    afterimage = np.subtract(1.0, opsin, out=out)  # preserves color differences
+    afterimage *= intensity
+    return np.clip(afterimage, 0, 1, out=afterimage)
+
+
+def compose_persistent_overlay(
+    frame: np.ndarray,
+    previous_afterimage: np.ndarray = None,
+    out: np.ndarray = None,
+    arena: FrameArena = None,
+) -> np.ndarray:
+    """
+    Blend the current original frame with the previous frame's afterimage.
+    For the first frame (no previous afterimage) the original is used.
+
+    The overlay has the frame's representation: uint8 for uint8 frames, otherwise
+    float32 in [0, 1]. For uint8 frames, `out` and `arena` spare the blend any
+    allocation.
+    """
+    if previous_afterimage is None:
+        if out is None:
+            return frame.copy()
+        np.copyto(out, frame)
+        return out
+    # Note: cv2.addWeighted expects uint8 images.
+    if frame.dtype == np.uint8:
+        prev_af_uint8 = None
+        if arena is not None:
+            prev_af_uint8 = arena.get(
+                ('overlay', 'previous_afterimage'), previous_afterimage.shape, np.uint8
+            )
+        prev_af_uint8 = to_uint8(previous_afterimage, out=prev_af_uint8)
+        return cv2.addWeighted(
+            frame, 1 - PERSISTENT_ALPHA, prev_af_uint8, PERSISTENT_ALPHA, 0, dst=out
+        )
+    prev_af_uint8 = to_uint8(previous_afterimage)
+    orig_uint8 = to_uint8(frame)
+    persistent_overlay = cv2.addWeighted(
+        orig_uint8, 1 - PERSISTENT_ALPHA, prev_af_uint8, PERSISTENT_ALPHA, 0
+    )
+    persistent_overlay = persistent_overlay.astype(np.float32) / 255.0
+    if out is None:
+        return persistent_overlay
+    np.copyto(out, persistent_overlay)
+    return out
+
+
+class AfterimageState:
+    """
+    Persistent state of a frame sequence: opsin concentration and previous afterimage.
+
+    Frames are uint8 with channels in `layout` order (default ModelConfig.FRAME_LAYOUT,
+    the BGR order frames are decoded in); the rate constants are reordered to match, so
+    no colour conversion is needed. Float frames in [0, 1] are accepted as well. The
+    opsin state is kept in ModelConfig.STATE_DTYPE.
+
+    With use_lut=True frames must be uint8 and the kinetics run through the interpolated
+    (state x input) lookup table from model.core.kinetics_lut instead of advance_opsin.
+
+    The state is updated in place and all temporaries live in `arena`, a FrameArena
+    reused for every frame. With `ring` set, the returned afterimage and overlay are
+    also arena buffers, taken from a ring of `ring` slots: they stay valid for ring - 1
+    further steps, after which they are overwritten. Without `ring` every step returns
+    new arrays.
+
+    step() can take a StageCache and a content id of the frame (`source`). The opsin
+    state after each frame is then cached under a key chained from the key of the
+    previous state, so a re-run with only compositing settings changed (e.g. INTENSITY)
+    loads every state instead of running the kinetics.
+
+    With `level` > 0 (default ModelConfig.PYRAMID_LEVEL) the opsin state is kept at
+    1 / 2 ** level of the frame size: frames are area-averaged down before the kinetics
+    and only the afterimage is upsampled (bilinear) to the frame size, before
+    compositing. The afterimage is spatially smooth, so this costs little accuracy for
+    4 ** level less kinetics work.
+
+    With adaptive=True the kinetics are stepped by integrate_adaptive, which stops early
+    on the pixels that have settled to within ModelConfig.ADAPTIVE_TOLERANCE; the steps
+    taken and the deviation bound of the last frame are kept in `iterations` and
+    `residual`. This pays off where fixed stepping iterates (Euler with k * dt > 1);
+    otherwise the closed form of advance_opsin costs a single pass whatever the number
+    of steps.
+    """
+
+    def __init__(
+        self,
+        use_lut: bool = False,
+        layout: str = None,
+        ring: int = None,
+        level: int = None,
+        adaptive: bool = False,
+    ):
+        if use_lut and adaptive:
+            raise ValueError("Adaptive stepping cannot use the lookup tables")
+        self.use_lut = use_lut
+        self.adaptive = adaptive
+        self.iterations = ModelConfig.ITERATIONS  # Steps taken for the last frame
+        # Bound on the deviation of the last frame from fixed stepping
+        self.residual = 0.0
+        self.layout = check_layout(layout)
+        self.ca = channel_params(ModelConfig.CA_RGB, self.layout)
+        self.cd = channel_params(ModelConfig.CD_RGB, self.layout)
+        self.opsin_lut = get_opsin_lut(layout=self.layout) if use_lut else None
+        self.ring = ring
+        self.level = ModelConfig.PYRAMID_LEVEL if level is None else level
+        self.arena = FrameArena()
+        self.frame_index = 0
+        self.opsin = None
+        self.opsin_key = None  # Stage cache key of the current opsin state
+        self.previous_afterimage = None  # For persistent overlay
+
+    def state_frame(self, frame: np.ndarray) -> np.ndarray:
+        """
+        The frame at the resolution of the opsin state (the frame itself at level 0).
+        """
+        if not self.level:
+            return frame
+        factor = 2 ** self.level
+        height, width = frame.shape[:2]
+        size = (-(-width // factor), -(-height // factor))
+        reduced = self.arena.get(
+            ('pyramid', 'frame'), (size[1], size[0]) + frame.shape[2:], frame.dtype
+        )
+        return cv2.resize(frame, size, dst=reduced, interpolation=cv2.INTER_AREA)
+
+    def advance(self, frame: np.ndarray, cache: StageCache = None, source: str = None,
+                density: np.ndarray = None) -> None:
+        """
+        Advance the opsin state over one frame, through `cache` if given (see the class
+        docstring). With `density` (H x W, e.g. a cone density map) the kinetics see the
+        frame modulated by it; `source` must then identify the density too.
+        """
+        if density is not None:
+            if self.use_lut:
+                raise ValueError(
+                    "Density-modulated frames cannot use the lookup tables"
+                )
+            radiance = self.arena.get(
+                ('density', 'radiance'), frame.shape, state_dtype()
+            )
+            np.multiply(frame, density[..., None], out=radiance)
+            if np.issubdtype(frame.dtype, np.integer):
+                radiance *= radiance.dtype.type(1 / 255)
+            frame = radiance
+        frame = self.state_frame(frame)
+        # If first frame, initialize opsin as ones (same shape as the state frame)
+        if self.opsin is None:
+            dtype = np.float32 if self.use_lut else state_dtype()
+            self.opsin = np.ones(frame.shape, dtype=dtype)
+
+        if cache is not None:
+            inputs = (source, self.opsin_key, self.layout, self.use_lut, self.level)
+            if self.adaptive:
+                inputs += ('adaptive', ModelConfig.ADAPTIVE_TOLERANCE)
+            key = stage_key('opsin', inputs)
+            cached = cache.get('opsin', key)
+            self.opsin_key = key
+            if cached is not None:
+                np.copyto(self.opsin, cached)
+                return
+
+        # Advance opsin over ModelConfig.ITERATIONS time steps to simulate bleaching.
+        if self.use_lut:
+            self.opsin_lut.advance(self.opsin, frame, out=self.opsin, arena=self.arena)
+        elif self.adaptive:
+            _, self.iterations, self.residual = integrate_adaptive(
+                self.opsin, frame, ca=self.ca, cd=self.cd, out=self.opsin
+            )
+        else:
+            advance_opsin(
+                self.opsin,
+                frame,
+                ca=self.ca,
+                cd=self.cd,
+                out=self.opsin,
+                arena=self.arena,
+            )
+        if cache is not None:
+            cache.put('opsin', self.opsin_key, self.opsin)
+
+    def render_afterimage(self, shape: tuple, out: np.ndarray = None) -> np.ndarray:
+        """
+        The afterimage of the current opsin state at frame size `shape`, in `out` if
+        given.
+        """
+        if not self.level:
+            return compute_afterimage(self.opsin, out=out)
+        reduced = self.arena.get(
+            ('pyramid', 'afterimage'), self.opsin.shape, self.opsin.dtype
+        )
+        compute_afterimage(self.opsin, out=reduced)
+        return cv2.resize(
+            reduced, shape[1::-1], dst=out, interpolation=cv2.INTER_LINEAR
+        )
+
+    def step(
+        self,
+        frame: np.ndarray,
+        overlay: bool = True,
+        cache: StageCache = None,
+        source: str = None,
+        density: np.ndarray = None,
+    ) -> tuple:
+        """
+        Advance the sequence by one frame (see advance for `density`; the overlay uses
+        the unmodulated frame).
+
+        Returns:
+            tuple: (afterimage, persistent_overlay) in the frame's layout. The
+            afterimage has values in [0, 1]; the overlay has the frame's dtype (see
+            compose_persistent_overlay) and is None when overlay=False.
+        """
+        self.advance(frame, cache, source, density)
+
+        afterimage_buffer = overlay_buffer = None
+        if self.ring:
+            slot = self.frame_index % self.ring
+            afterimage_buffer = self.arena.get(
+                ('afterimage', slot), frame.shape, self.opsin.dtype
+            )
+            overlay_dtype = np.uint8 if frame.dtype == np.uint8 else np.float32
+            overlay_buffer = self.arena.get(
+                ('overlay', slot), frame.shape, overlay_dtype
+            )
+        self.frame_index += 1
+
+        # Create persistent overlay from the current original and the previous
+        # afterimage. This comes first: with ring=1 the afterimage reuses the previous
+        # afterimage's buffer.
+        persistent_overlay = None
+        if overlay:
+            persistent_overlay = compose_persistent_overlay(
+                frame, self.previous_afterimage, out=overlay_buffer, arena=self.arena
+            )
+        # Compute afterimage using per-channel processing.
+        afterimage = self.render_afterimage(frame.shape, out=afterimage_buffer)
+        self.previous_afterimage = afterimage
+        return afterimage, persistent_overlay
+
+
+PATHS = ('serial', 'tiles', 'segments')
+
+
+def check_modes(
+    path: str = 'serial',
+    use_lut: bool = False,
+    cache: bool = False,
+    level: int = None,
+    verify: bool = False,
+    incremental: bool = False,
+    fovea: tuple = None,
+    adaptive: bool = False,
+    checkpoint: bool = False,
+    input_folder: str = None,
+    output_folder: str = None,
+    io_threads: int = 0,
+) -> None:
+    """
+    Raise ValueError for a combination of processing modes that is not supported.
+
+    Parameters:
+        path: str
+            'serial' (process_frame_sequence, with or without I/O threads), 'tiles'
+            (model.processing.tile_parallel) or 'segments'
+            (model.processing.segment_parallel).
+        checkpoint: bool
+            Whether checkpoints are saved or read (checkpoint, resume or append).
+        The other parameters are those of process_frame_sequence; `cache` is whether a
+        stage cache is used.
+    """
+    if path not in PATHS:
+        raise ValueError(f"Unknown path '{path}', expected one of {PATHS}")
+    stores = [
+        folder
+        for folder in (input_folder, output_folder)
+        if folder and is_frame_store(folder)
+    ]
+    if path != 'serial':
+        unsupported = [
+            name
+            for name, used in (
+                ('the lookup tables', use_lut),
+                ('the stage cache', cache),
+                ('I/O threads', io_threads),
+                ('verification', verify and path == 'tiles'),
+                ('pyramid levels', level),
+                ('the incremental mode', incremental),
+                ('the foveated mode', fovea),
+                ('adaptive stepping', adaptive),
+                ('checkpoints', checkpoint),
+                ('frame stores', stores),
+            )
+            if used
+        ]
+        if unsupported:
+            raise ValueError(
+                "Only the serial path, without segments or band workers, supports "
+                + ", ".join(unsupported)
+            )
+    if checkpoint and (incremental or fovea or verify):
+        raise ValueError(
+            "Checkpoints cannot be combined with the incremental or foveated modes "
+            "or verification"
+        )
+    if checkpoint and output_folder is not None and is_frame_store(output_folder):
+        raise ValueError(
+            "Checkpoints need an image folder as output, not a frame store"
+        )
+    if adaptive and (use_lut or incremental or fovea):
+        raise ValueError(
+            "Adaptive stepping cannot be combined with the lookup tables, incremental "
+            "or foveated modes"
+        )
+    if (incremental or fovea) and (use_lut or cache):
+        raise ValueError(
+            "Incremental and foveated modes support neither the lookup tables nor the "
+            "stage cache"
+        )
+    if fovea and (incremental or level):
+        raise ValueError(
+            "The foveated mode cannot be combined with the incremental mode or pyramid "
+            "levels"
+        )
+
+
+def process_frame_sequence(
+    input_folder: str = None,
+    output_folder: str = None,
+    use_lut: bool = False,
+    io_threads: int = 0,
+    cache: StageCache = None,
+    level: int = None,
+    verify: bool = False,
+    incremental: bool = False,
+    fovea: tuple = None,
+    adaptive: bool = False,
+    checkpoint: bool = False,
+    resume: bool = False,
+    append: bool = False,
+):
+    """
+    Generate afterimage and persistent overlay frames for a folder of frames.
+    See AfterimageState for use_lut. Frames are read, processed and written as uint8 in
+    ModelConfig.FRAME_LAYOUT, without colour conversions.
+
+    With io_threads > 0, frames are read and written on that many threads each while the
+    kinetics run in order on a single compute thread (see model.utils.staged_pipeline),
+    and a per-stage occupancy report is printed.
+
+    The kinetics run in place and each frame's outputs are converted to uint8 into a
+    pool of reused buffers, one set per frame in flight, which writers hand back once
+    the frame is saved. Memory stays flat over long sequences; the buffer sizes and the
+    peak RSS are printed at the end.
+
+    With a StageCache, decoded frames and the opsin state after every frame are cached
+    by content; re-runs then only repeat the stages whose inputs or settings changed.
+
+    `level` keeps the opsin state at a pyramid level (see AfterimageState). With
+    verify=True a full-resolution run is done alongside and the PSNR and SSIM of the
+    afterimages against it are reported.
+
+    With incremental=True only the tiles whose input or state can still change are
+    integrated (see model.processing.incremental); the fraction of pixels integrated is
+    reported for every frame.
+
+    With fovea=(x, y, radius) the radiance is modulated by the cone density map and the
+    kinetics only run near the fovea (see model.processing.foveated).
+
+    With adaptive=True the kinetics stop early on settled pixels (see AfterimageState);
+    the steps taken and the deviation bound are reported for every frame.
+
+    With checkpoint=True the state is saved every ModelConfig.CHECKPOINT_INTERVAL frames
+    and after the last one to output_folder/.checkpoint (see model.utils.checkpoint).
+    resume=True continues from the latest checkpoint after the frame it records;
+    append=True does the same for a finished sequence, so only frames added to the input
+    folder since are processed. Both need the model settings of the checkpointed run.
+
+    Either folder may be a frame store (a folder ending in .frames, see
+    model.utils.frame_store) instead of a folder of images. Frames are then read as
+    views of the store's memory maps, without decoding, and written raw, without JPEG
+    losses, under the input's frame names and timestamps: the afterimages to
+    output_folder and the overlays to output_folder/persistent_overlay.frames.
+    """
+    checkpoint = checkpoint or resume or append
+    check_modes('serial', use_lut, cache is not None, level, verify, incremental, fovea,
+                adaptive, checkpoint, output_folder=output_folder)
     if input_folder is None:
         input_folder = ModelConfig.DEFAULT_INPUT_DIR
     if output_folder is None:
@@ -19,64 +434,186 @@ def process_frame_sequence(input_folder: str = None, output_folder: str = None):
 
     # Create output folders: one for the afterimage frames, one for persistent overlay frames.
     os.makedirs(output_folder, exist_ok=True)
-    persistent_overlay_folder = os.path.join(output_folder, "persistent_overlay")
+    store_output = is_frame_store(output_folder)
+    overlay_name = "persistent_overlay" + (STORE_SUFFIX if store_output else "")
+    persistent_overlay_folder = os.path.join(output_folder, overlay_name)
     os.makedirs(persistent_overlay_folder, exist_ok=True)
 
-    files = list_images(input_folder)
+    frames = open_frames(input_folder)
+    files = frames.names
     if not files:
         print("No frames found!")
         return
 
-    # Initialize opsin for afterimage generation.
-    opsin = None
-    previous_afterimage = None  # For persistent overlay
+    checkpoints = None
+    if checkpoint:
+        checkpoints = SequenceCheckpoint(os.path.join(output_folder, CHECKPOINT_DIR))
+    if (resume or append) and checkpoints.meta is None:
+        if append:
+            raise ValueError(f"No checkpoint in {output_folder} to append to")
+        print("No checkpoint found, starting from the first frame.")
 
-    for i, fname in enumerate(files):
-        input_path = os.path.join(input_folder, fname)
-        output_path = os.path.join(output_folder, fname)
-        overlay_path = os.path.join(persistent_overlay_folder, fname)
+    if incremental:
+        from model.processing.incremental import IncrementalAfterimageState
+        state = IncrementalAfterimageState(ring=1, level=level)
+    elif fovea:
+        from model.processing.foveated import FoveatedAfterimageState
+        state = FoveatedAfterimageState(fovea[:2], fovea[2], ring=1)
+    else:
+        state = AfterimageState(use_lut, ring=1, level=level, adaptive=adaptive)
+    reference = None
+    if verify and state.level:
+        reference = AfterimageState(use_lut, ring=1, level=0)
+    if (resume or append) and checkpoints.meta is not None:
+        meta = checkpoints.restore(state)
+        if append and not meta['finished']:
+            raise ValueError(
+                f"The sequence in {output_folder} was not finished; use resume"
+            )
+        if meta['last_file'] not in files:
+            raise ValueError(
+                f"The checkpointed frame {meta['last_file']} is not in {input_folder}"
+            )
+        files = files[files.index(meta['last_file']) + 1:]
+        print(
+            f"Continuing after frame {meta['frame_index']} ({meta['last_file']}) "
+            f"with {len(files)} new frames"
+        )
+        if not files:
+            return
+    frame_indices = {}
+    scores = []
+    active_fractions = {}
+    adaptive_steps = {}
+    outputs = BufferPool(MAX_IN_FLIGHT if io_threads else 1)
+    store_writers = None
+    if store_output:
+        fps = getattr(frames, 'fps', None) or ModelConfig.FPS
+        store_writers = (
+            FrameStoreWriter(output_folder, fps=fps, layout=state.layout),
+            FrameStoreWriter(persistent_overlay_folder, fps=fps, layout=state.layout),
+        )
+    timestamps = {}
+    if isinstance(frames, FrameStore):
+        timestamps = dict(zip(files, frames.timestamps))
 
-        frame = read_image(input_path, color=True)
-        if frame is None:
-            print(f"Skipping {fname} due to read error.")
-            continue
+    def read(fname):
+        if isinstance(frames, FrameStore):
+            frame = frames.frame(fname, state.layout)
+            digest = frame_digest(frame) if cache is not None else None
+            return digest, frame
+        path = os.path.join(input_folder, fname)
+        digest = file_digest(path) if cache is not None else None
+        frame, _ = run_stage(
+            cache,
+            'decode',
+            (digest, state.layout),
+            lambda: read_frame(path, state.layout),
+        )
+        return digest, frame
 
-        # If first frame, initialize opsin as ones (same shape as frame)
-        if opsin is None:
-            opsin = np.ones_like(frame)
+    def compute(fname, data):
+        digest, frame = data
+        afterimage, persistent_overlay = state.step(frame, cache=cache, source=digest)
+        if checkpoints is not None:
+            frame_indices[fname] = state.frame_index
+            if checkpoints.due(state.frame_index) and fname != files[-1]:
+                checkpoints.snapshot(state, fname)
+        if incremental:
+            active_fractions[fname] = state.active_fraction
+        if adaptive:
+            adaptive_steps[fname] = (state.iterations, state.residual)
+        if reference is not None:
+            full_resolution, _ = reference.step(frame, overlay=False)
+            scores.append(
+                (psnr(afterimage, full_resolution), ssim(afterimage, full_resolution))
+            )
+        buffers = outputs.acquire(
+            lambda: (np.empty(frame.shape, np.uint8), np.empty(frame.shape, np.uint8))
+        )
+        to_uint8(afterimage, out=buffers[0])
+        np.copyto(buffers[1], persistent_overlay)
+        return buffers
 
-        # Update opsin over several iterations to simulate bleaching.
-        for _ in range(ModelConfig.ITERATIONS):
-            opsin = update_opsin_concentration(opsin, frame)
-
-        # Compute afterimage using per-channel processing.
-        afterimage = 1.0 - opsin  # preserves color differences
-        afterimage *= ModelConfig.INTENSITY
-        afterimage = np.clip(afterimage, 0, 1)
-
-        # Save the afterimage frame.
-        save_image(output_path, afterimage)
-        print(f"Processed frame {i + 1}/{len(files)} (afterimage saved)")
-
-        # Create persistent overlay:
-        # For the first frame, use the original.
-        if i == 0:
-            persistent_overlay = frame.copy()
+    def write(fname, buffers):
+        afterimage, persistent_overlay = buffers
+        if store_writers is not None:
+            # Writes are in order (writers=1), so the stores keep the frame order.
+            store_writers[0].write(afterimage, fname, timestamps.get(fname))
+            store_writers[1].write(persistent_overlay, fname, timestamps.get(fname))
         else:
-            # Blend current original with previous frame's afterimage.
-            # Note: cv2.addWeighted expects uint8 images.
-            orig_uint8 = (frame * 255).astype(np.uint8)
-            prev_af_uint8 = (previous_afterimage * 255).astype(np.uint8)
-            persistent_overlay = cv2.addWeighted(orig_uint8, 1 - PERSISTENT_ALPHA, prev_af_uint8, PERSISTENT_ALPHA, 0)
-            persistent_overlay = persistent_overlay.astype(np.float32) / 255.0
-
-        # Save the persistent overlay frame.
-        save_image(overlay_path, persistent_overlay)
-        print(f"Persistent overlay frame saved: {overlay_path}")
-
-        # Update previous_afterimage for next frame.
-        previous_afterimage = afterimage.copy()
+            # Save the afterimage frame.
+            save_frame(os.path.join(output_folder, fname), afterimage)
+            # Save the persistent overlay frame.
+            overlay_path = os.path.join(persistent_overlay_folder, fname)
+            save_frame(overlay_path, persistent_overlay)
+        outputs.release(buffers)
+        if checkpoints is not None:
+            checkpoints.written(frame_indices.pop(fname))
+        if fname in active_fractions:
+            print(f"Processed {fname} (afterimage and persistent overlay saved, "
+                  f"{active_fractions[fname]:.1%} of pixels integrated)")
+        elif fname in adaptive_steps:
+            iterations, residual = adaptive_steps[fname]
+            print(
+                f"Processed {fname} (afterimage and persistent overlay saved, "
+                f"{iterations}/{ModelConfig.ITERATIONS} steps, residual {residual:.2e})"
+            )
+        else:
+            print(f"Processed {fname} (afterimage and persistent overlay saved)")
 
+    try:
+        # A frame store is appended to in order, by a single writer.
+        writers = min(io_threads, 1) if store_writers else io_threads
+        stats = run_staged(
+            files,
+            read,
+            compute,
+            write,
+            readers=io_threads,
+            writers=writers,
+            max_in_flight=MAX_IN_FLIGHT,
+        )
+    finally:
+        for writer in store_writers or ():
+            writer.close()
+    if io_threads:
+        print(format_stage_report(stats))
+    if checkpoints is not None:
+        checkpoints.snapshot(state, files[-1], finished=True)
+        print(
+            f"Checkpoint after frame {state.frame_index} ({files[-1]}) saved to "
+            f"{checkpoints.folder}"
+        )
+    print(format_memory_report(memory_report(state.arena, outputs)))
+    if fovea:
+        print(
+            f"Foveated mode integrated {state.active_fraction:.1%} of each frame "
+            f"(region {state.region})"
+        )
+    if active_fractions:
+        integrated = np.mean(list(active_fractions.values()))
+        print(
+            f"Incremental mode integrated {integrated:.1%} of the pixels "
+            f"over {len(active_fractions)} frames"
+        )
+    if adaptive_steps:
+        iterations = [steps for steps, _ in adaptive_steps.values()]
+        residual = max(r for _, r in adaptive_steps.values())
+        print(
+            f"Adaptive stepping took {np.mean(iterations):.1f} of "
+            f"{ModelConfig.ITERATIONS} steps per frame (max {max(iterations)}), "
+            f"largest residual {residual:.2e}"
+        )
+    if scores:
+        psnrs, ssims = np.array(scores).T
+        print(
+            f"Pyramid level {state.level} against full resolution: "
+            f"PSNR mean {psnrs.mean():.2f} dB (min {psnrs.min():.2f}), "
+            f"SSIM mean {ssims.mean():.4f} (min {ssims.min():.4f})"
+        )
+    if cache is not None:
+        print(cache.report())
     print("Batch processing completed.")
 
 
@@ -84,10 +621,166 @@ def main():
     import argparse
     parser = argparse.ArgumentParser(
         description="Batch process frames to generate afterimage and persistent overlay effects.")
-    parser.add_argument("--input_folder", default=None, help="Input folder (default: ModelConfig.DEFAULT_INPUT_DIR)")
-    parser.add_argument("--output_folder", default=None, help="Output folder (default: ModelConfig.DEFAULT_OUTPUT_DIR)")
+    parser.add_argument(
+        "--input_folder",
+        default=None,
+        help="Input folder or frame store (.frames) "
+        "(default: ModelConfig.DEFAULT_INPUT_DIR)",
+    )
+    parser.add_argument("--output_folder", default=None,
+                        help="Output folder, or a frame store if it ends in .frames "
+                             "(default: ModelConfig.DEFAULT_OUTPUT_DIR)")
+    parser.add_argument(
+        "--lut", action="store_true", help="Run the kinetics through lookup tables"
+    )
+    parser.add_argument(
+        "--io_threads",
+        type=int,
+        default=0,
+        help="Reader and writer threads overlapping I/O with the kinetics "
+        "(default: 0, serial)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Band workers for multi-core processing (default: 1)",
+    )
+    parser.add_argument(
+        "--tile_rows",
+        type=int,
+        default=None,
+        help="Rows per band (default: one band per worker)",
+    )
+    parser.add_argument(
+        "--segments",
+        type=int,
+        default=None,
+        help="Split the sequence into this many warmed-up segments processed by "
+        "--workers processes",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=None,
+        help="Allowed afterimage deviation for --segments "
+        "(default: half an 8-bit level)",
+    )
+    parser.add_argument(
+        "--verify",
+        action="store_true",
+        help="Report the deviation of --segments from a sequential run, "
+        "or of --level from full resolution",
+    )
+    parser.add_argument(
+        "--level",
+        type=int,
+        default=None,
+        help="Pyramid level of the opsin state, 1-3 for 1/2-1/8 "
+        "(default: ModelConfig.PYRAMID_LEVEL)",
+    )
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        help="Reuse decoded frames and opsin states from ModelConfig.STAGE_CACHE_DIR",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Skip tiles whose input and opsin state have converged (static regions)",
+    )
+    parser.add_argument(
+        "--fovea",
+        type=float,
+        nargs=3,
+        default=None,
+        metavar=("X", "Y", "RADIUS"),
+        help="Modulate by the cone density map and integrate only near the fovea",
+    )
+    parser.add_argument(
+        "--adaptive",
+        action="store_true",
+        help="Step the kinetics, stopping early on pixels settled to within "
+        "ModelConfig.ADAPTIVE_TOLERANCE (for Euler time steps too large for the "
+        "closed form)",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        action="store_true",
+        help="Save the sequence state every ModelConfig.CHECKPOINT_INTERVAL frames "
+        "and at the end",
+    )
+    parser.add_argument(
+        "--resume", action="store_true", help="Continue from the latest checkpoint"
+    )
+    parser.add_argument(
+        "--append",
+        action="store_true",
+        help="Continue a finished sequence with the frames added to the input "
+        "folder since",
+    )
+    parser.add_argument(
+        "--config",
+        default=None,
+        help="JSON file of ModelConfig overrides, "
+        "e.g. from model.processing.calibration",
+    )
     args = parser.parse_args()
-    process_frame_sequence(args.input_folder, args.output_folder)
+    path = 'serial'
+    if args.segments is not None:
+        path = 'segments'
+    elif args.workers > 1:
+        path = 'tiles'
+    try:
+        check_modes(
+            path,
+            args.lut,
+            args.cache,
+            args.level,
+            args.verify,
+            args.incremental,
+            args.fovea,
+            args.adaptive,
+            args.checkpoint or args.resume or args.append,
+            args.input_folder,
+            args.output_folder,
+            args.io_threads,
+        )
+    except ValueError as error:
+        parser.error(str(error))
+    if args.config:
+        load_config(args.config)
+    if args.segments is not None:
+        from model.processing.segment_parallel import process_frame_sequence_segmented
+        process_frame_sequence_segmented(
+            args.input_folder,
+            args.output_folder,
+            args.segments,
+            args.workers,
+            args.tolerance,
+            args.verify,
+        )
+    elif args.workers > 1:
+        from model.processing.tile_parallel import process_frame_sequence_parallel
+        process_frame_sequence_parallel(
+            args.input_folder, args.output_folder, args.workers, args.tile_rows
+        )
+    else:
+        process_frame_sequence(
+            args.input_folder,
+            args.output_folder,
+            use_lut=args.lut,
+            io_threads=args.io_threads,
+            cache=StageCache() if args.cache else None,
+            level=args.level,
+            verify=args.verify,
+            incremental=args.incremental,
+            fovea=args.fovea,
+            adaptive=args.adaptive,
+            checkpoint=args.checkpoint,
+            resume=args.resume,
+            append=args.append,
+        )
 
 
 if __name__ == "__main__":
@@ -2,9 +2,10 @@ import os
 
 import numpy as np
 
-from model.core.receptor_kinetics import update_opsin_concentration
+from model.core.receptor_kinetics import advance_opsin
 from model.model_config import ModelConfig
-from model.utils.file_utils import read_image, save_image, list_images
+from model.utils.file_utils import list_images, read_frame, save_frame
+from model.utils.frame_format import channel_params, state_dtype
 
 
 def process_frame_sequence(input_folder: str = None, output_folder: str = None):
@@ -19,22 +20,23 @@ def process_frame_sequence(input_folder: str = None, output_folder: str = None):
         print("No frames found!")
         return
 
+    ca = channel_params(ModelConfig.CA_RGB)
+    cd = channel_params(ModelConfig.CD_RGB)
     opsin = None
     for i, fname in enumerate(files):
         input_path = os.path.join(input_folder, fname)
         output_path = os.path.join(output_folder, fname)
-        frame = read_image(input_path, color=True)
+        frame = read_frame(input_path)
         if opsin is None:
-            opsin = np.ones_like(frame)
-        for _ in range(ModelConfig.ITERATIONS):
-            opsin = update_opsin_concentration(opsin, frame)
+            opsin = np.ones(frame.shape, dtype=state_dtype())
+        opsin = advance_opsin(opsin, frame, ca=ca, cd=cd)
         # afterimage = (1.0 - opsin.mean(axis=2)) * ModelConfig.INTENSITY
         # afterimage = np.clip(afterimage, 0, 1)
         # afterimage_rgb = np.stack([afterimage] * 3, axis=-1)
         afterimage = 1.0 - opsin  # This preserves per-channel bleaching
         afterimage *= ModelConfig.INTENSITY
         afterimage = np.clip(afterimage, 0, 1)
-        save_image(output_path, afterimage)
+        save_frame(output_path, afterimage)
         print(f"Processed frame {i + 1}/{len(files)}")
     print("Batch processing completed.")
 
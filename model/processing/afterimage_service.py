@@ -0,0 +1,409 @@
+import asyncio
+import collections
+import json
+import os
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from model.model_config import ModelConfig, load_config
+from model.processing.afterimage import render_afterimage, spectral_afterimages
+from model.utils.excitation_engine import get_excitation_transform
+from model.utils.file_utils import read_frame, save_frame
+
+MODELS = ('spectral', 'opponent')
+# Latencies kept for the percentiles.
+LATENCY_WINDOW = 10000
+
+
+class LatencyStats:
+    """
+    Latencies of the most recent LATENCY_WINDOW jobs and their percentiles.
+    """
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.latencies = collections.deque(maxlen=window)
+
+    def add(self, seconds: float) -> None:
+        self.latencies.append(seconds)
+
+    def percentiles(self, points=(50, 90, 99)) -> dict:
+        """
+        Returns:
+            dict: {'p50': ms, ...}, empty before the first job.
+        """
+        if not self.latencies:
+            return {}
+        values = np.percentile(np.array(self.latencies) * 1000, points)
+        return {f"p{point}": float(value) for point, value in zip(points, values)}
+
+
+class AfterimageService:
+    """
+    Long-running afterimage renderer that keeps its warmed state between jobs.
+
+    warm() loads what every job would otherwise set up again: the RGB -> photoreceptor
+    excitation transform (model.utils.excitation_engine), OpenCV's codecs and a pool of
+    worker threads. Jobs render one image file to another, like
+    python -m model.processing.afterimage.
+
+    Jobs are queued and taken in batches: after the first job of a batch the batcher
+    waits up to `batch_window` seconds for more, up to `max_batch`. All spectral jobs of
+    a batch run through one vectorized pass (spectral_afterimages); opponent jobs, whose
+    blur and diffusion are spatial, are rendered one by one. Up to `workers` batches run
+    at once on the thread pool while the asyncio front end keeps accepting jobs.
+
+    stats() reports the queue depth, the jobs in progress, the batch sizes and the
+    latency percentiles (from receipt to the written output).
+
+    Parameters:
+        max_batch : int, optional
+            Largest batch (default ModelConfig.SERVICE_MAX_BATCH).
+        batch_window : float, optional
+            Seconds to wait for a batch to fill (default
+            ModelConfig.SERVICE_BATCH_WINDOW_MS).
+        workers : int, optional
+            Worker threads (default: the number of CPUs).
+    """
+
+    def __init__(
+        self, max_batch: int = None, batch_window: float = None, workers: int = None
+    ):
+        self.max_batch = max_batch or ModelConfig.SERVICE_MAX_BATCH
+        if batch_window is None:
+            batch_window = ModelConfig.SERVICE_BATCH_WINDOW_MS / 1000
+        self.batch_window = batch_window
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = None
+        self.queue = None
+        self.slots = None
+        self.in_flight = 0
+        self.jobs = 0
+        self.failures = 0
+        self.batches = 0
+        self.latency = LatencyStats()
+        self.started = None
+        self._batcher = None
+        self._batch_tasks = set()
+        self._stopped = None
+
+    def warm(self) -> None:
+        """
+        Load the resident state: excitation transform, codecs and thread pool.
+        """
+        get_excitation_transform()
+        spectral_afterimages([np.zeros((8, 8, 3), dtype=np.uint8)])
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(
+                self.workers, thread_name_prefix="afterimage"
+            )
+
+    async def start(self) -> None:
+        """
+        Warm up and start the batcher on the running event loop.
+        """
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.warm)
+        self.queue = asyncio.Queue()
+        self.slots = asyncio.Semaphore(self.workers)
+        self._stopped = asyncio.Event()
+        self._batcher = asyncio.create_task(self._run_batches())
+        self.started = time.time()
+
+    async def stop(self) -> None:
+        """
+        Stop taking jobs, let the running batches finish and answer the jobs still
+        queued with an error.
+        """
+        if self._batcher is not None:
+            self._batcher.cancel()
+            await asyncio.gather(self._batcher, return_exceptions=True)
+            self._batcher = None
+        if self._batch_tasks:
+            await asyncio.gather(*self._batch_tasks, return_exceptions=True)
+        if self.queue is not None:
+            while not self.queue.empty():
+                _fail([self.queue.get_nowait()], "The service stopped")
+        if self.executor is not None:
+            await asyncio.get_running_loop().run_in_executor(
+                None, self.executor.shutdown
+            )
+            self.executor = None
+        if self._stopped is not None:
+            self._stopped.set()
+
+    async def submit(self, job: dict) -> dict:
+        """
+        Queue a job {'input': path, 'output': path, 'model': 'spectral' or 'opponent'}
+        and wait for it.
+
+        Returns:
+            dict: {'ok': True, 'output', 'latency_ms', 'batch'} or
+            {'ok': False, 'error'}.
+        """
+        model = job.get('model', 'spectral')
+        if model not in MODELS:
+            error = f"Unknown model '{model}', expected one of {MODELS}"
+            return {'ok': False, 'error': error}
+        if not job.get('input') or not job.get('output'):
+            return {'ok': False, 'error': "A job needs 'input' and 'output' paths"}
+        if self._batcher is None:
+            return {'ok': False, 'error': "The service is not running"}
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((time.perf_counter(), dict(job, model=model), future))
+        return await future
+
+    async def _run_batches(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            try:
+                deadline = loop.time() + self.batch_window
+                while len(batch) < self.max_batch:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+                await self.slots.acquire()
+            except asyncio.CancelledError:
+                _fail(batch, "The service stopped")
+                raise
+            self.in_flight += len(batch)
+            self.batches += 1
+            # The loop keeps only weak references to tasks: hold them until done.
+            task = asyncio.create_task(self._run_batch(batch))
+            self._batch_tasks.add(task)
+            task.add_done_callback(self._batch_tasks.discard)
+
+    async def _run_batch(self, batch: list) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            jobs = [job for _, job, _ in batch]
+            results = await loop.run_in_executor(self.executor, render_jobs, jobs)
+        except Exception as error:  # e.g. the pool shutting down
+            results = [error] * len(batch)
+        finally:
+            self.in_flight -= len(batch)
+            self.slots.release()
+        now = time.perf_counter()
+        for (received, job, future), result in zip(batch, results):
+            self.jobs += 1
+            if isinstance(result, Exception):
+                self.failures += 1
+                reply = {'ok': False, 'error': f"{type(result).__name__}: {result}"}
+            else:
+                self.latency.add(now - received)
+                reply = {
+                    'ok': True,
+                    'output': job['output'],
+                    'latency_ms': (now - received) * 1000,
+                    'batch': len(batch),
+                }
+            if not future.done():
+                future.set_result(reply)
+
+    def stats(self) -> dict:
+        """
+        Returns:
+            dict: queue depth, jobs in progress, completed jobs and failures, batches
+            with their mean size, uptime and the latency percentiles in milliseconds.
+        """
+        return {
+            'queue_depth': self.queue.qsize() if self.queue is not None else 0,
+            'in_flight': self.in_flight,
+            'jobs': self.jobs,
+            'failures': self.failures,
+            'batches': self.batches,
+            'mean_batch': self.jobs / self.batches if self.batches else 0.0,
+            'uptime_s': time.time() - self.started if self.started else 0.0,
+            'latency_ms': self.latency.percentiles(),
+        }
+
+    async def handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """
+        Serve one connection: one JSON request per line, one JSON reply per line.
+
+        Requests are {'op': 'render', ...job} (the default op, see submit),
+        {'op': 'stats'} and {'op': 'shutdown'}. Requests of a connection are answered in
+        order.
+        """
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    op = request.pop('op', 'render')
+                except (ValueError, AttributeError, TypeError) as error:
+                    reply = {'ok': False, 'error': f"Bad request: {error}"}
+                    op = None
+                if op == 'render':
+                    reply = await self.submit(request)
+                elif op == 'stats':
+                    reply = dict(self.stats(), ok=True)
+                elif op == 'shutdown':
+                    reply = {'ok': True}
+                elif op is not None:
+                    reply = {'ok': False, 'error': f"Unknown op '{op}'"}
+                writer.write(json.dumps(reply).encode() + b"\n")
+                await writer.drain()
+                if op == 'shutdown':
+                    await self.stop()
+                    break
+        finally:
+            writer.close()
+
+    async def serve(self, socket_path: str = None, port: int = None) -> None:
+        """
+        Serve on a Unix socket (default ModelConfig.SERVICE_SOCKET) or, with `port`, on
+        localhost TCP, until a shutdown request.
+        """
+        await self.start()
+        if port is not None:
+            server = await asyncio.start_server(self.handle, '127.0.0.1', port)
+            address = f"127.0.0.1:{port}"
+        else:
+            socket_path = socket_path or ModelConfig.SERVICE_SOCKET
+            if os.path.dirname(socket_path):
+                os.makedirs(os.path.dirname(socket_path), exist_ok=True)
+            if os.path.exists(socket_path):
+                os.remove(socket_path)
+            server = await asyncio.start_unix_server(self.handle, socket_path)
+            address = socket_path
+        print(
+            f"Afterimage service ready on {address} ({self.workers} workers, "
+            f"batches of up to {self.max_batch} within "
+            f"{self.batch_window * 1000:.0f} ms)",
+            flush=True,
+        )
+        async with server:
+            await self._stopped.wait()
+        if port is None and os.path.exists(socket_path):
+            os.remove(socket_path)
+        print(f"Afterimage service stopped: {json.dumps(self.stats())}")
+
+
+def _fail(batch: list, error: str) -> None:
+    """
+    Answer the (received, job, future) entries of a batch with an error.
+    """
+    for _, _, future in batch:
+        if not future.done():
+            future.set_result({'ok': False, 'error': error})
+
+
+def render_jobs(jobs: list) -> list:
+    """
+    Render a batch of jobs (see AfterimageService.submit), spectral ones in one pass.
+
+    Returns:
+        list: None for every written output, or the exception raised for that job.
+    """
+    results = [None] * len(jobs)
+    spectral = []
+    for i, job in enumerate(jobs):
+        try:
+            if job['model'] == 'spectral':
+                spectral.append((i, read_frame(job['input'], layout='BGR')))
+            else:
+                afterimage = render_afterimage(job['input'], job['model'])
+                save_frame(job['output'], afterimage, layout='BGR')
+        except Exception as error:
+            results[i] = error
+    if spectral:
+        afterimages = spectral_afterimages([frame for _, frame in spectral])
+        for (i, _), afterimage in zip(spectral, afterimages):
+            try:
+                save_frame(jobs[i]['output'], afterimage, layout='BGR')
+            except Exception as error:
+                results[i] = error
+    return results
+
+
+def request(
+    message: dict, socket_path: str = None, port: int = None, timeout: float = None
+) -> dict:
+    """
+    Send one request to a running service and return its reply (blocking).
+    """
+    if port is not None:
+        connection = socket.create_connection(('127.0.0.1', port), timeout=timeout)
+    else:
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.settimeout(timeout)
+        connection.connect(socket_path or ModelConfig.SERVICE_SOCKET)
+    with connection, connection.makefile('rwb') as stream:
+        stream.write(json.dumps(message).encode() + b"\n")
+        stream.flush()
+        return json.loads(stream.readline())
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Warm afterimage service: keeps the model loaded and batches "
+        "single-image jobs."
+    )
+    parser.add_argument(
+        "--socket",
+        default=None,
+        help="Unix socket (default: ModelConfig.SERVICE_SOCKET)",
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=None,
+        help="Use TCP on 127.0.0.1 at this port instead",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve = commands.add_parser(
+        "serve", help="Run the service until a shutdown request"
+    )
+    serve.add_argument(
+        "--workers", type=int, default=None, help="Worker threads (default: CPU count)"
+    )
+    serve.add_argument(
+        "--max_batch", type=int, default=None, help="Largest batch of jobs"
+    )
+    serve.add_argument(
+        "--batch_window_ms", type=float, default=None, help="Wait for a batch to fill"
+    )
+    serve.add_argument(
+        "--config", default=None, help="JSON file of ModelConfig overrides"
+    )
+    render = commands.add_parser("render", help="Render an image through the service")
+    render.add_argument("input_image", help="Path to the input image")
+    render.add_argument("output_image", help="Path to save the afterimage")
+    render.add_argument("--model", choices=MODELS, default="spectral")
+    commands.add_parser("stats", help="Print queue depth and latency percentiles")
+    commands.add_parser("shutdown", help="Stop the service")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        if args.config:
+            load_config(args.config)
+        window = None if args.batch_window_ms is None else args.batch_window_ms / 1000
+        service = AfterimageService(args.max_batch, window, args.workers)
+        asyncio.run(service.serve(args.socket, args.port))
+        return
+    if args.command == "render":
+        message = {'op': 'render', 'input': os.path.abspath(args.input_image),
+                   'output': os.path.abspath(args.output_image), 'model': args.model}
+    else:
+        message = {'op': args.command}
+    reply = request(message, args.socket, args.port)
+    print(json.dumps(reply, indent=2))
+    if not reply.get('ok'):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
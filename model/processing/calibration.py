@@ -0,0 +1,333 @@
+import json
+import os
+import time
+
+import cv2
+import numpy as np
+
+from model.core.receptor_kinetics import INTEGRATORS, advance_opsin
+from model.model_config import ModelConfig
+from model.processing.afterimage_batch import compute_afterimage
+from model.utils.file_utils import list_images
+
+CALIBRATED_FIELDS = ('CA_RGB', 'CD_RGB', 'INTENSITY')
+
+# cv2.imread flags that decode a JPEG directly at 1/2, 1/4 and 1/8 of its size.
+_REDUCED_READS = {
+    1: cv2.IMREAD_REDUCED_COLOR_2,
+    2: cv2.IMREAD_REDUCED_COLOR_4,
+    3: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+
+def read_level(path: str, level: int = 0) -> np.ndarray:
+    """
+    Read an image as uint8 RGB at pyramid level `level` (1 / 2 ** level of its size).
+    Levels 1 to 3 are decoded at reduced size, which for JPEGs skips most of the work.
+    """
+    image = cv2.imread(path, _REDUCED_READS.get(min(level, 3), cv2.IMREAD_COLOR))
+    if image is None:
+        raise IOError(f"Cannot read image {path}")
+    for _ in range(level - 3):
+        image = cv2.pyrDown(image)
+    return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+
+def load_pairs(input_folder: str, reference_folder: str, level: int = 0) -> list:
+    """
+    (name, frame, reference) for the images present under the same name in both folders,
+    as uint8 RGB at pyramid level `level`. References are resized to their frame's size.
+    """
+    references = set(list_images(reference_folder))
+    pairs = []
+    for name in list_images(input_folder):
+        if name not in references:
+            continue
+        frame = read_level(os.path.join(input_folder, name), level)
+        reference = read_level(os.path.join(reference_folder, name), level)
+        if reference.shape != frame.shape:
+            reference = cv2.resize(
+                reference, frame.shape[1::-1], interpolation=cv2.INTER_AREA
+            )
+        pairs.append((name, frame, reference))
+    return pairs
+
+
+def sample_pixels(pairs, samples: int, rng: np.random.Generator) -> tuple:
+    """
+    `samples` random pixels drawn uniformly from all pairs.
+
+    Returns:
+        tuple: (radiance, reference), N x 3 float64 RGB values in [0, 1].
+    """
+    frames = np.concatenate([frame.reshape(-1, 3) for _, frame, _ in pairs])
+    references = np.concatenate([reference.reshape(-1, 3) for _, _, reference in pairs])
+    index = rng.choice(len(frames), size=min(samples, len(frames)), replace=False)
+    return frames[index] / 255.0, references[index] / 255.0
+
+
+def afterimage_response(
+    radiance: np.ndarray,
+    ca,
+    cd,
+    intensity: float,
+    steps: int = None,
+    dt: float = None,
+    method: str = None,
+) -> tuple:
+    """
+    The afterimage of one frame from unbleached opsin (AfterimageState's first step)
+    and its analytic derivatives with respect to the kinetics parameters.
+
+    From r0 = 1, advance_opsin gives 1 - r = (cd / k) * (1 - D(k)) with k = ca * L + cd
+    and D = exp(-k * steps * dt) ('exact') or (1 - k * dt) ** steps ('euler', valid
+    while k * dt <= 1). The afterimage is clip(intensity * (1 - r), 0, 1); its
+    derivatives are zero where the clip is active.
+
+    Parameters:
+        radiance : np.ndarray
+            N x C radiance in [0, 1].
+        ca, cd : sequence of float
+            Per-channel rate constants (C values).
+        intensity : float
+            Afterimage intensity.
+        steps, dt, method : optional
+            As for advance_opsin (default: ModelConfig).
+    Returns:
+        tuple: (afterimage, d_ca, d_cd, d_intensity), each N x C; d_ca[:, c] is the
+        derivative of channel c with respect to ca[c], on which no other channel
+        depends.
+    """
+    if steps is None:
+        steps = ModelConfig.ITERATIONS
+    if dt is None:
+        dt = ModelConfig.TIME_STEP
+    if method is None:
+        method = ModelConfig.INTEGRATOR
+    if method not in INTEGRATORS:
+        raise ValueError(
+            f"Unknown integrator '{method}', expected one of {INTEGRATORS}"
+        )
+    ca = np.asarray(ca, dtype=np.float64)
+    cd = np.asarray(cd, dtype=np.float64)
+
+    k = ca * radiance + cd
+    if method == 'exact':
+        decay = np.exp(-k * (steps * dt))
+        d_decay = -(steps * dt) * decay
+    else:
+        base = np.clip(1 - k * dt, 0, None)
+        decay = base ** steps
+        d_decay = -steps * dt * base ** (steps - 1)
+    share = cd / k
+    bleaching = share * (1 - decay)
+    # d(bleaching)/dk through the decay and through cd / k; k depends on ca (via L) and
+    # cd.
+    d_k = -d_decay * share - bleaching / k
+    d_ca = d_k * radiance
+    d_cd = d_k + (1 - decay) / k
+
+    response = intensity * bleaching
+    inside = (response > 0) & (response < 1)
+    return (
+        np.clip(response, 0, 1),
+        intensity * d_ca * inside,
+        intensity * d_cd * inside,
+        bleaching * inside,
+    )
+
+
+def fit_kinetics(
+    radiance: np.ndarray,
+    reference: np.ndarray,
+    ca=None,
+    cd=None,
+    intensity: float = None,
+    steps: int = None,
+    dt: float = None,
+    method: str = None,
+    max_iterations: int = 100,
+    tolerance: float = 1e-6,
+) -> dict:
+    """
+    Least-squares fit of CA_RGB, CD_RGB and INTENSITY to reference afterimages with
+    Levenberg-Marquardt steps on the analytic Jacobian of afterimage_response.
+
+    The parameters are fitted as logarithms, which keeps them positive. Starting values
+    default to ModelConfig. The fit stops when an iteration lowers the squared error by
+    less than `tolerance` relative to it. A single frame from unbleached opsin
+    constrains the parameters only weakly (INTENSITY trades off against the rate
+    constants), so a tighter tolerance mostly wanders along that valley at equal error.
+
+    Returns:
+        dict: 'CA_RGB', 'CD_RGB', 'INTENSITY', the RMSE before ('initial_rmse') and
+        after ('rmse') and the number of 'iterations'.
+    """
+    ca = ModelConfig.CA_RGB if ca is None else ca
+    cd = ModelConfig.CD_RGB if cd is None else cd
+    intensity = ModelConfig.INTENSITY if intensity is None else intensity
+    channels = radiance.shape[1]
+    log_params = np.log(np.concatenate([ca, cd, [intensity]]).astype(np.float64))
+
+    def evaluate(log_params):
+        params = np.exp(log_params)
+        afterimage, d_ca, d_cd, d_intensity = afterimage_response(
+            radiance,
+            params[:channels],
+            params[channels:2 * channels],
+            params[-1],
+            steps,
+            dt,
+            method,
+        )
+        residual = afterimage - reference
+        # Jacobian in log space (d/d log p = p * d/dp), one row per pixel and channel.
+        jacobian = np.zeros(residual.shape + (2 * channels + 1,))
+        for c in range(channels):
+            jacobian[:, c, c] = d_ca[:, c] * params[c]
+            jacobian[:, c, channels + c] = d_cd[:, c] * params[channels + c]
+        jacobian[:, :, -1] = d_intensity * params[-1]
+        return residual.ravel(), jacobian.reshape(residual.size, -1)
+
+    residual, jacobian = evaluate(log_params)
+    cost = residual @ residual
+    initial_cost = cost
+    damping = 1e-3
+    iteration = 0
+    for iteration in range(1, max_iterations + 1):
+        gradient = jacobian.T @ residual
+        normal = jacobian.T @ jacobian
+        diagonal = np.maximum(np.diag(normal), 1e-12)
+        improved = False
+        while damping < 1e10:
+            step = np.linalg.solve(normal + damping * np.diag(diagonal), -gradient)
+            candidate = log_params + step
+            candidate_residual, candidate_jacobian = evaluate(candidate)
+            candidate_cost = candidate_residual @ candidate_residual
+            if candidate_cost < cost:
+                improved = True
+                damping = max(damping / 3, 1e-9)
+                break
+            damping *= 3
+        if not improved:
+            break
+        converged = cost - candidate_cost <= tolerance * cost
+        log_params, residual = candidate, candidate_residual
+        jacobian, cost = candidate_jacobian, candidate_cost
+        if converged:
+            break
+
+    params = np.exp(log_params)
+    return {
+        'CA_RGB': tuple(float(p) for p in params[:channels]),
+        'CD_RGB': tuple(float(p) for p in params[channels:2 * channels]),
+        'INTENSITY': float(params[-1]),
+        'initial_rmse': float(np.sqrt(initial_cost / residual.size)),
+        'rmse': float(np.sqrt(cost / residual.size)),
+        'iterations': iteration,
+    }
+
+
+def frame_rmse(
+    frame: np.ndarray, reference: np.ndarray, ca, cd, intensity: float
+) -> float:
+    """
+    RMSE of the first-frame afterimage of the actual kinetics (advance_opsin) against a
+    reference, both RGB; checks a fit on every pixel rather than on the samples.
+    """
+    opsin = advance_opsin(np.ones(frame.shape, np.float32), frame, ca=ca, cd=cd)
+    afterimage = compute_afterimage(opsin, intensity=intensity)
+    return float(np.sqrt(np.mean((afterimage - reference / np.float32(255)) ** 2)))
+
+
+def calibrate(
+    input_folder: str,
+    reference_folder: str,
+    output_path: str = None,
+    samples: int = 100000,
+    level: int = 2,
+    seed: int = 0,
+) -> dict:
+    """
+    Fit CA_RGB, CD_RGB and INTENSITY to pairs of input frames and reference afterimages
+    (same file names in both folders), taken as the first frame of a sequence.
+
+    The fit runs on `samples` random pixels of the pairs at pyramid level `level`
+    (1 / 2 ** level of the full size), then every pair is checked at that level with the
+    actual kinetics. The fitted fields are written to `output_path` as JSON, which
+    model.model_config.load_config (or --config) applies.
+
+    Returns:
+        dict: The fit_kinetics result, with 'pairs' and 'seconds'.
+    """
+    start = time.perf_counter()
+    pairs = load_pairs(input_folder, reference_folder, level)
+    if not pairs:
+        raise ValueError(
+            f"No images with the same name in {input_folder} and {reference_folder}"
+        )
+    radiance, reference = sample_pixels(pairs, samples, np.random.default_rng(seed))
+    result = fit_kinetics(radiance, reference)
+    result['pairs'] = [name for name, _, _ in pairs]
+    result['seconds'] = time.perf_counter() - start
+
+    print(
+        f"Fitted {len(pairs)} pairs ({len(radiance)} pixels at level {level}) "
+        f"in {result['iterations']} iterations, {result['seconds']:.1f} s: "
+        f"RMSE {result['initial_rmse']:.4f} -> {result['rmse']:.4f}"
+    )
+    initial = [getattr(ModelConfig, field) for field in CALIBRATED_FIELDS]
+    fitted = [result[field] for field in CALIBRATED_FIELDS]
+    for name, frame, reference_frame in pairs:
+        before = frame_rmse(frame, reference_frame, *initial)
+        after = frame_rmse(frame, reference_frame, *fitted)
+        print(f"  {name}: full-frame RMSE {before:.4f} -> {after:.4f}")
+    for field in CALIBRATED_FIELDS:
+        print(f"  {field} = {result[field]}")
+
+    if output_path is not None:
+        if os.path.dirname(output_path):
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        with open(output_path, "w") as f:
+            json.dump(dict(zip(CALIBRATED_FIELDS, fitted)), f, indent=2)
+        print(f"Fitted config written to {output_path}")
+    return result
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Fit CA_RGB, CD_RGB and INTENSITY to reference afterimages.")
+    parser.add_argument("input_folder", help="Input frames")
+    parser.add_argument(
+        "reference_folder",
+        help="Reference afterimages with the input frames' file names",
+    )
+    parser.add_argument(
+        "--output", default="fitted_config.json", help="Fitted config (JSON)"
+    )
+    parser.add_argument(
+        "--samples", type=int, default=100000, help="Random pixels used for the fit"
+    )
+    parser.add_argument(
+        "--level",
+        type=int,
+        default=2,
+        help="Pyramid level: fit at 1 / 2 ** level of the size",
+    )
+    parser.add_argument(
+        "--seed", type=int, default=0, help="Seed of the pixel sampling"
+    )
+    args = parser.parse_args()
+    calibrate(
+        args.input_folder,
+        args.reference_folder,
+        args.output,
+        args.samples,
+        args.level,
+        args.seed,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+import numpy as np
+
+from model.core.anatomical import density_region, get_cone_density_map
+from model.core.receptor_kinetics import advance_opsin
+from model.model_config import ModelConfig
+from model.processing.afterimage_batch import AfterimageState, compute_afterimage
+from model.utils.frame_format import state_dtype
+
+# Default tolerance on the afterimage outside the fovea: half an 8-bit output level.
+DEFAULT_TOLERANCE = 0.5 / 255
+
+
+def density_threshold(tolerance: float = None) -> float:
+    """
+    Cone density below which a pixel can be treated as unlit.
+
+    A radiance L moves the steady state by ca * L / (ca * L + cd) <= ca / cd * L, and
+    the afterimage scales state differences by ModelConfig.INTENSITY, so densities below
+    tolerance / (INTENSITY * max(ca / cd)) change the afterimage less than `tolerance`.
+    """
+    if tolerance is None:
+        tolerance = DEFAULT_TOLERANCE
+    ratio = max(ca / cd for ca, cd in zip(ModelConfig.CA_RGB, ModelConfig.CD_RGB))
+    return tolerance / (ModelConfig.INTENSITY * ratio)
+
+
+class FoveatedAfterimageState(AfterimageState):
+    """
+    AfterimageState for radiance modulated by the cone density map
+    (model.core.anatomical), integrating the kinetics only where the density matters.
+
+    The density map is thresholded (default: density_threshold()) into a bounding region
+    around the fovea. Inside it the frame is multiplied by the density and integrated as
+    usual. Outside it the drive is taken as zero, so the state there is the same for
+    every pixel: one value per channel that decays towards zero. It is advanced with
+    advance_opsin, and the afterimage is written there as a constant, only when it
+    changes if the output buffer is reused (ring=1). `active_fraction` is the fraction
+    of the frame inside the region.
+
+    The overlay still blends the whole original frame. The pyramid levels, lookup tables
+    and stage cache are not supported.
+
+    Parameters:
+        fovea_center : tuple
+            (x, y) of the fovea in frame pixels.
+        fovea_radius : float
+            Radius passed to get_cone_density_map.
+        threshold : float, optional
+            Density below which pixels are treated as unlit.
+        The other parameters are those of AfterimageState.
+    """
+
+    def __init__(
+        self,
+        fovea_center: tuple,
+        fovea_radius: float,
+        threshold: float = None,
+        layout: str = None,
+        ring: int = None,
+    ):
+        super().__init__(use_lut=False, layout=layout, ring=ring, level=0)
+        self.fovea_center = fovea_center
+        self.fovea_radius = fovea_radius
+        self.threshold = density_threshold() if threshold is None else threshold
+        self.region = None  # (top, bottom, left, right) of the integrated region
+        # Density inside the region, scaled to the frame's value range
+        self.density = None
+        self.outside = None  # Opsin state outside the region (1 x 1 x C)
+        self.active_fraction = 1.0
+        self._filled = (None, None)  # (buffer, outside afterimage) last written
+
+    def _prepare(self, frame: np.ndarray) -> None:
+        height, width = frame.shape[:2]
+        density = get_cone_density_map(
+            (height, width), self.fovea_center, self.fovea_radius
+        )
+        top, bottom, left, right = self.region = density_region(density, self.threshold)
+        scale = 1 / 255.0 if np.issubdtype(frame.dtype, np.integer) else 1.0
+        dtype = state_dtype()
+        self.density = (density[top:bottom, left:right, None] * scale).astype(dtype)
+        self.opsin = np.ones(
+            (bottom - top, right - left) + frame.shape[2:], dtype=dtype
+        )
+        self.outside = np.ones((1, 1) + frame.shape[2:], dtype=dtype)
+        self.active_fraction = (bottom - top) * (right - left) / (height * width)
+
+    def advance(
+        self,
+        frame: np.ndarray,
+        cache=None,
+        source: str = None,
+        density: np.ndarray = None,
+    ) -> None:
+        if cache is not None or density is not None:
+            raise ValueError(
+                "The stage cache and density maps are not supported in foveated mode"
+            )
+        if self.region is None:
+            self._prepare(frame)
+        top, bottom, left, right = self.region
+        radiance = self.arena.get(
+            ('foveated', 'radiance'), self.opsin.shape, self.opsin.dtype
+        )
+        np.multiply(frame[top:bottom, left:right], self.density, out=radiance)
+        advance_opsin(
+            self.opsin,
+            radiance,
+            ca=self.ca,
+            cd=self.cd,
+            out=self.opsin,
+            arena=self.arena,
+        )
+        advance_opsin(
+            self.outside,
+            np.zeros_like(self.outside),
+            ca=self.ca,
+            cd=self.cd,
+            out=self.outside,
+        )
+
+    def render_afterimage(self, shape: tuple, out: np.ndarray = None) -> np.ndarray:
+        if out is None:
+            out = np.empty(shape, dtype=self.opsin.dtype)
+        top, bottom, left, right = self.region
+        constant = compute_afterimage(self.outside)
+        buffer, filled = self._filled
+        if buffer is not out or not np.array_equal(filled, constant):
+            # Copying whole rows of the constant is much faster than broadcasting a
+            # pixel.
+            row = self.arena.get(('foveated', 'row'), shape[1:], out.dtype)
+            row[...] = constant[0]
+            for strip in (
+                out[:top],
+                out[bottom:],
+                out[top:bottom, :left],
+                out[top:bottom, right:],
+            ):
+                strip[...] = row[:strip.shape[1]]
+            self._filled = (out, constant)
+        compute_afterimage(self.opsin, out=out[top:bottom, left:right])
+        return out
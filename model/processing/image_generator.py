@@ -1,43 +1,14 @@
 import os
 
 import cv2
-import numpy as np
 
+from model.video.extract_video import extract_frames
+from model.video.video_outputs import FRAME_RENDITIONS, VideoOutputs
 
-# --- Step 1: Extract Frames from Video ---
 
-def extract_frames(video_path, output_dir, fps_target=None):
-    """
-    Extract frames from a video file and save them as JPEG images.
+# --- Step 1: Extract Frames from Video ---
 
-    Parameters:
-      video_path (str): Path to the input video file.
-      output_dir (str): Directory to save extracted frames.
-      fps_target (float, optional): Target FPS for extraction (if None, use the video's native FPS).
-    """
-    os.makedirs(output_dir, exist_ok=True)
-    cap = cv2.VideoCapture(video_path)
-    if not cap.isOpened():
-        raise IOError(f"Cannot open video {video_path}")
-    video_fps = cap.get(cv2.CAP_PROP_FPS)
-    if fps_target is None:
-        fps_target = video_fps
-    # Calculate frame interval
-    frame_interval = int(round(video_fps / fps_target))
-    frame_count = 0
-    saved_count = 0
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-        if frame_count % frame_interval == 0:
-            filename = os.path.join(output_dir, f"frame_{saved_count:04d}.jpg")
-            cv2.imwrite(filename, frame)
-            print(f"Extracted frame {saved_count}: {filename}")
-            saved_count += 1
-        frame_count += 1
-    cap.release()
-    print(f"Extraction complete. {saved_count} frames saved in '{output_dir}'.")
+# extract_frames is shared with model.video.extract_video (imported above).
 
 
 # --- Step 2: Generate Afterimage Frames ---
@@ -80,9 +51,11 @@ def generate_afterimage_frames(input_dir, afterimage_dir):
 
 # --- Step 3: Generate Videos from Frames ---
 
-def generate_videos(original_dir, afterimage_dir, output_dir, fps=30, alpha=0.5):
+def generate_videos(original_dir, afterimage_dir, output_dir, fps=30, alpha=0.5,
+                    renditions=('original', 'afterimage', 'blended', 'side_by_side')):
     """
-    Generate four videos from the original and afterimage frames:
+    Generate the requested videos (by default all four) from the original and
+    afterimage frames:
       1. Original Video
       2. Afterimage Video
       3. Blended Video (input blended with afterimage)
@@ -94,8 +67,16 @@ def generate_videos(original_dir, afterimage_dir, output_dir, fps=30, alpha=0.5)
       output_dir (str): Folder to save the videos.
       fps (int): Frames per second for the videos.
       alpha (float): Blending weight for the original (0 < alpha <= 1).
+      renditions (tuple): Videos to build, names from video_outputs.FRAME_RENDITIONS
+        (there is no persistent overlay here).
     """
-    os.makedirs(output_dir, exist_ok=True)
+    unsupported = set(renditions) - set(FRAME_RENDITIONS)
+    if unsupported:
+        raise ValueError(
+            f"Cannot build renditions {sorted(unsupported)} from frames alone, "
+            f"expected some of {FRAME_RENDITIONS}"
+        )
+    outputs = VideoOutputs(output_dir, renditions, fps=fps, alpha=alpha)
 
     original_frames = sorted([f for f in os.listdir(original_dir) if f.lower().endswith('.jpg')])
     afterimage_frames = sorted([f for f in os.listdir(afterimage_dir) if f.lower().endswith('.jpg')])
@@ -105,55 +86,29 @@ def generate_videos(original_dir, afterimage_dir, output_dir, fps=30, alpha=0.5)
         return
 
     frame_count = min(len(original_frames), len(afterimage_frames))
-    # Read first frame to determine dimensions (assume both sets have same dimensions)
-    first_frame = cv2.imread(os.path.join(original_dir, original_frames[0]))
-    height, width, _ = first_frame.shape
-
-    # Define output video file paths.
-    original_video_path = os.path.join(output_dir, "original_video.mp4")
-    afterimage_video_path = os.path.join(output_dir, "afterimage_video.mp4")
-    blended_video_path = os.path.join(output_dir, "blended_video.mp4")
-    side_by_side_video_path = os.path.join(output_dir, "side_by_side_video.mp4")
-
-    # Define codec (using H.264 via 'avc1' if available)
-    fourcc = cv2.VideoWriter_fourcc(*'avc1')
-    original_video = cv2.VideoWriter(original_video_path, fourcc, fps, (width, height))
-    afterimage_video = cv2.VideoWriter(afterimage_video_path, fourcc, fps, (width, height))
-    blended_video = cv2.VideoWriter(blended_video_path, fourcc, fps, (width, height))
-    side_by_side_video = cv2.VideoWriter(side_by_side_video_path, fourcc, fps, (width * 2, height))
-
-    for i in range(frame_count):
-        orig_path = os.path.join(original_dir, original_frames[i])
-        af_path = os.path.join(afterimage_dir, afterimage_frames[i])
-        orig_frame = cv2.imread(orig_path)
-        af_frame = cv2.imread(af_path)
-        if orig_frame is None or af_frame is None:
-            print(f"Skipping frame {i + 1} due to read error.")
-            continue
-
-        # Generate blended frame.
-        blended = cv2.addWeighted(orig_frame, alpha, af_frame, 1 - alpha, 0)
-        # Generate side-by-side frame (stack horizontally).
-        side_by_side = np.hstack((orig_frame, blended))
-
-        # Write to videos.
-        original_video.write(orig_frame)
-        afterimage_video.write(af_frame)
-        blended_video.write(blended)
-        side_by_side_video.write(side_by_side)
-
-        print(f"Processed frame {i + 1}/{frame_count}")
 
-    original_video.release()
-    afterimage_video.release()
-    blended_video.release()
-    side_by_side_video.release()
+    try:
+        for i in range(frame_count):
+            orig_frame = cv2.imread(os.path.join(original_dir, original_frames[i]))
+            af_frame = None
+            if outputs.needs_afterimage:
+                af_frame = cv2.imread(
+                    os.path.join(afterimage_dir, afterimage_frames[i])
+                )
+            if orig_frame is None or (outputs.needs_afterimage and af_frame is None):
+                print(f"Skipping frame {i + 1} due to read error.")
+                continue
+
+            # The output stage composes the blended and side-by-side frames if
+            # requested.
+            outputs.write(orig_frame, af_frame)
+            print(f"Processed frame {i + 1}/{frame_count}")
+    finally:
+        outputs.close()
 
     print("Videos generated successfully:")
-    print("  Original Video:", original_video_path)
-    print("  Afterimage Video:", afterimage_video_path)
-    print("  Blended Video:", blended_video_path)
-    print("  Side-by-Side Video:", side_by_side_video_path)
+    for name, path in outputs.paths.items():
+        print(f"  {name.replace('_', ' ').title()} Video:", path)
 
 
 # --- Main Pipeline ---
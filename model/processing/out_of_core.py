@@ -0,0 +1,275 @@
+import math
+import os
+import tempfile
+
+import cv2
+import numpy as np
+
+from model.core.anatomical import apply_anatomical_constraints, cone_density_tile
+from model.core.hdr_processing import convert_to_effective_radiance, hdr_to_npy
+from model.core.opponent_afterimage import (
+    effective_radiance,
+    opponent_composite,
+    opponent_kinetics,
+)
+from model.core.receptor_kinetics import advance_opsin
+from model.model_config import ModelConfig
+from model.processing.afterimage import spectral_composite
+from model.utils.file_utils import to_uint8
+from model.utils.pysilsub_integration import compute_photoreceptor_excitation
+
+MODELS = ('spectral', 'opponent')
+# Peak bytes allocated per pixel of a tile (halo included) by hdr_afterimage, input tile
+# included, measured with tracemalloc and rounded up.
+BYTES_PER_PIXEL = {'spectral': 128, 'opponent': 112}
+# Part of the budget kept for allocations that do not scale with the tile (the
+# excitation transform, kernels, the per-tile bookkeeping).
+TILE_OVERHEAD_MB = 0.25
+# Smallest useful tile side, without the halo.
+MIN_TILE = 16
+
+
+def hdr_afterimage(
+    hdr: np.ndarray,
+    model: str = 'spectral',
+    exposure: float = 1.0,
+    fovea: tuple = None,
+    image_shape: tuple = None,
+    origin: tuple = (0, 0),
+    params: dict = None,
+) -> np.ndarray:
+    """
+    Afterimage of an HDR image (BGR float32), or of a tile of one, in [0, 1] (BGR
+    float32).
+
+    The radiance is the image scaled by `exposure` (convert_to_effective_radiance),
+    modulated by the cone density map when fovea=(x, y, radius) is given
+    (apply_anatomical_constraints) and run through the model as in render_afterimage:
+    'spectral' (per pixel) or 'opponent' (eye blur and a diffusion blur after every
+    kinetics step, see halo_pixels).
+
+    For a tile, `image_shape` is the full image's shape and `origin` the (row, column)
+    of the tile's top-left pixel in it, so the density map is the full image's.
+    """
+    if model not in MODELS:
+        raise ValueError(f"Unknown model '{model}', expected one of {MODELS}")
+    radiance = convert_to_effective_radiance(hdr, np.float32(exposure))
+    if fovea is not None:
+        height, width = hdr.shape[:2]
+        rows = slice(origin[0], origin[0] + height)
+        columns = slice(origin[1], origin[1] + width)
+        density = cone_density_tile(
+            image_shape or hdr.shape, fovea[:2], fovea[2], rows, columns
+        )
+        radiance = apply_anatomical_constraints(radiance, density[..., None])
+    if model == 'opponent':
+        blurred = effective_radiance(radiance, params)
+        r_lms = opponent_kinetics(blurred, params, layout='BGR')
+        return opponent_composite(blurred, r_lms, params, layout='BGR')[1]
+    excitations = compute_photoreceptor_excitation(radiance[:, :, ::-1])
+    final_state = advance_opsin(
+        np.ones_like(excitations),
+        excitations,
+        ca=ModelConfig.CA_PS,
+        cd=ModelConfig.CD_PS,
+        out=excitations,
+    )
+    return spectral_composite(final_state)
+
+
+def halo_pixels(model: str = 'spectral', params: dict = None) -> int:
+    """
+    Margin a tile needs on every side so its core matches the whole-image result: the
+    spectral model is per pixel, the opponent model's eye blur and `num_steps` diffusion
+    blurs each reach kernel_size // 2 pixels further.
+    """
+    if model == 'spectral':
+        return 0
+    p = dict(ModelConfig.OPPONENT_PARAMS, **(params or {}))
+    return p['kernel_size'] // 2 + p['num_steps'] * (p['kernel_size_diff'] // 2)
+
+
+def plan_tiles(shape: tuple, halo: int, memory_mb: float, bytes_per_pixel: int) -> int:
+    """
+    Side of the largest square tile whose working set, halo included, fits in
+    `memory_mb` less TILE_OVERHEAD_MB. Raises ValueError if the halo leaves no room for
+    a tile of MIN_TILE pixels.
+    """
+    budget = max(memory_mb - TILE_OVERHEAD_MB, 0) * 2 ** 20
+    side = int(math.sqrt(budget / bytes_per_pixel)) - 2 * halo
+    if side < MIN_TILE:
+        raise ValueError(
+            f"A budget of {memory_mb} MB is too small for tiles with a "
+            f"{halo} pixel halo"
+        )
+    return min(side, max(shape[:2]))
+
+
+def iter_tiles(shape: tuple, side: int, halo: int):
+    """
+    Yield (core, outer) boxes (top, bottom, left, right) covering the image: the cores
+    tile it, each outer box is its core grown by `halo` and clipped to the image.
+    """
+    height, width = shape[:2]
+    for top in range(0, height, side):
+        for left in range(0, width, side):
+            bottom, right = min(top + side, height), min(left + side, width)
+            outer_top, outer_bottom = max(top - halo, 0), min(bottom + halo, height)
+            outer_left, outer_right = max(left - halo, 0), min(right + halo, width)
+            yield (
+                (top, bottom, left, right),
+                (outer_top, outer_bottom, outer_left, outer_right),
+            )
+
+
+def process_hdr_tiled(
+    input_path: str,
+    output_path: str,
+    model: str = 'spectral',
+    exposure: float = 1.0,
+    fovea: tuple = None,
+    memory_mb: float = None,
+    work_dir: str = None,
+    params: dict = None,
+) -> dict:
+    """
+    hdr_afterimage for an image of any size, streamed through the model in tiles so the
+    memory use is bounded by `memory_mb` rather than by the image size.
+
+    The image is decoded into a memory-mapped .npy file (hdr_to_npy; Radiance .hdr files
+    are streamed one scanline at a time, .npy inputs are mapped directly) and the
+    afterimage is written into another, in the work folder (by default next to the
+    output, since a tmpfs /tmp would hold them in RAM). Every tile is read with a halo
+    (halo_pixels), processed, and its core written back; both maps are reopened per tile
+    so their pages do not accumulate in the process. The tile side is chosen from
+    `memory_mb` and the model's measured bytes per pixel (plan_tiles). The result equals
+    hdr_afterimage on the whole image up to float32 rounding.
+
+    A .npy output keeps the float32 afterimage; other outputs are written as 8-bit
+    images by OpenCV from the mapped result (its encoders need the image in one piece,
+    paged in from the file).
+
+    Parameters:
+        input_path : str
+            HDR image (.hdr, .exr, ...) or an .npy array (H x W x 3, BGR).
+        output_path : str
+            Afterimage file (.npy for float32, otherwise an 8-bit image).
+        model, exposure, fovea, params :
+            See hdr_afterimage.
+        memory_mb : float, optional
+            Budget for the tile working set (default ModelConfig.TILE_MEMORY_MB).
+        work_dir : str, optional
+            Folder for the memory-mapped intermediates.
+
+    Returns:
+        dict: shape, tile side, halo, number of tiles, the pixels processed per image
+        pixel (more than 1 with halos) and the planned working set in MB.
+    """
+    if model not in MODELS:
+        raise ValueError(f"Unknown model '{model}', expected one of {MODELS}")
+    memory_mb = memory_mb or ModelConfig.TILE_MEMORY_MB
+    bytes_per_pixel = BYTES_PER_PIXEL[model]
+    halo = halo_pixels(model, params)
+    npy_output = output_path.lower().endswith('.npy')
+    if work_dir is None:
+        work_dir = os.path.dirname(os.path.abspath(output_path))
+    with tempfile.TemporaryDirectory(dir=work_dir) as work:
+        source = input_path
+        if not input_path.lower().endswith('.npy'):
+            source = os.path.join(work, "input.npy")
+            hdr_to_npy(input_path, source)
+        shape = np.load(source, mmap_mode='r').shape
+        side = plan_tiles(shape, halo, memory_mb, bytes_per_pixel)
+        target = output_path if npy_output else os.path.join(work, "afterimage.npy")
+        # Create the output file; tiles map it again one at a time.
+        dtype = np.float32 if npy_output else np.uint8
+        np.lib.format.open_memmap(
+            target, mode='w+', dtype=dtype, shape=shape[:2] + (3,)
+        ).flush()
+        tiles = processed = 0
+        for core_box, outer_box in iter_tiles(shape, side, halo):
+            top, bottom, left, right = core_box
+            outer_top, outer_bottom, outer_left, outer_right = outer_box
+            mapped = np.load(source, mmap_mode='r')
+            window = mapped[outer_top:outer_bottom, outer_left:outer_right, :3]
+            tile = np.array(window, dtype=np.float32)
+            del mapped, window
+            origin = (outer_top, outer_left)
+            afterimage = hdr_afterimage(
+                tile, model, exposure, fovea, shape, origin, params
+            )
+            rows = slice(top - outer_top, bottom - outer_top)
+            columns = slice(left - outer_left, right - outer_left)
+            core = afterimage[rows, columns]
+            mapped = np.load(target, mmap_mode='r+')
+            mapped[top:bottom, left:right] = core if npy_output else to_uint8(core)
+            mapped.flush()
+            del mapped, tile, afterimage, core
+            tiles += 1
+            processed += (outer_bottom - outer_top) * (outer_right - outer_left)
+        if not npy_output:
+            cv2.imwrite(output_path, np.load(target, mmap_mode='r'))
+    longest = min(side + 2 * halo, max(shape[:2]))
+    return {
+        'shape': tuple(shape[:2]),
+        'tile': side,
+        'halo': halo,
+        'tiles': tiles,
+        'overhead': processed / (shape[0] * shape[1]),
+        'working_set_mb': longest ** 2 * bytes_per_pixel / 2 ** 20 + TILE_OVERHEAD_MB,
+    }
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Afterimage of a large HDR image, processed in tiles within a "
+        "memory budget."
+    )
+    parser.add_argument("input_image", help="HDR image (.hdr, .exr, ...) or .npy array")
+    parser.add_argument(
+        "output_image", help="Afterimage (.npy for float32, otherwise an 8-bit image)"
+    )
+    parser.add_argument("--model", choices=MODELS, default="spectral")
+    parser.add_argument(
+        "--exposure", type=float, default=1.0, help="Scale of the HDR radiance"
+    )
+    parser.add_argument(
+        "--fovea",
+        type=float,
+        nargs=3,
+        default=None,
+        metavar=("X", "Y", "RADIUS"),
+        help="Modulate the radiance by the cone density map of this fovea",
+    )
+    parser.add_argument(
+        "--memory_mb",
+        type=float,
+        default=None,
+        help="Memory budget of the tiles (default: ModelConfig.TILE_MEMORY_MB)",
+    )
+    parser.add_argument(
+        "--work_dir", default=None, help="Folder for the memory-mapped intermediates"
+    )
+    args = parser.parse_args()
+
+    stats = process_hdr_tiled(
+        args.input_image,
+        args.output_image,
+        args.model,
+        args.exposure,
+        args.fovea,
+        args.memory_mb,
+        args.work_dir,
+    )
+    height, width = stats['shape']
+    print(
+        f"Afterimage of the {width}x{height} image saved to {args.output_image}: "
+        f"{stats['tiles']} tiles of {stats['tile']} px with a {stats['halo']} px halo "
+        f"({stats['overhead']:.2f}x the pixels), working set "
+        f"{stats['working_set_mb']:.0f} MB"
+    )
+
+
+if __name__ == "__main__":
+    main()
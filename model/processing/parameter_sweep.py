@@ -0,0 +1,265 @@
+import itertools
+import json
+import os
+
+import numpy as np
+
+from model.core.receptor_kinetics import advance_opsin, stack_parameters
+from model.model_config import ModelConfig
+from model.processing.afterimage_batch import (
+    compose_persistent_overlay,
+    compute_afterimage,
+)
+from model.utils.file_utils import list_images, read_frame, save_frame, to_uint8
+from model.utils.frame_arena import (
+    BufferPool,
+    FrameArena,
+    format_memory_report,
+    memory_report,
+)
+from model.utils.frame_format import check_layout, state_dtype
+from model.utils.staged_pipeline import MAX_IN_FLIGHT, format_stage_report, run_staged
+
+SWEEP_MANIFEST = "sweep.json"
+
+
+def parameter_grid(
+    ca_scale=(1.0,), cd_scale=(1.0,), dt=None, steps=None, intensity=None
+) -> list:
+    """
+    All combinations of the given values as a list of settings for ParameterSweep.
+
+    Parameters:
+        ca_scale, cd_scale : sequence of float
+            Factors applied to ModelConfig.CA_RGB and CD_RGB.
+        dt, steps, intensity : sequence, optional
+            Time steps, step counts and afterimage intensities (default: ModelConfig's).
+    Returns:
+        list: One dict per combination with 'ca', 'cd', 'dt', 'steps' and 'intensity'.
+    """
+    dt = dt or [ModelConfig.TIME_STEP]
+    steps = steps or [ModelConfig.ITERATIONS]
+    intensity = intensity or [ModelConfig.INTENSITY]
+    return [
+        {
+            'ca': [a * c for c in ModelConfig.CA_RGB],
+            'cd': [d * c for c in ModelConfig.CD_RGB],
+            'dt': t,
+            'steps': n,
+            'intensity': i,
+        }
+        for a, d, t, n, i in itertools.product(ca_scale, cd_scale, dt, steps, intensity)
+    ]
+
+
+class ParameterSweep:
+    """
+    AfterimageState for K parameter settings at once.
+
+    The opsin state is a (K x H x W x 3) stack and every frame advances all K settings
+    in one broadcast advance_opsin call, so a frame is decoded once per sweep instead of
+    once per setting. Each setting's afterimages match an AfterimageState run with that
+    setting in ModelConfig.
+
+    step() returns buffers of the sweep's arena, which the next step overwrites.
+
+    Parameters:
+        settings : sequence of dict
+            See stack_parameters, plus 'intensity' (default ModelConfig.INTENSITY).
+        layout : str, optional
+            Channel order of the frames (default ModelConfig.FRAME_LAYOUT).
+    """
+
+    def __init__(self, settings, layout: str = None):
+        self.settings = list(settings)
+        self.layout = check_layout(layout)
+        self.params = stack_parameters(self.settings, self.layout)
+        intensity = [
+            setting.get('intensity', ModelConfig.INTENSITY) for setting in self.settings
+        ]
+        self.intensity = np.array(intensity, dtype=state_dtype()).reshape(-1, 1, 1, 1)
+        self.arena = FrameArena()
+        self.opsin = None
+        self.previous_afterimage = None
+
+    def __len__(self):
+        return len(self.settings)
+
+    def step(self, frame: np.ndarray, overlay: bool = True) -> tuple:
+        """
+        Advance every setting by one frame.
+
+        Returns:
+            tuple: (afterimages, persistent_overlays), each K x H x W x 3 in the frame's
+            layout (see AfterimageState.step); the overlays are None when overlay=False.
+        """
+        shape = (len(self),) + frame.shape
+        if self.opsin is None:
+            self.opsin = np.ones(shape, dtype=state_dtype())
+        advance_opsin(
+            self.opsin, frame, out=self.opsin, arena=self.arena, **self.params
+        )
+
+        overlays = None
+        if overlay:
+            overlay_dtype = np.uint8 if frame.dtype == np.uint8 else np.float32
+            overlays = self.arena.get('overlay', shape, overlay_dtype)
+            previous = self.previous_afterimage
+            for k in range(len(self)):
+                compose_persistent_overlay(
+                    frame,
+                    None if previous is None else previous[k],
+                    out=overlays[k],
+                    arena=self.arena,
+                )
+        # The overlay has used the previous afterimage, so its buffer can be reused.
+        afterimage = compute_afterimage(
+            self.opsin,
+            out=self.arena.get('afterimage', shape, self.opsin.dtype),
+            intensity=self.intensity,
+        )
+        self.previous_afterimage = afterimage
+        return afterimage, overlays
+
+
+def sweep_afterimages(frame: np.ndarray, settings, layout: str = None) -> np.ndarray:
+    """
+    Afterimages of a single frame (from unbleached opsin) for every setting.
+
+    Returns:
+        np.ndarray: K x H x W x 3 stack in [0, 1], in the order of `settings`.
+    """
+    afterimage, _ = ParameterSweep(settings, layout).step(frame, overlay=False)
+    return afterimage.copy()
+
+
+def _setting_dir(k: int) -> str:
+    return f"setting_{k:03d}"
+
+
+def sweep_frame_sequence(
+    input_folder: str, output_folder: str, settings, io_threads: int = 0
+):
+    """
+    process_frame_sequence for every setting in one pass over the frames.
+
+    Each frame is read once and advanced for all settings together (see ParameterSweep).
+    Setting k is written to output_folder/setting_<k>/, with the persistent overlay
+    frames in its persistent_overlay/ subfolder; sweep.json lists the settings.
+    """
+    sweep = ParameterSweep(settings)
+    folders = [os.path.join(output_folder, _setting_dir(k)) for k in range(len(sweep))]
+    for folder in folders:
+        os.makedirs(os.path.join(folder, "persistent_overlay"), exist_ok=True)
+    with open(os.path.join(output_folder, SWEEP_MANIFEST), "w") as f:
+        manifest = [
+            dict(setting, output=_setting_dir(k))
+            for k, setting in enumerate(sweep.settings)
+        ]
+        json.dump(manifest, f, indent=2)
+
+    files = list_images(input_folder)
+    if not files:
+        print("No frames found!")
+        return
+    outputs = BufferPool(MAX_IN_FLIGHT if io_threads else 1)
+
+    def read(fname):
+        return read_frame(os.path.join(input_folder, fname), sweep.layout)
+
+    def compute(fname, frame):
+        afterimage, persistent_overlay = sweep.step(frame)
+        buffers = outputs.acquire(
+            lambda: (
+                np.empty(afterimage.shape, np.uint8),
+                np.empty(afterimage.shape, np.uint8),
+            )
+        )
+        to_uint8(afterimage, out=buffers[0])
+        np.copyto(buffers[1], persistent_overlay)
+        return buffers
+
+    def write(fname, buffers):
+        afterimages, overlays = buffers
+        for folder, afterimage, overlay in zip(folders, afterimages, overlays):
+            save_frame(os.path.join(folder, fname), afterimage)
+            save_frame(os.path.join(folder, "persistent_overlay", fname), overlay)
+        outputs.release(buffers)
+        print(f"Processed {fname} ({len(folders)} settings)")
+
+    stats = run_staged(
+        files,
+        read,
+        compute,
+        write,
+        readers=io_threads,
+        writers=io_threads,
+        max_in_flight=MAX_IN_FLIGHT,
+    )
+    if io_threads:
+        print(format_stage_report(stats))
+    print(format_memory_report(memory_report(sweep.arena, outputs)))
+    print(f"Sweep of {len(sweep)} settings completed.")
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Run the afterimage batch for a grid of kinetics settings in one "
+        "pass over the frames."
+    )
+    parser.add_argument(
+        "--input_folder",
+        default=None,
+        help="Input folder (default: ModelConfig.DEFAULT_INPUT_DIR)",
+    )
+    parser.add_argument(
+        "--output_folder",
+        default=None,
+        help="Output folder (default: ModelConfig.DEFAULT_OUTPUT_DIR)",
+    )
+    parser.add_argument(
+        "--ca_scale",
+        type=float,
+        nargs="+",
+        default=[1.0],
+        help="Factors for ModelConfig.CA_RGB",
+    )
+    parser.add_argument(
+        "--cd_scale",
+        type=float,
+        nargs="+",
+        default=[1.0],
+        help="Factors for ModelConfig.CD_RGB",
+    )
+    parser.add_argument("--dt", type=float, nargs="+", default=None, help="Time steps")
+    parser.add_argument(
+        "--iterations", type=int, nargs="+", default=None, help="Time steps per frame"
+    )
+    parser.add_argument(
+        "--intensity",
+        type=float,
+        nargs="+",
+        default=None,
+        help="Afterimage intensities",
+    )
+    parser.add_argument(
+        "--io_threads",
+        type=int,
+        default=0,
+        help="Reader and writer threads (default: 0, serial)",
+    )
+    args = parser.parse_args()
+    settings = parameter_grid(
+        args.ca_scale, args.cd_scale, args.dt, args.iterations, args.intensity
+    )
+    sweep_frame_sequence(
+        args.input_folder or ModelConfig.DEFAULT_INPUT_DIR,
+        args.output_folder or ModelConfig.DEFAULT_OUTPUT_DIR,
+        settings,
+        args.io_threads,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+
+from model.model_config import ModelConfig, apply_config, config_snapshot
+from model.processing.afterimage_batch import AfterimageState
+from model.utils.file_utils import list_images, read_frame, save_frame
+
+# Default tolerance on the afterimage: half an 8-bit output level.
+DEFAULT_TOLERANCE = 0.5 / 255
+
+
+def frame_contraction() -> float:
+    """
+    Upper bound on how much one frame shrinks a difference in opsin state.
+
+    Two states under the same input L in [0, 1] move towards the same steady state at
+    rate k = ca * L + cd, so a difference is scaled per frame by
+    exp(-k * T) <= exp(-cd * T) (exact integrator, T = N * dt). An Euler step scales it
+    by 1 - k * dt, which overshoots for large k, so its bound is
+    max(|1 - cd * dt|, |1 - (ca + cd) * dt|) ** N. The slowest channel sets the bound.
+    """
+    steps, dt = ModelConfig.ITERATIONS, ModelConfig.TIME_STEP
+    if ModelConfig.INTEGRATOR == 'euler':
+        return max(
+            max(abs(1 - cd * dt), abs(1 - (ca + cd) * dt)) ** steps
+            for ca, cd in zip(ModelConfig.CA_RGB, ModelConfig.CD_RGB)
+        )
+    return math.exp(-min(ModelConfig.CD_RGB) * dt * steps)
+
+
+def warmup_frames(tolerance: float = None) -> int:
+    """
+    Number of warm-up frames after which the afterimage is within `tolerance` of the
+    sequential run, whatever the state at the start of the warm-up.
+
+    The opsin state differs by at most 1 at the start of the warm-up and the afterimage
+    amplifies state differences by ModelConfig.INTENSITY.
+    """
+    if tolerance is None:
+        tolerance = DEFAULT_TOLERANCE
+    rho = frame_contraction()
+    if rho <= 0:
+        return 1
+    if rho >= 1:
+        raise ValueError("CD_RGB does not decay; segments cannot be warmed up")
+    frames = math.log(tolerance / ModelConfig.INTENSITY) / math.log(rho)
+    return max(0, math.ceil(frames))
+
+
+def split_segments(frame_count: int, segments: int) -> list:
+    """
+    Split the frame indices [0, frame_count) into `segments` contiguous ranges.
+
+    Returns:
+        list: (start, stop) frame ranges.
+    """
+    segments = max(1, min(segments, frame_count))
+    bounds = np.linspace(0, frame_count, segments + 1).round().astype(int)
+    return [(int(start), int(stop)) for start, stop in zip(bounds[:-1], bounds[1:])]
+
+
+def _process_segment(
+    input_folder: str,
+    output_folder: str,
+    files: list,
+    start: int,
+    stop: int,
+    warmup: int,
+    verify: bool = False,
+) -> tuple:
+    """
+    Warm the state on the `warmup` frames before `start`, then process and save the
+    frames [start, stop).
+
+    Returns:
+        tuple: (start, afterimage of the first frame of the segment), the afterimage
+        None unless `verify` (it is only needed for the check, and costs a
+        full-resolution float32 array sent back to the parent).
+    """
+    persistent_overlay_folder = os.path.join(output_folder, "persistent_overlay")
+    state = AfterimageState()
+    for fname in files[max(0, start - warmup):start]:
+        state.step(read_frame(os.path.join(input_folder, fname)))
+
+    first_afterimage = None
+    for i, fname in enumerate(files[start:stop]):
+        frame = read_frame(os.path.join(input_folder, fname))
+        afterimage, persistent_overlay = state.step(frame)
+        if verify and i == 0:
+            first_afterimage = afterimage
+        save_frame(os.path.join(output_folder, fname), afterimage)
+        save_frame(os.path.join(persistent_overlay_folder, fname), persistent_overlay)
+    warmed = start - max(0, start - warmup)
+    print(f"Processed frames {start + 1}-{stop} (warm-up {warmed} frames)")
+    return start, first_afterimage
+
+
+def _sequential_afterimages(input_folder: str, files: list, indices: set) -> dict:
+    """
+    Afterimages of the sequential run at the given frame indices.
+    """
+    state = AfterimageState()
+    afterimages = {}
+    for i, fname in enumerate(files[:max(indices) + 1]):
+        afterimage, _ = state.step(read_frame(os.path.join(input_folder, fname)))
+        if i in indices:
+            afterimages[i] = afterimage
+    return afterimages
+
+
+def process_frame_sequence_segmented(
+    input_folder: str = None,
+    output_folder: str = None,
+    segments: int = None,
+    workers: int = None,
+    tolerance: float = None,
+    verify: bool = False,
+):
+    """
+    Process a frame sequence as independent segments in a process pool.
+
+    Each segment warms its opsin state on the frames before its start; the number of
+    warm-up frames follows from CD_RGB and `tolerance` (see warmup_frames). Segments
+    write their frames under the sequence's own file names, so the output is in order.
+
+    Parameters:
+        input_folder, output_folder: str, optional
+            Frame folders (default from ModelConfig).
+        segments: int, optional
+            Number of segments (default: number of workers).
+        workers: int, optional
+            Worker processes (default: os.cpu_count()).
+        tolerance: float, optional
+            Allowed afterimage deviation from the sequential run
+            (default: half an 8-bit level).
+        verify: bool
+            Also run the sequence sequentially and report the measured maximum
+            deviation. Deviations are largest on the first frame of a segment, which is
+            where they are measured.
+
+    Returns:
+        dict: Run summary with the warm-up length and, with verify=True,
+        'max_deviation'.
+    """
+    if input_folder is None:
+        input_folder = ModelConfig.DEFAULT_INPUT_DIR
+    if output_folder is None:
+        output_folder = ModelConfig.DEFAULT_OUTPUT_DIR
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if segments is None:
+        segments = workers
+
+    os.makedirs(os.path.join(output_folder, "persistent_overlay"), exist_ok=True)
+    files = list_images(input_folder)
+    if not files:
+        print("No frames found!")
+        return None
+
+    warmup = warmup_frames(tolerance)
+    ranges = split_segments(len(files), segments)
+    print(
+        f"Processing {len(files)} frames in {len(ranges)} segments "
+        f"with {warmup} warm-up frames"
+    )
+
+    # The workers may be spawned rather than forked: hand them the parent's ModelConfig.
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=apply_config, initargs=(config_snapshot(),)
+    ) as pool:
+        segment = partial(_process_segment, input_folder, output_folder, files)
+        futures = [
+            pool.submit(segment, start, stop, warmup, verify) for start, stop in ranges
+        ]
+        first_afterimages = dict(future.result() for future in futures)
+
+    summary = {'frames': len(files), 'segments': len(ranges), 'warmup_frames': warmup}
+    if verify:
+        # The first segment starts from the true initial state and cannot deviate.
+        starts = {start for start, _ in ranges if start > 0}
+        deviation = 0.0
+        if starts:
+            reference = _sequential_afterimages(input_folder, files, starts)
+            deviation = max(
+                float(np.abs(first_afterimages[i] - reference[i]).max()) for i in starts
+            )
+        summary['max_deviation'] = deviation
+        print(f"Maximum deviation from the sequential run: {deviation:.2e}")
+
+    print("Batch processing completed.")
+    return summary
@@ -0,0 +1,314 @@
+import multiprocessing as mp
+import os
+import time
+from multiprocessing import shared_memory
+from multiprocessing.connection import wait
+
+import numpy as np
+
+from model.core.receptor_kinetics import advance_opsin
+from model.model_config import ModelConfig
+from model.processing.afterimage_batch import (
+    AfterimageState,
+    compose_persistent_overlay,
+    compute_afterimage,
+)
+from model.utils.file_utils import list_images, read_frame, save_frame, to_uint8
+from model.utils.frame_arena import FrameArena
+from model.utils.frame_format import channel_params, check_layout, state_dtype
+
+
+def _buffer_dtypes() -> dict:
+    """
+    Buffers shared between the main process and the band workers, with their dtypes.
+    """
+    return {
+        'frame': np.dtype(np.uint8),
+        'opsin': state_dtype(),
+        'previous_afterimage': state_dtype(),
+        'afterimage': np.dtype(np.uint8),
+        'overlay': np.dtype(np.uint8),
+    }
+
+
+_STOP, _FIRST_FRAME, _NEXT_FRAME = 0, 1, 2
+
+# The band workers are forked; without fork (Windows, some macOS builds) the engine runs
+# the kinetics in the calling process.
+FORK_AVAILABLE = 'fork' in mp.get_all_start_methods()
+# Seconds the main process waits for the workers to finish a frame.
+FRAME_TIMEOUT = 600
+
+
+def split_bands(height: int, workers: int, tile_rows: int = None) -> list:
+    """
+    Split `height` rows into bands of `tile_rows` rows and deal them out round-robin.
+
+    Returns one list of (start, stop) row ranges per worker. By default every worker
+    owns a single contiguous band.
+    """
+    if tile_rows is None:
+        tile_rows = -(-height // workers)
+    bands = [
+        (start, min(start + tile_rows, height)) for start in range(0, height, tile_rows)
+    ]
+    return [bands[w::workers] for w in range(workers)]
+
+
+def _attach(names: dict, dtypes: dict, shape: tuple) -> tuple:
+    handles = {
+        key: shared_memory.SharedMemory(name=name) for key, name in names.items()
+    }
+    views = {
+        key: np.ndarray(shape, dtype=dtypes[key], buffer=handles[key].buf)
+        for key in names
+    }
+    return handles, views
+
+
+def _band_worker(
+    names: dict, dtypes: dict, shape: tuple, bands: list, layout: str, connection
+) -> None:
+    """
+    Worker loop: advance the kinetics of the rows this worker owns, frame after frame.
+
+    Each command received on `connection` is answered with None once the bands are done,
+    or with the error that stopped the worker.
+
+    The opsin state and previous afterimage of a band are only ever touched by its
+    owner, so the state never crosses a process boundary.
+    """
+    handles, buffers = _attach(names, dtypes, shape)
+    ca = channel_params(ModelConfig.CA_RGB, layout)
+    cd = channel_params(ModelConfig.CD_RGB, layout)
+    # Scratch buffers, shared by the bands of equal height.
+    arena = FrameArena()
+    try:
+        while True:
+            command = connection.recv()
+            if command == _STOP:
+                break
+            for top, bottom in bands:
+                frame = buffers['frame'][top:bottom]
+                opsin = buffers['opsin'][top:bottom]
+                previous = buffers['previous_afterimage'][top:bottom]
+                if command == _FIRST_FRAME:
+                    opsin[...] = 1.0
+                advance_opsin(opsin, frame, ca=ca, cd=cd, out=opsin, arena=arena)
+                compose_persistent_overlay(
+                    frame,
+                    None if command == _FIRST_FRAME else previous,
+                    out=buffers['overlay'][top:bottom],
+                    arena=arena,
+                )
+                # The previous afterimage has been used; the new one takes its place.
+                afterimage = compute_afterimage(opsin, out=previous)
+                to_uint8(afterimage, out=buffers['afterimage'][top:bottom])
+            connection.send(None)
+    except Exception as error:
+        # Report the error instead of leaving the main process waiting for the frame.
+        connection.send(f"{type(error).__name__}: {error}")
+        raise
+    finally:
+        for handle in handles.values():
+            handle.close()
+
+
+class TileParallelEngine:
+    """
+    Multi-core afterimage kinetics over a fixed pool of band workers.
+
+    The current frame, the opsin state and the output buffers live in shared memory;
+    each worker owns a band of rows for the whole sequence. Per-pixel work is identical
+    to afterimage_batch.AfterimageState, so outputs are bit-identical. Frames are uint8
+    with channels in `layout` order (default ModelConfig.FRAME_LAYOUT).
+
+    Workers are forked, so they see ModelConfig as it is when the engine is created.
+    Where fork is not available (FORK_AVAILABLE) the engine has no workers and steps an
+    AfterimageState in the calling process instead, with the same outputs.
+
+    A frame that the workers do not finish within `timeout` seconds (default
+    FRAME_TIMEOUT), or a worker that fails or dies, raises RuntimeError; the engine is
+    unusable after that and should be closed.
+    """
+
+    def __init__(
+        self,
+        shape: tuple,
+        workers: int = None,
+        tile_rows: int = None,
+        layout: str = None,
+        timeout: float = None,
+    ):
+        if workers is None:
+            workers = os.cpu_count() or 1
+        self.shape = tuple(shape)
+        self.layout = check_layout(layout)
+        self.timeout = FRAME_TIMEOUT if timeout is None else timeout
+        self._first = True
+        self._handles = {}
+        self._processes = []
+        self._connections = []
+        self.buffers = {}
+        self._serial = None
+        if not FORK_AVAILABLE:
+            self.workers = 0
+            self._serial = AfterimageState(layout=self.layout, level=0)
+            return
+        self.workers = max(1, min(workers, self.shape[0]))
+        dtypes = _buffer_dtypes()
+        for key, dtype in dtypes.items():
+            size = int(np.prod(self.shape)) * dtype.itemsize
+            self._handles[key] = shared_memory.SharedMemory(create=True, size=size)
+            self.buffers[key] = np.ndarray(
+                self.shape, dtype=dtype, buffer=self._handles[key].buf
+            )
+
+        context = mp.get_context('fork')
+        names = {key: handle.name for key, handle in self._handles.items()}
+        for bands in split_bands(self.shape[0], self.workers, tile_rows):
+            connection, worker_connection = context.Pipe()
+            process = context.Process(
+                target=_band_worker,
+                daemon=True,
+                args=(names, dtypes, self.shape, bands, self.layout, worker_connection),
+            )
+            process.start()
+            worker_connection.close()
+            self._connections.append(connection)
+            self._processes.append(process)
+
+    def process(self, frame: np.ndarray) -> tuple:
+        """
+        Advance the sequence by one uint8 frame.
+
+        Returns:
+            tuple: (afterimage, persistent_overlay) as uint8 views into shared memory in
+            the frame's layout, valid until the next call.
+        """
+        if self._serial is not None:
+            afterimage, overlay = self._serial.step(frame)
+            return to_uint8(afterimage), overlay
+        self.buffers['frame'][...] = frame
+        command = _FIRST_FRAME if self._first else _NEXT_FRAME
+        for connection in self._connections:
+            try:
+                connection.send(command)
+            except OSError:  # The worker has exited; _wait reports it
+                pass
+        self._wait()
+        self._first = False
+        return self.buffers['afterimage'], self.buffers['overlay']
+
+    def _wait(self) -> None:
+        """
+        Wait for every worker to finish the frame. Raises RuntimeError if one fails,
+        dies (e.g. killed by the OOM killer) or does not answer within `timeout`
+        seconds.
+        """
+        pending = dict(zip(self._connections, self._processes))
+        deadline = time.monotonic() + self.timeout
+        while pending:
+            sentinels = {process.sentinel: process for process in pending.values()}
+            ready = wait(
+                list(pending) + list(sentinels),
+                timeout=max(deadline - time.monotonic(), 0),
+            )
+            if not ready:
+                raise RuntimeError(
+                    f"Band workers did not finish the frame within {self.timeout} s"
+                )
+            for connection in [item for item in ready if item in pending]:
+                try:
+                    error = connection.recv()
+                except EOFError:
+                    process = pending[connection]
+                    process.join(timeout=1)
+                    raise RuntimeError(
+                        f"Band worker exited with code {process.exitcode}"
+                    ) from None
+                if error is not None:
+                    raise RuntimeError(f"Band worker failed: {error}")
+                del pending[connection]
+            for sentinel in [item for item in ready if item in sentinels]:
+                process = sentinels[sentinel]
+                if process in pending.values():
+                    raise RuntimeError(
+                        f"Band worker exited with code {process.exitcode}"
+                    )
+
+    def close(self) -> None:
+        for connection in self._connections:
+            try:
+                connection.send(_STOP)
+            except OSError:  # The worker has exited
+                pass
+        for process in self._processes:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+        for connection in self._connections:
+            connection.close()
+        self._connections = []
+        self._processes = []
+        self.buffers = {}
+        for handle in self._handles.values():
+            handle.close()
+            handle.unlink()
+        self._handles = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def process_frame_sequence_parallel(input_folder: str = None, output_folder: str = None,
+                                    workers: int = None, tile_rows: int = None):
+    """
+    Multi-core version of afterimage_batch.process_frame_sequence with the same outputs.
+
+    Parameters:
+        input_folder, output_folder: str, optional
+            Frame folders (default from ModelConfig).
+        workers: int, optional
+            Number of band workers (default: os.cpu_count()).
+        tile_rows: int, optional
+            Rows per band, dealt out round-robin (default: one band per worker).
+    """
+    if input_folder is None:
+        input_folder = ModelConfig.DEFAULT_INPUT_DIR
+    if output_folder is None:
+        output_folder = ModelConfig.DEFAULT_OUTPUT_DIR
+
+    persistent_overlay_folder = os.path.join(output_folder, "persistent_overlay")
+    os.makedirs(persistent_overlay_folder, exist_ok=True)
+
+    files = list_images(input_folder)
+    if not files:
+        print("No frames found!")
+        return
+
+    engine = None
+    try:
+        for i, fname in enumerate(files):
+            frame = read_frame(os.path.join(input_folder, fname))
+            if engine is None:
+                engine = TileParallelEngine(frame.shape, workers, tile_rows)
+                if engine.workers:
+                    height, width = frame.shape[:2]
+                    print(f"Started {engine.workers} band workers for {width}x{height}")
+                else:
+                    print(
+                        "fork is not available; processing the frames in this process"
+                    )
+            afterimage, overlay = engine.process(frame)
+            save_frame(os.path.join(output_folder, fname), afterimage)
+            save_frame(os.path.join(persistent_overlay_folder, fname), overlay)
+            print(f"Processed frame {i + 1}/{len(files)}")
+    finally:
+        if engine is not None:
+            engine.close()
+
+    print("Batch processing completed.")
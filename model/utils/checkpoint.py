@@ -0,0 +1,170 @@
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from model.model_config import ModelConfig
+from model.utils.stage_cache import stage_key
+
+CHECKPOINT_DIR = ".checkpoint"
+CHECKPOINT_FILE = "checkpoint.json"
+# Arrays of an AfterimageState saved in a checkpoint.
+STATE_ARRAYS = ('opsin', 'previous_afterimage')
+
+
+def state_config_hash(state) -> str:
+    """
+    Hash of everything the opsin state of an AfterimageState depends on besides its
+    frames: the kinetics settings (as for the stage cache) and the state's own options.
+    """
+    adaptive = getattr(state, 'adaptive', False)
+    return stage_key('opsin', ('checkpoint', state.use_lut, state.level, adaptive,
+                               ModelConfig.ADAPTIVE_TOLERANCE if adaptive else None))
+
+
+class SequenceCheckpoint:
+    """
+    Checkpoints of an AfterimageState in memory-mapped .npy files, so a frame sequence
+    can resume after a crash or be extended with new frames.
+
+    The opsin state and the previous afterimage are copied into memory-mapped files in
+    folder/ (created as needed, then reused) and checkpoint.json records the frame
+    index, the last frame file, the state's config hash (state_config_hash) and whether
+    the sequence was finished. There are two slots of files: a snapshot always goes into
+    the slot checkpoint.json does not point to, and checkpoint.json is then replaced
+    atomically, so a crash at any point leaves the previous checkpoint intact.
+
+    The outputs of a frame are written after its state was computed, possibly on other
+    threads (see run_staged), so a snapshot is only committed once every frame up to it
+    has been reported through written().
+
+    Parameters:
+        folder : str
+            Checkpoint folder, e.g. output_folder/.checkpoint.
+        interval : int, optional
+            Frames between snapshots (default ModelConfig.CHECKPOINT_INTERVAL).
+    """
+
+    def __init__(self, folder: str, interval: int = None):
+        self.folder = folder
+        self.interval = interval or ModelConfig.CHECKPOINT_INTERVAL
+        self.meta = self.read()
+        self.lock = threading.Lock()
+        self._arrays = {}
+        self._pending = None
+        self._written = set()
+        self._written_upto = 0  # Frames up to this one are written
+
+    def read(self) -> dict:
+        """
+        The committed checkpoint's metadata, or None if there is none.
+        """
+        path = os.path.join(self.folder, CHECKPOINT_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def _path(self, slot: int, name: str) -> str:
+        return os.path.join(self.folder, f"{name}_{slot}.npy")
+
+    def restore(self, state) -> dict:
+        """
+        Load the committed checkpoint into `state` (a fresh AfterimageState with the
+        same settings). Raises ValueError if the checkpoint has other settings.
+
+        Returns:
+            dict: The checkpoint's metadata.
+        """
+        meta = self.meta
+        if meta is None:
+            raise ValueError(f"No checkpoint in {self.folder}")
+        if meta['config_hash'] != state_config_hash(state):
+            raise ValueError(
+                f"The checkpoint in {self.folder} was made with other model settings"
+            )
+        paths = {name: self._path(meta['slot'], name) for name in STATE_ARRAYS}
+        arrays = {name: np.load(path, mmap_mode='r') for name, path in paths.items()}
+        state.opsin = np.array(arrays['opsin'])
+        state.frame_index = meta['frame_index']
+        state.opsin_key = meta['opsin_key']
+        self._written_upto = meta['frame_index']
+        previous = arrays['previous_afterimage']
+        if state.ring:
+            slot = (state.frame_index - 1) % state.ring
+            state.previous_afterimage = state.arena.get(
+                ('afterimage', slot), previous.shape, previous.dtype
+            )
+            np.copyto(state.previous_afterimage, previous)
+        else:
+            state.previous_afterimage = np.array(previous)
+        return meta
+
+    def due(self, frame_index: int) -> bool:
+        return frame_index % self.interval == 0
+
+    def snapshot(self, state, last_file: str, finished: bool = False) -> None:
+        """
+        Copy the state after `last_file` into the free slot; it is committed once every
+        frame up to it was written (immediately if it already was).
+        """
+        with self.lock:
+            # A snapshot still waiting for its frames is replaced, so it cannot be
+            # committed while overwritten.
+            self._pending = None
+            slot = 1 - self.meta['slot'] if self.meta else 0
+        os.makedirs(self.folder, exist_ok=True)
+        shapes = {}
+        for name in STATE_ARRAYS:
+            array = getattr(state, name)
+            mapped = self._arrays.get((slot, name))
+            layout = (array.shape, array.dtype)
+            if mapped is None or (mapped.shape, mapped.dtype) != layout:
+                path = self._path(slot, name)
+                mapped = np.lib.format.open_memmap(
+                    path, mode='w+', dtype=array.dtype, shape=array.shape
+                )
+                self._arrays[(slot, name)] = mapped
+            np.copyto(mapped, array)
+            mapped.flush()
+            shapes[name] = [list(array.shape), array.dtype.str]
+        meta = {
+            'frame_index': state.frame_index,
+            'last_file': last_file,
+            'config_hash': state_config_hash(state),
+            'opsin_key': state.opsin_key,
+            'slot': slot,
+            'finished': finished,
+            'arrays': shapes,
+            'time': time.time(),
+        }
+        with self.lock:
+            self._pending = meta
+            self._commit_written()
+
+    def written(self, frame_index: int) -> None:
+        """
+        Report that the outputs of frame `frame_index` (1-based, as
+        AfterimageState.frame_index after its step) are written.
+        """
+        with self.lock:
+            self._written.add(frame_index)
+            while self._written_upto + 1 in self._written:
+                self._written_upto += 1
+                self._written.discard(self._written_upto)
+            self._commit_written()
+
+    def _commit_written(self) -> None:
+        if self._pending is None or self._pending['frame_index'] > self._written_upto:
+            return
+        meta, self._pending = self._pending, None
+        path = os.path.join(self.folder, CHECKPOINT_FILE)
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(meta, f, indent=2)
+            # On disk before the rename: a power loss cannot leave an empty checkpoint.
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(f"{path}.tmp", path)
+        self.meta = meta
@@ -0,0 +1,143 @@
+import os
+
+import numpy as np
+
+from model.model_config import ModelConfig
+
+# Output order of the excitation maps; the observer spectra use pysilsub's names.
+PHOTORECEPTORS = ('lc', 'mc', 'sc', 'rh')
+# Display primary colours, in the channel order of an RGB image.
+RGB_PRIMARIES = ('red', 'green', 'blue')
+
+_TRANSFORMS = {}
+
+
+def _transform_key(age: int, field_size: int, primaries: str) -> tuple:
+    return int(age), int(field_size), str(primaries)
+
+
+def _cache_path(key: tuple, cache_dir: str) -> str:
+    age, field_size, primaries = key
+    return os.path.join(
+        cache_dir, f"excitation_{primaries}_age{age}_fs{field_size}.npy"
+    )
+
+
+def derive_excitation_transform(
+    age: int, field_size: int, primaries: str
+) -> np.ndarray:
+    """
+    Derive the linear RGB -> (L, M, S, rod) excitation transform from observer spectra.
+
+    Each column is the excitation produced by one display primary at full setting,
+    i.e. the observer's action spectra integrated against the primary's calibrated
+    spectral power distribution. Rows are normalized so that RGB white (1, 1, 1)
+    excites every photoreceptor class with 1.0.
+
+    Parameters:
+        age: int
+            Observer age passed to pysilsub's ColorimetricObserver.
+        field_size: int
+            Observer field size in degrees.
+        primaries: str
+            Name of a pysilsub package device whose primaries include red, green and
+            blue.
+
+    Returns:
+        np.ndarray: Transform matrix with shape (4, 3).
+    """
+    from pysilsub.observers import ColorimetricObserver
+    from pysilsub.problems import SilentSubstitutionProblem
+
+    observer = ColorimetricObserver(age=age, field_size=field_size)
+    device = SilentSubstitutionProblem.from_package_data(primaries)
+    colors = list(device.primary_colors)
+    if not set(RGB_PRIMARIES).issubset(colors):
+        raise ValueError(
+            f"Device '{primaries}' has no red/green/blue primaries: {colors}"
+        )
+
+    action_spectra = observer.action_spectra[list(PHOTORECEPTORS)]
+    transform = np.zeros((len(PHOTORECEPTORS), len(RGB_PRIMARIES)))
+    for j, color in enumerate(RGB_PRIMARIES):
+        primary = colors.index(color)
+        spds = device.calibration.loc[primary]
+        # Full-setting output minus the dark level of the primary.
+        spd = spds.iloc[-1] - spds.iloc[0]
+        spd.index = spd.index.astype(int)
+        wavelengths = action_spectra.index.intersection(spd.index)
+        transform[:, j] = (
+            action_spectra.loc[wavelengths].T.values @ spd.loc[wavelengths].values
+        )
+
+    return transform / transform.sum(axis=1, keepdims=True)
+
+
+def get_excitation_transform(
+    age: int = None,
+    field_size: int = None,
+    primaries: str = None,
+    cache_dir: str = None,
+) -> np.ndarray:
+    """
+    Return the RGB -> (L, M, S, rod) transform, cached in memory and on disk.
+
+    The transform is derived once per (age, field_size, primaries) key. Later calls in
+    the same process are served from memory; later processes load it from `cache_dir`.
+    Defaults come from ModelConfig.
+    """
+    if age is None:
+        age = ModelConfig.OBSERVER_AGE
+    if field_size is None:
+        field_size = ModelConfig.OBSERVER_FIELD_SIZE
+    if primaries is None:
+        primaries = ModelConfig.DISPLAY_PRIMARIES
+    if cache_dir is None:
+        cache_dir = ModelConfig.EXCITATION_CACHE_DIR
+
+    key = _transform_key(age, field_size, primaries)
+    transform = _TRANSFORMS.get(key)
+    if transform is not None:
+        return transform
+
+    path = _cache_path(key, cache_dir)
+    if os.path.exists(path):
+        transform = np.load(path)
+    else:
+        transform = derive_excitation_transform(*key)
+        os.makedirs(cache_dir, exist_ok=True)
+        np.save(path, transform)
+
+    transform.setflags(write=False)
+    _TRANSFORMS[key] = transform
+    return transform
+
+
+def clear_transform_cache() -> None:
+    """
+    Drop the in-memory transforms (the on-disk cache is left untouched).
+    """
+    _TRANSFORMS.clear()
+
+
+def apply_excitation_transform(image: np.ndarray, transform: np.ndarray) -> np.ndarray:
+    """
+    Apply a (N, 3) excitation transform to a whole RGB frame as one matrix product.
+
+    Parameters:
+        image: np.ndarray
+            RGB image (H x W x 3), values in [0, 1].
+        transform: np.ndarray
+            Transform from get_excitation_transform.
+
+    Returns:
+        np.ndarray: Excitation map (H x W x N) in the dtype of the image (float64
+        for integer images).
+    """
+    height, width, channels = image.shape
+    if channels != transform.shape[1]:
+        raise ValueError(f"Expected {transform.shape[1]} channels, got {channels}")
+    dtype = image.dtype if np.issubdtype(image.dtype, np.floating) else np.float64
+    pixels = image.reshape(-1, channels)
+    excitations = pixels @ transform.T.astype(dtype, copy=False)
+    return excitations.reshape(height, width, transform.shape[0])
@@ -4,11 +4,15 @@ import cv2
 import numpy as np
 
 from model.model_config import ModelConfig
+from model.utils.frame_format import check_layout
 
 
-def read_image(path: str = None, color: bool = True) -> np.ndarray:
+def read_image(
+    path: str = None, color: bool = True, normalize: bool = True
+) -> np.ndarray:
     """
     Read an image (color or grayscale) and normalize to [0,1]. Uses default path if None.
+    With normalize=False the uint8 pixels are returned as read.
     """
     if path is None:
         path = ModelConfig.DEFAULT_INPUT_DIR
@@ -18,12 +22,25 @@ def read_image(path: str = None, color: bool = True) -> np.ndarray:
         raise FileNotFoundError(f"Image not found: {path}")
     if color:
         img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    if not normalize:
+        return img
     return img / 255.0
 
 
+def to_uint8(image: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+    """
+    Convert an image with values in [0,1] to uint8 the way save_image does.
+    With `out` the result is written there without a temporary.
+    """
+    if out is None:
+        return (image * 255).astype(np.uint8)
+    return np.multiply(image, 255, out=out, casting='unsafe')
+
+
 def save_image(path: str, image: np.ndarray) -> None:
     """
-    Save an image (assumed RGB with values [0,1]). Uses default output directory if path not fully specified.
+    Save an image (assumed RGB with values [0,1], or uint8 from to_uint8). Uses default
+    output directory if path not fully specified.
     """
     # If no directory provided, use default output
     directory = os.path.dirname(path)
@@ -31,12 +48,39 @@ def save_image(path: str, image: np.ndarray) -> None:
         directory = ModelConfig.DEFAULT_OUTPUT_DIR
         path = os.path.join(directory, path)
     os.makedirs(directory, exist_ok=True)
-    image_to_save = (image * 255).astype(np.uint8)
+    image_to_save = image if image.dtype == np.uint8 else to_uint8(image)
     if image_to_save.ndim == 3 and image_to_save.shape[2] == 3:
         image_to_save = cv2.cvtColor(image_to_save, cv2.COLOR_RGB2BGR)
     cv2.imwrite(path, image_to_save)
 
 
+def read_frame(path: str, layout: str = None) -> np.ndarray:
+    """
+    Read a color frame as uint8 in the given channel layout (default
+    ModelConfig.FRAME_LAYOUT). Frames in the native 'BGR' layout are returned as
+    decoded, without a colour conversion.
+    """
+    img = cv2.imread(path, cv2.IMREAD_COLOR)
+    if img is None:
+        raise FileNotFoundError(f"Image not found: {path}")
+    if check_layout(layout) == 'RGB':
+        img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    return img
+
+
+def save_frame(path: str, frame: np.ndarray, layout: str = None) -> None:
+    """
+    Write a frame in the given channel layout (default ModelConfig.FRAME_LAYOUT).
+    uint8 frames are written as they are; float frames in [0,1] go through to_uint8.
+    Unlike save_image, the folder must already exist.
+    """
+    if frame.dtype != np.uint8:
+        frame = to_uint8(frame)
+    if check_layout(layout) == 'RGB':
+        frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
+    cv2.imwrite(path, frame)
+
+
 def list_images(folder: str = None) -> list:
     """
     Return a sorted list of image filenames in the given folder. Uses default input folder if None.
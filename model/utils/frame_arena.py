@@ -0,0 +1,111 @@
+import queue
+import sys
+
+import numpy as np
+
+
+class FrameArena:
+    """
+    Named frame-sized buffers that are allocated once and reused for every frame.
+
+    get() returns the same array for the same (name, shape, dtype) on every call, so
+    code that writes its temporaries into arena buffers (out= arguments) stops
+    allocating once the first frame has been processed. `allocations` counts the buffers
+    created so far.
+    """
+
+    def __init__(self):
+        self._buffers = {}
+        self.allocations = 0
+
+    def get(self, name, shape: tuple, dtype) -> np.ndarray:
+        """
+        Return the buffer registered under (name, shape, dtype), allocating it on first
+        use. The contents are whatever was last written to it.
+        """
+        key = (name, tuple(shape), np.dtype(dtype))
+        buffer = self._buffers.get(key)
+        if buffer is None:
+            buffer = self._buffers[key] = np.empty(shape, dtype=dtype)
+            self.allocations += 1
+        return buffer
+
+    @property
+    def nbytes(self) -> int:
+        return sum(buffer.nbytes for buffer in self._buffers.values())
+
+    def __len__(self) -> int:
+        return len(self._buffers)
+
+
+class BufferPool:
+    """
+    At most `size` sets of buffers handed from a producer to consumers on other threads.
+
+    acquire() returns a free set, creating it with `factory` the first `size` times, and
+    blocks while all sets are out; release() hands a set back once its consumer is done.
+    Unlike a fixed ring, sets can come back in any order (e.g. from several writers).
+    """
+
+    def __init__(self, size: int):
+        self._free = queue.SimpleQueue()
+        for _ in range(size):
+            self._free.put(None)
+        self._sets = []
+
+    def acquire(self, factory) -> tuple:
+        buffers = self._free.get()
+        if buffers is None:
+            buffers = tuple(factory())
+            self._sets.append(buffers)
+        return buffers
+
+    def release(self, buffers: tuple) -> None:
+        self._free.put(buffers)
+
+    @property
+    def allocations(self) -> int:
+        return len(self)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(buffer.nbytes for buffers in self._sets for buffer in buffers)
+
+    def __len__(self) -> int:
+        return sum(len(buffers) for buffers in self._sets)
+
+
+def peak_rss_mb() -> float:
+    """
+    Peak resident set size of this process in MB, or None where the resource module is
+    not available (Windows).
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere.
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+def memory_report(*arenas) -> dict:
+    """
+    Total size and allocation count of the given FrameArenas / BufferPools, and the peak
+    RSS of the process.
+    """
+    return {
+        'arena_buffers': sum(len(arena) for arena in arenas),
+        'arena_mb': sum(arena.nbytes for arena in arenas) / 2 ** 20,
+        'allocations': sum(arena.allocations for arena in arenas),
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def format_memory_report(report: dict) -> str:
+    peak = report['peak_rss_mb']
+    return (
+        f"Buffers: {report['arena_buffers']} arrays, {report['arena_mb']:.1f} MB "
+        f"({report['allocations']} allocations); "
+        f"peak RSS {'unknown' if peak is None else f'{peak:.1f} MB'}"
+    )
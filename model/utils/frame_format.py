@@ -0,0 +1,32 @@
+import numpy as np
+
+from model.model_config import ModelConfig
+
+LAYOUTS = ('RGB', 'BGR')
+
+
+def check_layout(layout: str = None) -> str:
+    """
+    Return `layout`, or ModelConfig.FRAME_LAYOUT if None, after validating it.
+    """
+    if layout is None:
+        layout = ModelConfig.FRAME_LAYOUT
+    if layout not in LAYOUTS:
+        raise ValueError(f"Unknown frame layout '{layout}', expected one of {LAYOUTS}")
+    return layout
+
+
+def channel_params(values, layout: str = None) -> tuple:
+    """
+    Reorder per-channel parameters given in RGB order (e.g. ModelConfig.CA_RGB) to the
+    channel order of `layout`, so BGR frames need no colour conversion.
+    """
+    values = tuple(values)
+    return values[::-1] if check_layout(layout) == 'BGR' else values
+
+
+def state_dtype() -> np.dtype:
+    """
+    The dtype of the opsin state and afterimages (ModelConfig.STATE_DTYPE).
+    """
+    return np.dtype(ModelConfig.STATE_DTYPE)
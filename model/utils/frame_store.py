@@ -0,0 +1,338 @@
+import hashlib
+import json
+import os
+
+import cv2
+import numpy as np
+
+from model.utils.file_utils import list_images, read_frame
+from model.utils.frame_format import check_layout
+
+STORE_SUFFIX = ".frames"
+INDEX_FILE = "index.json"
+NAMES_FILE = "names.txt"
+TIMESTAMPS_FILE = "timestamps.f64"
+# Frames per chunk file: large enough to keep the file count low, small enough that the
+# unused tail of the last chunk stays small.
+CHUNK_FRAMES = 64
+
+
+def is_frame_store(path: str) -> bool:
+    """
+    Whether `path` names a frame store (a folder ending in .frames).
+    """
+    return str(path).rstrip(os.sep).endswith(STORE_SUFFIX)
+
+
+def frame_digest(frame: np.ndarray) -> str:
+    """
+    Content hash of a frame's pixels (the stage cache key of frames read from a store).
+    """
+    return hashlib.blake2b(np.ascontiguousarray(frame), digest_size=16).hexdigest()
+
+
+def _chunk_path(path: str, chunk: int) -> str:
+    return os.path.join(path, f"chunk_{chunk:05d}.npy")
+
+
+class FrameStore:
+    """
+    Read-only store of uint8 frames of one shape in chunked, memory-mapped .npy files.
+
+    A store is a folder (name ending in .frames) with index.json (frame count, shape,
+    dtype, channel layout, frames per chunk, frame rate), chunk_00000.npy, ... of
+    (CHUNK_FRAMES x H x W x C) frames, the frame names (names.txt, e.g. frame_0000.jpg,
+    so outputs keep the names of a JPEG directory) and the timestamps in seconds
+    (timestamps.f64). Frames are raw, so reading one costs no decoding and no copy:
+    store[i] is a read-only view into chunk i // CHUNK_FRAMES, found in O(1).
+
+    The index is the commit point: frames beyond its count (e.g. of a writer that
+    crashed) are ignored. A store closed before its first frame has no shape (None)
+    and is empty.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, INDEX_FILE)) as f:
+            self.index = json.load(f)
+        shape = self.index['shape']
+        self.count = self.index['count'] if shape is not None else 0
+        self.shape = tuple(shape) if shape is not None else None
+        self.dtype = np.dtype(self.index['dtype'])
+        self.layout = self.index['layout']
+        self.fps = self.index['fps']
+        self.chunk_frames = self.index['chunk_frames']
+        with open(os.path.join(path, NAMES_FILE)) as f:
+            self.names = f.read().splitlines()[:self.count]
+        self.timestamps = np.fromfile(
+            os.path.join(path, TIMESTAMPS_FILE), dtype='<f8', count=self.count
+        )
+        self._chunks = {}
+        self._positions = None
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _chunk(self, chunk: int) -> np.ndarray:
+        mapped = self._chunks.get(chunk)
+        if mapped is None:
+            path = _chunk_path(self.path, chunk)
+            mapped = self._chunks[chunk] = np.load(path, mmap_mode='r')
+        return mapped
+
+    def __getitem__(self, i: int) -> np.ndarray:
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError(
+                f"Frame {i} out of range for a store of {self.count} frames"
+            )
+        return self._chunk(i // self.chunk_frames)[i % self.chunk_frames]
+
+    def __iter__(self):
+        for i in range(self.count):
+            yield self[i]
+
+    def frame(self, name: str, layout: str = None) -> np.ndarray:
+        """
+        The frame stored under `name`, converted to `layout` if the store holds the
+        other one (which makes a copy).
+        """
+        if self._positions is None:
+            self._positions = {frame_name: i for i, frame_name in enumerate(self.names)}
+        frame = self[self._positions[name]]
+        if layout is not None and check_layout(layout) != self.layout:
+            code = cv2.COLOR_RGB2BGR if self.layout == 'RGB' else cv2.COLOR_BGR2RGB
+            frame = cv2.cvtColor(frame, code)
+        return frame
+
+
+class FrameStoreWriter:
+    """
+    Append frames to a frame store (see FrameStore), creating it if needed.
+
+    Frames are copied into the current chunk's memory map. The index is rewritten,
+    atomically, when a chunk fills up and on close(), so a crash loses at most the
+    frames of the current chunk and never leaves a store that cannot be read. With
+    append=True an existing store is continued, otherwise it is replaced.
+
+    Parameters:
+        path : str
+            Store folder (should end in .frames).
+        fps : float, optional
+            Frame rate; frames written without a timestamp get index / fps (default 0).
+        layout : str
+            Channel order of the frames, recorded for readers (default 'BGR').
+        chunk_frames : int, optional
+            Frames per chunk file (default CHUNK_FRAMES).
+        append : bool
+            Continue an existing store.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        fps: float = None,
+        layout: str = 'BGR',
+        chunk_frames: int = None,
+        append: bool = False,
+    ):
+        self.path = path
+        existing = append and os.path.exists(os.path.join(path, INDEX_FILE))
+        if existing:
+            store = FrameStore(path)
+            self.index = store.index
+        else:
+            if os.path.isdir(path):
+                for name in os.listdir(path):
+                    if (
+                        name == INDEX_FILE
+                        or name in (NAMES_FILE, TIMESTAMPS_FILE)
+                        or name.startswith("chunk_")
+                    ):
+                        os.remove(os.path.join(path, name))
+            os.makedirs(path, exist_ok=True)
+            self.index = {
+                'count': 0,
+                'shape': None,
+                'dtype': 'uint8',
+                'layout': layout,
+                'fps': fps or 0,
+                'chunk_frames': chunk_frames or CHUNK_FRAMES,
+            }
+        self.count = self.index['count']
+        self.chunk_frames = self.index['chunk_frames']
+        # Drop names and timestamps past the committed count (from a crashed writer).
+        with open(os.path.join(path, NAMES_FILE), 'a+') as f:
+            f.seek(0)
+            names = f.read().splitlines()[:self.count]
+        with open(os.path.join(path, NAMES_FILE), 'w') as f:
+            f.writelines(f"{name}\n" for name in names)
+        timestamps = os.path.join(path, TIMESTAMPS_FILE)
+        with open(timestamps, 'ab') as f:
+            f.truncate(8 * self.count)
+        self._names = open(os.path.join(path, NAMES_FILE), 'a')
+        self._timestamps = open(timestamps, 'ab')
+        self._chunk = None
+        self._chunk_index = None
+
+    def _open_chunk(self, chunk: int, shape: tuple) -> None:
+        path = _chunk_path(self.path, chunk)
+        if os.path.exists(path) and chunk * self.chunk_frames < self.count:
+            self._chunk = np.load(path, mmap_mode='r+')
+        else:
+            self._chunk = np.lib.format.open_memmap(path, mode='w+', dtype=np.uint8,
+                                                    shape=(self.chunk_frames,) + shape)
+        self._chunk_index = chunk
+
+    def write(
+        self, frame: np.ndarray, name: str = None, timestamp: float = None
+    ) -> None:
+        """
+        Append a uint8 frame, named `name` (default frame_<index>.jpg).
+        """
+        if frame.dtype != np.uint8:
+            raise ValueError(f"Frame stores hold uint8 frames, got {frame.dtype}")
+        if self.index['shape'] is None:
+            self.index['shape'] = list(frame.shape)
+        elif tuple(self.index['shape']) != frame.shape:
+            shape = tuple(self.index['shape'])
+            raise ValueError(
+                f"Frame shape {frame.shape} differs from the store's {shape}"
+            )
+        chunk, offset = divmod(self.count, self.chunk_frames)
+        if chunk != self._chunk_index:
+            self._open_chunk(chunk, frame.shape)
+        self._chunk[offset] = frame
+        if timestamp is None:
+            timestamp = self.count / self.index['fps'] if self.index['fps'] else 0.0
+        self._names.write(f"{name or f'frame_{self.count:04d}.jpg'}\n")
+        self._timestamps.write(np.float64(timestamp).astype('<f8').tobytes())
+        self.count += 1
+        if offset + 1 == self.chunk_frames:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Make the frames written so far durable and visible to readers.
+        """
+        if self._chunk is not None:
+            self._chunk.flush()
+        self._names.flush()
+        self._timestamps.flush()
+        self.index['count'] = self.count
+        index_path = os.path.join(self.path, INDEX_FILE)
+        with open(f"{index_path}.tmp", "w") as f:
+            json.dump(self.index, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(f"{index_path}.tmp", index_path)
+
+    def close(self) -> None:
+        self.flush()
+        self._names.close()
+        self._timestamps.close()
+        self._chunk = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ImageFolder:
+    """
+    A folder of image files (frame_XXXX.jpg, ...) with the reading interface of
+    FrameStore: len(), names, frame(name, layout) and folder[i], which decode the
+    image. `extensions` narrows the files listed by list_images (e.g. ('.jpg',)).
+    """
+
+    def __init__(self, path: str, extensions: tuple = None):
+        self.path = path
+        self.names = list_images(path)
+        if extensions is not None:
+            names = self.names
+            self.names = [name for name in names if name.lower().endswith(extensions)]
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __getitem__(self, i: int) -> np.ndarray:
+        return self.frame(self.names[i])
+
+    def __iter__(self):
+        for name in self.names:
+            yield self.frame(name)
+
+    def frame(self, name: str, layout: str = None) -> np.ndarray:
+        return read_frame(os.path.join(self.path, name), layout)
+
+
+def open_frames(path: str, extensions: tuple = None):
+    """
+    The frames at `path`: a FrameStore for a .frames folder, otherwise an ImageFolder.
+    """
+    return FrameStore(path) if is_frame_store(path) else ImageFolder(path, extensions)
+
+
+def pack_images(
+    folder: str, store_path: str, fps: float = None, chunk_frames: int = None
+) -> int:
+    """
+    Convert a folder of images into a frame store, keeping their names (decoded as BGR).
+
+    Returns:
+        int: The number of frames stored.
+    """
+    images = ImageFolder(folder)
+    with FrameStoreWriter(store_path, fps=fps, chunk_frames=chunk_frames) as writer:
+        for name in images.names:
+            writer.write(images.frame(name, 'BGR'), name)
+    return len(images)
+
+
+def unpack_images(store_path: str, folder: str) -> int:
+    """
+    Write the frames of a store as image files under their stored names (JPEG for .jpg).
+
+    Returns:
+        int: The number of frames written.
+    """
+    store = FrameStore(store_path)
+    os.makedirs(folder, exist_ok=True)
+    for name in store.names:
+        cv2.imwrite(os.path.join(folder, name), store.frame(name, 'BGR'))
+    return len(store)
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Convert between image folders and frame stores (.frames)."
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    pack = commands.add_parser("pack", help="Image folder -> frame store")
+    pack.add_argument("folder")
+    pack.add_argument("store", help="Store folder, ending in .frames")
+    pack.add_argument("--fps", type=float, default=None)
+    unpack = commands.add_parser("unpack", help="Frame store -> image folder")
+    unpack.add_argument("store")
+    unpack.add_argument("folder")
+    info = commands.add_parser("info", help="Print a store's index")
+    info.add_argument("store")
+    args = parser.parse_args()
+    if args.command == "pack":
+        count = pack_images(args.folder, args.store, args.fps)
+        print(f"Packed {count} frames into {args.store}")
+    elif args.command == "unpack":
+        count = unpack_images(args.store, args.folder)
+        print(f"Unpacked {count} frames into {args.folder}")
+    else:
+        store = FrameStore(args.store)
+        duration = float(store.timestamps[-1]) if len(store) else 0.0
+        print(json.dumps(dict(store.index, duration=duration), indent=2))
+
+
+if __name__ == "__main__":
+    main()
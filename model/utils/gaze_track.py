@@ -0,0 +1,55 @@
+import csv
+
+import numpy as np
+
+
+class GazeTrack:
+    """
+    Per-frame gaze positions (x, y) in frame pixels.
+
+    Gaze track files are CSV with one `frame,x,y` row per sample, with or without a
+    header row; `frame` is the index of the processed (output) frame. Frames between
+    samples keep the gaze of the previous sample, and frames before the first sample use
+    the first.
+
+    Parameters:
+        frames : sequence of int
+            Frame indices of the samples.
+        points : sequence of (float, float)
+            Gaze position of each sample.
+    """
+
+    def __init__(self, frames, points):
+        order = np.argsort(frames, kind='stable')
+        self.frames = np.asarray(frames, dtype=np.int64)[order]
+        self.points = np.asarray(points, dtype=np.float64).reshape(-1, 2)[order]
+        if len(self.frames) == 0:
+            raise ValueError("A gaze track needs at least one sample")
+
+    @classmethod
+    def load(cls, path: str) -> "GazeTrack":
+        frames, points = [], []
+        with open(path, newline="") as f:
+            for row in csv.reader(f):
+                if not row or row[0].strip().startswith('#'):
+                    continue
+                try:
+                    frame, x, y = int(row[0]), float(row[1]), float(row[2])
+                except ValueError:
+                    if frames:
+                        raise ValueError(f"Malformed gaze sample {row} in {path}")
+                    continue  # header
+                frames.append(frame)
+                points.append((x, y))
+        return cls(frames, points)
+
+    def __len__(self):
+        return len(self.frames)
+
+    def at(self, frame: int) -> tuple:
+        """
+        Gaze position for a frame index.
+        """
+        index = max(int(np.searchsorted(self.frames, frame, side='right')) - 1, 0)
+        x, y = self.points[index]
+        return float(x), float(y)
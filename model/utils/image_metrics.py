@@ -0,0 +1,33 @@
+import cv2
+import numpy as np
+
+
+def psnr(image: np.ndarray, reference: np.ndarray, data_range: float = 1.0) -> float:
+    """
+    Peak signal-to-noise ratio in dB (inf for identical images).
+    """
+    difference = np.asarray(image, np.float64) - np.asarray(reference, np.float64)
+    mse = np.mean(difference ** 2)
+    return float('inf') if mse == 0 else float(10 * np.log10(data_range ** 2 / mse))
+
+
+def ssim(image: np.ndarray, reference: np.ndarray, data_range: float = 1.0) -> float:
+    """
+    Mean structural similarity (Wang et al. 2004) with an 11-tap Gaussian window
+    (sigma 1.5), averaged over pixels and channels.
+    """
+    x = np.asarray(image, np.float64)
+    y = np.asarray(reference, np.float64)
+    c1, c2 = (0.01 * data_range) ** 2, (0.03 * data_range) ** 2
+
+    def window(a):
+        return cv2.GaussianBlur(a, (11, 11), 1.5, borderType=cv2.BORDER_REFLECT)
+
+    mu_x, mu_y = window(x), window(y)
+    var_x = window(x * x) - mu_x ** 2
+    var_y = window(y * y) - mu_y ** 2
+    cov = window(x * y) - mu_x * mu_y
+    numerator = (2 * mu_x * mu_y + c1) * (2 * cov + c2)
+    denominator = (mu_x ** 2 + mu_y ** 2 + c1) * (var_x + var_y + c2)
+    ssim_map = numerator / denominator
+    return float(ssim_map.mean())
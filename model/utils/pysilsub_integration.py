@@ -1,45 +1,29 @@
 import numpy as np
-from pysilsub.observers import ColorimetricObserver
-from pysilsub.problems import SilentSubstitutionProblem
 
+from model.utils.excitation_engine import (
+    apply_excitation_transform,
+    get_excitation_transform,
+)
 
-def compute_photoreceptor_excitation(image: np.ndarray) -> np.ndarray:
+
+def compute_photoreceptor_excitation(
+    image: np.ndarray, age: int = None, field_size: int = None, primaries: str = None
+) -> np.ndarray:
     """
-    Compute photoreceptor excitations using pysilsub.
+    Compute photoreceptor excitations using pysilsub observer spectra.
+
+    The RGB -> photoreceptor transform is derived from the observer's action spectra and
+    the display primaries once per (age, field_size, primaries) key and then applied to
+    the whole frame as a single matrix product.
 
     Parameters:
         image: np.ndarray
             RGB image with values in [0, 1].
+        age, field_size, primaries: optional
+            Observer and display settings (default from ModelConfig).
 
     Returns:
-        np.ndarray: Excitation map with shape (H, W, N) for N photoreceptor classes.
+        np.ndarray: Excitation map with shape (H, W, 4) for L, M, S cones and rods.
     """
-    # Initialize observer and problem
-    observer = ColorimetricObserver(age=32, field_size=10)
-    ssp = SilentSubstitutionProblem.from_package_data('STLAB_1_York')
-    ssp.observer = observer
-
-    # Ensure all photoreceptors are accounted for before setting target_contrast
-    ssp.ignore = ['rh']  # Ignore rods
-    ssp.silence = ['mc', 'lc']  # Silence M and L cones
-    ssp.target = ['sc']  # Target S cones
-
-    # Now it's safe to set the target contrast
-    ssp.target_contrast = 0.2
-    ssp.background = [0.5] * ssp.nprimaries  # Set uniform background
-
-    # Prepare output array
-    height, width, _ = image.shape
-    excitations = np.zeros((height, width, len(ssp.observer.photoreceptors)))
-
-    # Compute excitations
-    for x in range(height):
-        for y in range(width):
-            try:
-                solution = ssp.linalg_solve()  # No arguments passed
-                excitations[x, y] = solution
-            except Exception as e:
-                print(f"Failed to compute excitation for pixel ({x},{y}): {e}")
-                excitations[x, y] = np.zeros(len(ssp.observer.photoreceptors))
-
-    return excitations
+    transform = get_excitation_transform(age, field_size, primaries)
+    return apply_excitation_transform(image, transform)
@@ -0,0 +1,224 @@
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from model.model_config import ModelConfig
+
+# ModelConfig fields each cached stage depends on; 'NAME.key' selects an entry of a dict
+# field. Downstream stages also depend on their inputs' keys, passed to stage_key.
+STAGE_FIELDS = {
+    'decode': (),
+    'excitation': ('OBSERVER_AGE', 'OBSERVER_FIELD_SIZE', 'DISPLAY_PRIMARIES'),
+    'spectral_opsin': (
+        'CA_PS',
+        'CD_PS',
+        'TIME_STEP',
+        'ITERATIONS',
+        'INTEGRATOR',
+        'STATE_DTYPE',
+    ),
+    'opsin': (
+        'FRAME_LAYOUT',
+        'CA_RGB',
+        'CD_RGB',
+        'TIME_STEP',
+        'ITERATIONS',
+        'INTEGRATOR',
+        'STATE_DTYPE',
+    ),
+    'effective_radiance': ('OPPONENT_PARAMS.kernel_size', 'OPPONENT_PARAMS.sigma_blur'),
+    'opponent_opsin': (
+        'OPPONENT_PARAMS.c_a',
+        'OPPONENT_PARAMS.c_d',
+        'OPPONENT_PARAMS.dt',
+        'OPPONENT_PARAMS.num_steps',
+        'OPPONENT_PARAMS.N_sigma',
+        'OPPONENT_PARAMS.kernel_size_diff',
+    ),
+}
+
+_FILE_DIGESTS = {}
+# Bytes read at a time when hashing a file.
+DIGEST_CHUNK = 1 << 20
+
+
+def _config_value(name: str):
+    field, _, entry = name.partition('.')
+    value = getattr(ModelConfig, field)
+    return value[entry] if entry else value
+
+
+def file_digest(path: str) -> str:
+    """
+    Content hash of a file, remembered per (path, size, mtime) so each file is read
+    once.
+    """
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    digest = _FILE_DIGESTS.get(key)
+    if digest is None:
+        h = hashlib.blake2b(digest_size=16)
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(DIGEST_CHUNK), b""):
+                h.update(chunk)
+        digest = _FILE_DIGESTS[key] = h.hexdigest()
+    return digest
+
+
+def stage_key(stage: str, inputs=()) -> str:
+    """
+    Content address of a stage output: the stage name, the ModelConfig fields in
+    STAGE_FIELDS[stage] and `inputs` (file digests, upstream keys or other parameters).
+    """
+    h = hashlib.blake2b(digest_size=16)
+    h.update(stage.encode())
+    for name in STAGE_FIELDS[stage]:
+        h.update(f"\0{name}={_config_value(name)!r}".encode())
+    for item in inputs:
+        h.update(f"\0{item!r}".encode())
+    return h.hexdigest()
+
+
+class StageCache:
+    """
+    On-disk cache of stage outputs as .npy files named by their content address.
+
+    Hits are returned memory-mapped (read-only). Files are touched on every hit and the
+    least recently used ones are deleted when the cache grows beyond `budget_mb`. The
+    sizes and use order are read from the folder once, at construction, and then kept
+    in memory, so a put costs no listing of the folder; files written by another
+    process meanwhile are indexed when hit. Per-stage hit and miss counts are kept in
+    `stats`. A cache can be shared by threads.
+
+    Parameters:
+        cache_dir (str, optional): Cache folder (default ModelConfig.STAGE_CACHE_DIR).
+        budget_mb (float, optional): Size budget (default ModelConfig.STAGE_CACHE_MB).
+    """
+
+    def __init__(self, cache_dir: str = None, budget_mb: float = None):
+        if cache_dir is None:
+            cache_dir = ModelConfig.STAGE_CACHE_DIR
+        if budget_mb is None:
+            budget_mb = ModelConfig.STAGE_CACHE_MB
+        self.cache_dir = cache_dir
+        self.budget = budget_mb * 2 ** 20
+        self.stats = {}
+        self.evicted = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # path -> size of the cached files, least recently used first.
+        self._index = OrderedDict(
+            (path, size)
+            for path, size, _ in sorted(self._entries(), key=lambda entry: entry[2])
+        )
+        self._total = sum(self._index.values())
+
+    def _path(self, stage: str, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{stage}-{key}.npy")
+
+    def _count(self, stage: str, outcome: str) -> None:
+        with self._lock:
+            counts = self.stats.setdefault(stage, {'hits': 0, 'misses': 0})
+            counts[outcome] += 1
+
+    def get(self, stage: str, key: str) -> np.ndarray:
+        """
+        The cached array (memory-mapped), or None on a miss.
+        """
+        path = self._path(stage, key)
+        try:
+            array = np.load(path, mmap_mode='r')
+            os.utime(path)
+        except (OSError, ValueError):
+            with self._lock:
+                self._total -= self._index.pop(path, 0)
+            self._count(stage, 'misses')
+            return None
+        with self._lock:
+            if path in self._index:
+                self._index.move_to_end(path)
+            else:
+                self._add(path, os.path.getsize(path))
+        self._count(stage, 'hits')
+        return array
+
+    def put(self, stage: str, key: str, array: np.ndarray) -> None:
+        path = self._path(stage, key)
+        # A unique temporary file, so threads putting the same key do not collide.
+        handle, temporary = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(handle, 'wb') as f:
+            np.save(f, np.ascontiguousarray(array))
+            size = f.tell()
+        os.replace(temporary, path)
+        with self._lock:
+            self._add(path, size)
+            self._evict()
+
+    def stage(self, stage: str, inputs, compute) -> tuple:
+        """
+        Return (output, key) of a stage, loading it from the cache or running compute().
+        """
+        key = stage_key(stage, inputs)
+        array = self.get(stage, key)
+        if array is None:
+            array = compute()
+            self.put(stage, key, array)
+        return array, key
+
+    def _add(self, path: str, size: int) -> None:
+        self._total += size - self._index.pop(path, 0)
+        self._index[path] = size
+
+    def _entries(self) -> list:
+        """
+        (path, size, mtime_ns) of the cached files, skipping files removed meanwhile.
+        """
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if not entry.name.endswith('.npy'):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((entry.path, stat.st_size, stat.st_mtime_ns))
+        return entries
+
+    def _evict(self) -> None:
+        # Called with the lock held, after adding the entry to keep (the most recent).
+        while self._total > self.budget and len(self._index) > 1:
+            path, size = self._index.popitem(last=False)
+            self._total -= size
+            try:
+                os.remove(path)
+            except FileNotFoundError:  # evicted by another process
+                continue
+            self.evicted += 1
+
+    @property
+    def nbytes(self) -> int:
+        return self._total
+
+    def report(self) -> str:
+        lines = [
+            f"Stage cache {self.cache_dir}: {self.nbytes / 2 ** 20:.1f} MB, "
+            f"{self.evicted} evicted"
+        ]
+        for stage, counts in self.stats.items():
+            lines.append(
+                f"  {stage:<20} {counts['hits']:>5} hits  {counts['misses']:>5} misses"
+            )
+        return "\n".join(lines)
+
+
+def run_stage(cache: StageCache, stage: str, inputs, compute) -> tuple:
+    """
+    StageCache.stage when a cache is given, otherwise just compute() (with key None).
+    """
+    if cache is None:
+        return compute(), None
+    return cache.stage(stage, inputs, compute)
@@ -0,0 +1,190 @@
+import queue
+import threading
+import time
+
+STAGES = ('read', 'compute', 'write')
+
+# Default bound on the items between the start of their read and the end of their write.
+MAX_IN_FLIGHT = 8
+
+_DONE = object()
+_POLL = 0.1
+
+
+class _Run:
+    """
+    Shared bookkeeping of one staged run: stage busy times and the first error.
+    """
+
+    def __init__(self):
+        self.busy = {stage: 0.0 for stage in STAGES}
+        self.lock = threading.Lock()
+        self.stop = threading.Event()
+        self.error = None
+
+    def timed(self, stage, fn, *args):
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                self.busy[stage] += elapsed
+
+    def fail(self, exc):
+        with self.lock:
+            if self.error is None:
+                self.error = exc
+        self.stop.set()
+
+    def put(self, q, value) -> bool:
+        while not self.stop.is_set():
+            try:
+                q.put(value, timeout=_POLL)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def get(self, q):
+        while not self.stop.is_set():
+            try:
+                return q.get(timeout=_POLL)
+            except queue.Empty:
+                pass
+        return _DONE
+
+
+def run_staged(items, read, compute, write, readers: int = 0, writers: int = 0,
+               max_in_flight: int = MAX_IN_FLIGHT) -> dict:
+    """
+    Run items through read -> compute -> write stages.
+
+    `read(item)` runs on `readers` threads and `write(item, result)` on `writers`
+    threads, while `compute(item, data)` runs on a single thread and sees items in their
+    original order, so sequential state (e.g. the opsin kinetics) stays correct. Reads
+    that finish out of order are reassembled before compute. At most `max_in_flight`
+    items are between the start of their read and the end of their write, so compute
+    results that are reused after `max_in_flight` items are never overwritten before
+    they are written. OpenCV releases the GIL while it decodes and encodes, so I/O
+    overlaps with compute.
+
+    With writers=1 writes also happen in order (needed for cv2.VideoWriter). With
+    readers=0 and writers=0 everything runs serially on the calling thread.
+
+    Returns:
+        dict: {'items', 'wall_s', 'stages': {stage: stats}} where each stage's stats
+        are {'threads', 'busy_s', 'occupancy'}; occupancy is the fraction of the stage's
+        thread time spent working, so the stage closest to 1.0 is the bottleneck.
+    """
+    items = list(items)
+    run = _Run()
+    start = time.perf_counter()
+
+    if readers == 0 and writers == 0:
+        for item in items:
+            data = run.timed('read', read, item)
+            result = run.timed('compute', compute, item, data)
+            run.timed('write', write, item, result)
+    else:
+        readers, writers = max(1, readers), max(1, writers)
+        slots = threading.Semaphore(max_in_flight)
+        todo = queue.Queue()
+        decoded = queue.Queue()
+        computed = queue.Queue(maxsize=max_in_flight)
+
+        def feed():
+            for index, item in enumerate(items):
+                while not slots.acquire(timeout=_POLL):
+                    if run.stop.is_set():
+                        return
+                if not run.put(todo, (index, item)):
+                    return
+            for _ in range(readers):
+                run.put(todo, _DONE)
+
+        def read_stage():
+            while True:
+                task = run.get(todo)
+                if task is _DONE:
+                    return
+                index, item = task
+                try:
+                    data = run.timed('read', read, item)
+                except BaseException as exc:
+                    run.fail(exc)
+                    return
+                run.put(decoded, (index, data))
+
+        def compute_stage():
+            pending = {}
+            for index, item in enumerate(items):
+                while index not in pending:
+                    task = run.get(decoded)
+                    if task is _DONE:
+                        return
+                    pending[task[0]] = task[1]
+                try:
+                    result = run.timed('compute', compute, item, pending.pop(index))
+                except BaseException as exc:
+                    run.fail(exc)
+                    return
+                if not run.put(computed, (index, result)):
+                    return
+            for _ in range(writers):
+                run.put(computed, _DONE)
+
+        def write_stage():
+            while True:
+                task = run.get(computed)
+                if task is _DONE:
+                    return
+                index, result = task
+                try:
+                    run.timed('write', write, items[index], result)
+                except BaseException as exc:
+                    run.fail(exc)
+                    return
+                slots.release()
+
+        threads = [
+            threading.Thread(target=feed),
+            threading.Thread(target=compute_stage),
+        ]
+        threads += [threading.Thread(target=read_stage) for _ in range(readers)]
+        threads += [threading.Thread(target=write_stage) for _ in range(writers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if run.error is not None:
+            raise run.error
+
+    wall = time.perf_counter() - start
+    counts = {'read': readers or 1, 'compute': 1, 'write': writers or 1}
+    stages = {
+        stage: {
+            'threads': counts[stage],
+            'busy_s': run.busy[stage],
+            'occupancy': run.busy[stage] / (wall * counts[stage]) if wall > 0 else 0.0,
+        }
+        for stage in STAGES
+    }
+    return {'items': len(items), 'wall_s': wall, 'stages': stages}
+
+
+def format_stage_report(stats: dict) -> str:
+    """
+    Human-readable occupancy report for the stats returned by run_staged.
+    """
+    lines = [f"{stats['items']} items in {stats['wall_s']:.2f} s"]
+    bottleneck = max(STAGES, key=lambda stage: stats['stages'][stage]['occupancy'])
+    for stage in STAGES:
+        entry = stats['stages'][stage]
+        marker = "  <- bottleneck" if stage == bottleneck else ""
+        lines.append(
+            f"  {stage:<8} {entry['threads']:>2} threads  "
+            f"busy {entry['busy_s']:7.2f} s  "
+            f"occupancy {entry['occupancy']:6.1%}{marker}"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,516 @@
+import contextlib
+import csv
+import glob
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import cv2
+
+from model.model_config import ModelConfig, apply_config, config_snapshot
+from model.utils.frame_arena import peak_rss_mb
+from model.video.process_video_pipeline import (
+    PIPELINE_RENDITIONS,
+    stream_video_pipeline,
+)
+from model.video.video_outputs import RENDITIONS
+
+STATE_FILE = "batch_state.json"
+SUMMARY_FILE = "batch_summary.csv"
+VIDEO_EXTENSIONS = ('.mov', '.mp4', '.avi', '.mkv', '.m4v')
+
+# Bytes per frame pixel held by a streaming job for its whole run: the decoded frame,
+# the float32 opsin state, afterimage and advance_opsin scratch buffers, and the uint8
+# afterimage and overlay (see AfterimageState and stream_video_pipeline).
+RESIDENT_BYTES_PER_PIXEL = 96
+# Frames queued per encoded rendition: the encoder queue (4) and the one being encoded.
+QUEUED_FRAMES_PER_RENDITION = 5
+
+
+def read_manifest(path: str) -> list:
+    """
+    Video paths listed in a manifest, one per line; blank lines and lines starting with
+    '#' are skipped and relative paths are taken relative to the manifest.
+    """
+    folder = os.path.dirname(os.path.abspath(path))
+    videos = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                videos.append(os.path.normpath(os.path.join(folder, line)))
+    return videos
+
+
+def collect_videos(patterns=(), manifest: str = None) -> list:
+    """
+    Absolute paths of the videos matching the glob `patterns` (directories match the
+    videos they contain) and listed in `manifest`, without duplicates, in order.
+    """
+    videos = read_manifest(manifest) if manifest else []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            pattern = os.path.join(pattern, '*')
+        matches = sorted(glob.glob(pattern))
+        videos.extend(
+            path for path in matches if path.lower().endswith(VIDEO_EXTENSIONS)
+        )
+    return list(dict.fromkeys(os.path.abspath(path) for path in videos))
+
+
+def estimate_memory_mb(
+    width: int, height: int, renditions=PIPELINE_RENDITIONS
+) -> float:
+    """
+    Estimated peak memory of one streaming job: the process itself
+    (ModelConfig.SCHEDULER_PROCESS_MB), the buffers it keeps for every frame pixel and
+    the uint8 BGR frames in flight to the encoders.
+    """
+    queued = 3 * QUEUED_FRAMES_PER_RENDITION * len(renditions)
+    per_pixel = RESIDENT_BYTES_PER_PIXEL + queued
+    return ModelConfig.SCHEDULER_PROCESS_MB + width * height * per_pixel / 2 ** 20
+
+
+def probe_video(
+    path: str, fps_target: float = None, renditions=PIPELINE_RENDITIONS
+) -> dict:
+    """
+    Size, length and cost estimates of a video job.
+
+    Returns:
+        dict: 'path', 'width', 'height', 'frames' (frames kept at fps_target), 'work'
+        (pixels times frames, the ordering key) and 'memory_mb' (estimate_memory_mb).
+    """
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise IOError(f"Cannot open video {path}")
+    try:
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        video_fps = cap.get(cv2.CAP_PROP_FPS)
+    finally:
+        cap.release()
+    if fps_target and video_fps > 0:
+        frames = -(-frames // max(1, int(round(video_fps / fps_target))))
+    return {
+        'path': path,
+        'width': width,
+        'height': height,
+        'frames': frames,
+        'work': width * height * frames,
+        'memory_mb': estimate_memory_mb(width, height, renditions),
+    }
+
+
+def available_memory_mb() -> float:
+    """
+    MemAvailable from /proc/meminfo, or None where it is not available.
+    """
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def _signature(path: str) -> list:
+    """
+    [size, mtime] of the file, or None if it cannot be read (moved or deleted).
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_size, int(stat.st_mtime)]
+
+
+def load_state(path: str) -> dict:
+    """
+    The per-video records of a batch state file ({} if there is none yet).
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_state(path: str, records: dict) -> None:
+    """
+    Write the state file atomically, so a crash leaves either the old or the new file.
+    """
+    temporary = f"{path}.tmp"
+    with open(temporary, "w") as f:
+        json.dump(records, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, path)
+
+
+def _output_dirs(videos: list, output_root: str) -> dict:
+    """
+    One output folder per video, named after the file, with a suffix for repeated names.
+    """
+    folders, used = {}, {}
+    for path in videos:
+        stem = os.path.splitext(os.path.basename(path))[0]
+        used[stem] = used.get(stem, 0) + 1
+        name = stem if used[stem] == 1 else f"{stem}_{used[stem]}"
+        folders[path] = os.path.join(output_root, name)
+    return folders
+
+
+def run_video_job(
+    path: str,
+    output_dir: str,
+    fps_target: float = None,
+    alpha: float = 0.7,
+    renditions=PIPELINE_RENDITIONS,
+) -> dict:
+    """
+    Run stream_video_pipeline on one video in the worker process, with its console
+    output going to output_dir/pipeline.log.
+
+    Returns:
+        dict: 'seconds', 'frames' and the worker's 'peak_rss_mb' so far (workers are
+        reused, so this is the largest of the jobs it ran).
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    start = time.perf_counter()
+    log_path = os.path.join(output_dir, "pipeline.log")
+    with open(log_path, "w") as log, contextlib.redirect_stdout(log):
+        frames = stream_video_pipeline(
+            path, output_dir, fps_target=fps_target, alpha=alpha, renditions=renditions
+        )
+    return {
+        'seconds': time.perf_counter() - start,
+        'frames': frames,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def schedule(jobs: list, workers: int, budget_mb: float) -> list:
+    """
+    Order in which to start jobs: longest first, each as soon as a worker is free and
+    its memory estimate fits in the budget next to the running jobs. A job that does not
+    fit lets later (smaller) jobs that do fit go ahead; a job larger than the whole
+    budget runs on its own. Simulated with the estimates only, for a dry run.
+
+    Returns:
+        list: (start slot, job) pairs, where jobs with the same slot start together.
+    """
+    pending = sorted(jobs, key=lambda job: -job['work'])
+    order, running, slot = [], [], 0
+    while pending:
+        for job in _admissible(pending, running, workers, budget_mb):
+            pending.remove(job)
+            running.append(job)
+            order.append((slot, job))
+        running.pop(running.index(min(running, key=lambda job: job['work'])))
+        slot += 1
+    return order
+
+
+def _admissible(pending: list, running: list, workers: int, budget_mb: float) -> list:
+    admitted = []
+    used = sum(job['memory_mb'] for job in running)
+    for job in pending:
+        if len(running) + len(admitted) >= workers:
+            break
+        fits = used + job['memory_mb'] <= budget_mb
+        if fits or not (running or admitted):
+            admitted.append(job)
+            used += job['memory_mb']
+    return admitted
+
+
+def process_video_batch(
+    videos: list,
+    output_root: str,
+    workers: int = None,
+    budget_mb: float = None,
+    fps_target: float = None,
+    alpha: float = 0.7,
+    renditions=PIPELINE_RENDITIONS,
+    state_path: str = None,
+    dry_run: bool = False,
+) -> dict:
+    """
+    Run the streaming video pipeline over many videos on a process pool.
+
+    Every video is probed first and its memory use estimated (estimate_memory_mb). Jobs
+    start longest first (pixels x frames), whenever a worker is free and their estimate
+    fits in `budget_mb` next to the jobs running (see schedule), so the pool stays busy
+    without running out of memory. Each video's renditions go to output_root/<name>/.
+
+    Progress is kept in a state file (default output_root/batch_state.json), rewritten
+    after every job. Videos recorded as done, and unchanged since (size and mtime), are
+    skipped, so after a crash the same command resumes where it stopped. The per-job
+    timings are printed and written to output_root/batch_summary.csv.
+
+    Parameters:
+        videos : list
+            Video paths (see collect_videos).
+        output_root : str
+            Folder for the per-video outputs, the state file and the summary.
+        workers : int, optional
+            Worker processes (default: the number of CPUs).
+        budget_mb : float, optional
+            Memory for the jobs (default: ModelConfig.SCHEDULER_MEMORY_FRACTION of the
+            available memory). Where the available memory is unknown (no /proc/meminfo)
+            and no budget is given, the videos are processed one at a time.
+        fps_target, alpha, renditions :
+            As for stream_video_pipeline.
+        state_path : str, optional
+            State file.
+        dry_run : bool
+            Only print the estimates and the start order.
+    Returns:
+        dict: The state records, keyed by video path.
+    """
+    workers = workers or os.cpu_count() or 1
+    if budget_mb is None:
+        available = available_memory_mb()
+        if available:
+            budget_mb = ModelConfig.SCHEDULER_MEMORY_FRACTION * available
+        else:
+            print(
+                "Available memory unknown: running one video at a time "
+                "(set --memory_mb to run more)"
+            )
+            workers, budget_mb = 1, float('inf')
+    os.makedirs(output_root, exist_ok=True)
+    state_path = state_path or os.path.join(output_root, STATE_FILE)
+    records = load_state(state_path)
+    folders = _output_dirs(videos, output_root)
+
+    jobs = []
+    for path in videos:
+        signature = _signature(path)
+        if signature is None:
+            records[path] = {
+                'status': 'failed',
+                'error': f"Missing video {path}",
+                'signature': None,
+            }
+            continue
+        record = records.get(path)
+        if record and record.get('status') == 'done':
+            if record.get('signature') == signature:
+                continue
+        try:
+            jobs.append(probe_video(path, fps_target, renditions))
+        except IOError as error:
+            records[path] = {
+                'status': 'failed',
+                'error': str(error),
+                'signature': signature,
+            }
+    skipped = len(videos) - len(jobs)
+    print(
+        f"{len(jobs)} videos to process ({skipped} done or unreadable), "
+        f"{workers} workers, memory budget {budget_mb:.0f} MB"
+    )
+
+    if dry_run:
+        for slot, job in schedule(jobs, workers, budget_mb):
+            print(
+                f"  [{slot}] {job['path']}: {job['width']}x{job['height']}, "
+                f"{job['frames']} frames, ~{job['memory_mb']:.0f} MB"
+            )
+        return records
+
+    start = time.perf_counter()
+    pending = sorted(jobs, key=lambda job: -job['work'])
+    running = {}
+    pool, pool_jobs = _worker_pool(workers), 0
+    try:
+        while pending or running:
+            for job in _admissible(pending, list(running.values()), workers, budget_mb):
+                folder = folders[job['path']]
+                try:
+                    future = pool.submit(
+                        run_video_job,
+                        job['path'],
+                        folder,
+                        fps_target,
+                        alpha,
+                        renditions,
+                    )
+                except BrokenProcessPool:
+                    # A worker died (e.g. killed for its memory): the jobs that were on
+                    # the pool fail below and the rest start on a new pool, unless this
+                    # one broke before taking any job.
+                    pool.shutdown()
+                    if not pool_jobs:
+                        print("Worker pool broken: stopping, run again to resume")
+                        pending = []
+                        break
+                    pool, pool_jobs = _worker_pool(workers), 0
+                    break
+                pool_jobs += 1
+                pending.remove(job)
+                running[future] = job
+                print(
+                    f"Started {job['path']} (~{job['memory_mb']:.0f} MB, "
+                    f"{len(running)} running)"
+                )
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                job = running.pop(future)
+                record = {
+                    'signature': _signature(job['path']),
+                    'output': folders[job['path']],
+                    'width': job['width'],
+                    'height': job['height'],
+                    'estimated_mb': job['memory_mb'],
+                }
+                try:
+                    record.update(future.result(), status='done')
+                    rate = record['frames'] / max(record['seconds'], 1e-9)
+                    print(
+                        f"Finished {job['path']} in {record['seconds']:.1f} s "
+                        f"({rate:.1f} frames/s)"
+                    )
+                except Exception as error:
+                    message = f"{type(error).__name__}: {error}"
+                    record.update(status='failed', error=message)
+                    print(f"Failed {job['path']}: {record['error']}")
+                records[job['path']] = record
+                save_state(state_path, records)
+    finally:
+        pool.shutdown()
+
+    save_state(state_path, records)
+    write_summary(os.path.join(output_root, SUMMARY_FILE), records)
+    print(format_summary(records, time.perf_counter() - start))
+    return records
+
+
+def _worker_pool(workers: int) -> ProcessPoolExecutor:
+    # The workers may be spawned rather than forked: hand them the parent's ModelConfig.
+    return ProcessPoolExecutor(
+        max_workers=workers, initializer=apply_config, initargs=(config_snapshot(),)
+    )
+
+
+def write_summary(path: str, records: dict) -> None:
+    """
+    The per-job records as CSV, one row per video.
+    """
+    fields = ['path', 'status', 'seconds', 'frames', 'width', 'height', 'estimated_mb',
+              'peak_rss_mb', 'output', 'error']
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fields, extrasaction='ignore')
+        writer.writeheader()
+        for video, record in records.items():
+            writer.writerow(dict(record, path=video))
+
+
+def _megabytes(value) -> str:
+    return "unknown" if value is None else f"{value:.0f} MB"
+
+
+def format_summary(records: dict, wall_seconds: float) -> str:
+    done = [record for record in records.values() if record.get('status') == 'done']
+    failed = len(records) - len(done)
+    busy = sum(record['seconds'] for record in done)
+    frames = sum(record['frames'] for record in done)
+    lines = [
+        f"Batch: {len(done)} videos done, {failed} failed; {frames} frames in "
+        f"{wall_seconds:.1f} s wall, {busy:.1f} s of job time"
+    ]
+    by_time = sorted(records.items(), key=lambda item: -item[1].get('seconds', 0))
+    for video, record in by_time:
+        if record.get('status') == 'done':
+            lines.append(
+                f"  {record['seconds']:8.1f} s {record['frames']:6d} frames "
+                f"{record['width']}x{record['height']} "
+                f"est {record['estimated_mb']:.0f} MB, "
+                f"peak {_megabytes(record['peak_rss_mb'])}  {os.path.basename(video)}"
+            )
+        else:
+            lines.append(f"  failed: {os.path.basename(video)}: {record.get('error')}")
+    return "\n".join(lines)
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Run the streaming afterimage video pipeline over many videos on a "
+        "process pool."
+    )
+    parser.add_argument(
+        "videos", nargs="*", help="Videos, folders or glob patterns (quote them)"
+    )
+    parser.add_argument(
+        "--manifest", default=None, help="Text file with one video path per line"
+    )
+    parser.add_argument(
+        "--output_root",
+        default=ModelConfig.DEFAULT_VIDEO_DIR,
+        help="Folder for one output folder per video, the state file and the summary",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Worker processes (default: CPU count)",
+    )
+    parser.add_argument(
+        "--memory_mb",
+        type=float,
+        default=None,
+        help="Memory budget of the jobs (default: "
+        "ModelConfig.SCHEDULER_MEMORY_FRACTION of the available memory)",
+    )
+    parser.add_argument(
+        "--fps",
+        type=float,
+        default=None,
+        help="Target frame rate (default: each video's own)",
+    )
+    parser.add_argument(
+        "--alpha", type=float, default=0.7, help="Blending factor for the blended video"
+    )
+    parser.add_argument(
+        "--renditions",
+        nargs="+",
+        default=list(PIPELINE_RENDITIONS),
+        choices=list(RENDITIONS),
+        help="Videos to generate per input",
+    )
+    parser.add_argument(
+        "--state",
+        default=None,
+        help="State file (default: <output_root>/batch_state.json)",
+    )
+    parser.add_argument(
+        "--dry_run",
+        action="store_true",
+        help="Only print the estimates and the start order",
+    )
+    args = parser.parse_args()
+    videos = collect_videos(args.videos, args.manifest)
+    if not videos:
+        parser.error("No videos given (positional paths or globs, or --manifest)")
+    process_video_batch(
+        videos,
+        args.output_root,
+        args.workers,
+        args.memory_mb,
+        args.fps,
+        args.alpha,
+        args.renditions,
+        args.state,
+        args.dry_run,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,29 +1,219 @@
+import math
 import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 
 import cv2
 
+from model.utils.frame_store import FrameStoreWriter, is_frame_store
 
-def extract_frames(video_path, output_dir, fps_target=None):
-    os.makedirs(output_dir, exist_ok=True)
-    cap = cv2.VideoCapture(video_path)
-    frame_rate = cap.get(cv2.CAP_PROP_FPS)
+SELECTIONS = ('interval', 'nearest')
+
+
+def _frame_selection(
+    video_fps: float, fps_target: float = None, selection: str = 'interval'
+):
+    """
+    Return target(k): the source frame index of output frame k.
+
+    'interval' keeps every round(video_fps / fps_target)-th frame, the rule
+    extract_frames always used. 'nearest' keeps, for each output timestamp
+    k / fps_target, the source frame closest in time, which also handles non-integer
+    rate ratios (e.g. 25 -> 10 fps).
+    """
+    if selection not in SELECTIONS:
+        raise ValueError(
+            f"Unknown frame selection '{selection}', expected one of {SELECTIONS}"
+        )
     if fps_target is None:
-        fps_target = frame_rate
-    frame_interval = int(round(frame_rate / fps_target))
-    count = 0
+        fps_target = video_fps
+    if selection == 'interval':
+        frame_interval = max(1, int(round(video_fps / fps_target)))
+        return lambda k: k * frame_interval
+    ratio = video_fps / fps_target
+    return lambda k: math.floor(k * ratio + 0.5)
+
+
+def _first_output(target, start: int) -> int:
+    """
+    Smallest output index whose source frame is at or after `start`.
+    """
+    low, high = 0, 1
+    while target(high) < start:
+        low, high = high, high * 2
+    while low < high:
+        middle = (low + high) // 2
+        if target(middle) < start:
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+
+def iter_frames(video_path: str, fps_target: float = None, selection: str = 'interval',
+                start_frame: int = 0, stop_frame: int = None):
+    """
+    Yield (output_index, frame) for the selected BGR frames of a video.
+
+    Skipped frames are only grabbed, never retrieved, so they skip the colour conversion
+    and copy of cap.read(). A start_frame > 0 seeks there first. Frames are selected by
+    their source index, so a range yields exactly the frames a full pass would for that
+    range.
+
+    Parameters:
+        video_path (str): Input video.
+        fps_target (float, optional): Target frame rate (default: the video's native
+          rate).
+        selection (str): 'interval' (the classic every-Nth-frame rule) or 'nearest'
+          (nearest timestamp).
+        start_frame, stop_frame (int, optional): Source frame range to decode
+          ([start_frame, stop_frame)).
+    """
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise IOError(f"Cannot open video {video_path}")
+    try:
+        target = _frame_selection(cap.get(cv2.CAP_PROP_FPS), fps_target, selection)
+        k = _first_output(target, start_frame)
+        if start_frame > 0:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+        index = start_frame
+        while True:
+            wanted = target(k)
+            if stop_frame is not None and wanted >= stop_frame:
+                break
+            while index < wanted:
+                if not cap.grab():
+                    return
+                index += 1
+            ret, frame = cap.read()
+            if not ret:
+                return
+            # When upsampling, one source frame can stand for several output frames.
+            while target(k) == index:
+                yield k, frame
+                k += 1
+            index += 1
+    finally:
+        cap.release()
+
+
+def _extract_range(
+    video_path, output_dir, fps_target, selection, start_frame, stop_frame
+):
     saved = 0
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-        if count % frame_interval == 0:
-            filename = os.path.join(output_dir, f"frame_{saved:04d}.jpg")
-            cv2.imwrite(filename, frame)
-            print(f"Extracted frame {saved}: {filename}")
-            saved += 1
-        count += 1
+    for k, frame in iter_frames(
+        video_path, fps_target, selection, start_frame, stop_frame
+    ):
+        filename = os.path.join(output_dir, f"frame_{k:04d}.jpg")
+        cv2.imwrite(filename, frame)
+        print(f"Extracted frame {k}: {filename}")
+        saved += 1
+    return saved
+
+
+def _extract_store(video_path, store_path, fps_target, selection):
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise IOError(f"Cannot open video {video_path}")
+    video_fps = cap.get(cv2.CAP_PROP_FPS)
     cap.release()
+    target = _frame_selection(video_fps, fps_target, selection)
+    # The output rate: 'interval' keeps every Nth frame, 'nearest' hits fps_target.
+    if selection == 'interval':
+        fps = video_fps / target(1)
+    else:
+        fps = fps_target or video_fps
+    with FrameStoreWriter(store_path, fps=fps) as writer:
+        for k, frame in iter_frames(video_path, fps_target, selection):
+            # Timestamped with the source frame's time in the video.
+            writer.write(frame, f"frame_{k:04d}.jpg", target(k) / video_fps)
+        saved = writer.count
+    print(f"Extracted {saved} frames into the frame store {store_path}")
+    return saved
+
+
+def extract_frames(
+    video_path, output_dir, fps_target=None, selection='interval', workers=1
+):
+    """
+    Extract frames from a video file and save them as JPEG images (frame_0000.jpg, ...),
+    or, if output_dir ends in .frames, into a frame store (see model.utils.frame_store)
+    with the frames' timestamps in the video.
+
+    Parameters:
+      video_path (str): Path to the input video file.
+      output_dir (str): Directory to save extracted frames.
+      fps_target (float, optional): Target FPS for extraction (if None, use the video's
+        native FPS).
+      selection (str): 'interval' (default, every round(native / target)-th frame) or
+        'nearest'.
+      workers (int): Split the video into this many time ranges decoded by separate
+        processes. Ranges rely on frame-accurate seeking (OpenCV's FFmpeg backend); the
+        frames are the same. Frame stores are written in order, by one process.
+
+    Returns:
+      int: Number of frames saved.
+    """
+    if is_frame_store(output_dir):
+        if workers > 1:
+            raise ValueError(
+                "Frames are extracted into a frame store by a single worker"
+            )
+        return _extract_store(video_path, output_dir, fps_target, selection)
+    os.makedirs(output_dir, exist_ok=True)
+    ranges = [(0, None)]
+    if workers > 1:
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            raise IOError(f"Cannot open video {video_path}")
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        cap.release()
+        bounds = [frame_count * w // workers for w in range(workers)]
+        # The header's frame count can be approximate; the last range runs to the end.
+        ranges = list(zip(bounds, bounds[1:] + [None]))
+
+    if len(ranges) == 1:
+        saved = _extract_range(
+            video_path, output_dir, fps_target, selection, *ranges[0]
+        )
+    else:
+        with ProcessPoolExecutor(max_workers=len(ranges)) as pool:
+            extract = partial(
+                _extract_range, video_path, output_dir, fps_target, selection
+            )
+            futures = [pool.submit(extract, start, stop) for start, stop in ranges]
+            saved = sum(future.result() for future in futures)
+    print(f"Extraction complete. {saved} frames saved in '{output_dir}'.")
+    return saved
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Extract frames from a video as JPEG images."
+    )
+    parser.add_argument("video_path", help="Input video")
+    parser.add_argument(
+        "output_dir", help="Folder for the extracted frames, or a frame store (.frames)"
+    )
+    parser.add_argument(
+        "--fps", type=float, default=None, help="Target frame rate (default: native)"
+    )
+    parser.add_argument(
+        "--selection",
+        choices=SELECTIONS,
+        default='interval',
+        help="'interval': every Nth frame (default); 'nearest': nearest timestamp",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=1, help="Processes decoding separate time ranges"
+    )
+    args = parser.parse_args()
+    extract_frames(
+        args.video_path, args.output_dir, args.fps, args.selection, args.workers
+    )
 
 
-# Example usage:
-extract_frames("input_video.mp4", "data/real_frames/input", fps_target=15)
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,11 @@
-import os
-
 import cv2
-import numpy as np
 
 from model.model_config import ModelConfig
-from model.utils.file_utils import list_images
+from model.utils.frame_store import open_frames
+from model.utils.staged_pipeline import format_stage_report, run_staged
+from model.video.video_outputs import FRAME_RENDITIONS, VideoOutputs
+
+COMBINED_RENDITIONS = ('combined', 'original', 'afterimage', 'blended')
 
 
 def generate_combined_and_separate_videos(top_folder: str = None,
@@ -12,9 +13,11 @@ def generate_combined_and_separate_videos(top_folder: str = None,
                                           output_folder: str = None,
                                           fps: int = None,
                                           alpha: float = 0.5,
-                                          target_resolution: tuple = None):
+                                          target_resolution: tuple = None,
+                                          io_threads: int = 0,
+                                          renditions=COMBINED_RENDITIONS):
     """
-    Generate four videos from two sets of frames:
+    Generate the requested videos (by default all four) from two sets of frames:
       1. Combined video: three vertically stacked frames (original on top, afterimage in middle, and blended on bottom)
       2. Original video: original frames only.
       3. Afterimage video: afterimage frames only.
@@ -23,12 +26,17 @@ def generate_combined_and_separate_videos(top_folder: str = None,
     If any folder parameter is omitted, the defaults from ModelConfig are used.
 
     Parameters:
-      top_folder (str): Directory with original frames.
-      bottom_folder (str): Directory with afterimage frames.
+      top_folder (str): Directory or frame store (.frames) with original frames.
+      bottom_folder (str): Directory or frame store (.frames) with afterimage frames.
       output_folder (str): Directory where videos will be saved.
       fps (int): Frames per second (default from ModelConfig.FPS).
       alpha (float): Blending factor (0 < alpha <= 1) for the blended video.
       target_resolution (tuple): (width, height) to resize frames for the videos.
+      io_threads (int): Reader threads decoding frames ahead of the compositing; a
+        per-stage occupancy report is printed (0: serial).
+      renditions (tuple): Videos to build, names from video_outputs.FRAME_RENDITIONS
+        (there is no persistent overlay here). Each is encoded on its own thread and
+        only the composites they need are computed.
     """
     if top_folder is None:
         top_folder = ModelConfig.DEFAULT_INPUT_DIR
@@ -39,76 +47,51 @@ def generate_combined_and_separate_videos(top_folder: str = None,
     if fps is None:
         fps = ModelConfig.FPS
 
-    os.makedirs(output_folder, exist_ok=True)
+    outputs = VideoOutputs(output_folder, renditions, fps=fps, alpha=alpha)
 
-    # Build video file paths.
-    combined_path = os.path.join(output_folder, "combined_video.mp4")
-    original_path = os.path.join(output_folder, "original_video.mp4")
-    afterimage_path = os.path.join(output_folder, "afterimage_video.mp4")
-    blended_path = os.path.join(output_folder, "blended_video.mp4")
-
-    top_frames = list_images(top_folder)
-    bottom_frames = list_images(bottom_folder)
-    if not top_frames or not bottom_frames:
+    top_frames = open_frames(top_folder)
+    bottom_frames = open_frames(bottom_folder)
+    if not len(top_frames) or not len(bottom_frames):
         print("No frames found in one or both folders.")
         return
 
     frame_count = min(len(top_frames), len(bottom_frames))
-    first_frame = cv2.imread(os.path.join(top_folder, top_frames[0]))
-    if first_frame is None:
-        print("Failed to read the first frame from the top folder.")
-        return
 
-    # Determine frame dimensions.
-    if target_resolution is not None:
-        width, height = target_resolution
-    else:
-        height, width, _ = first_frame.shape
-
-    # Combined video: three frames stacked vertically.
-    combined_height = height * 3
-
-    # Use a modern codec (H.264 via 'avc1')
-    fourcc = cv2.VideoWriter_fourcc(*'avc1')
-    combined_video = cv2.VideoWriter(combined_path, fourcc, fps, (width, combined_height))
-    original_video = cv2.VideoWriter(original_path, fourcc, fps, (width, height))
-    afterimage_video = cv2.VideoWriter(afterimage_path, fourcc, fps, (width, height))
-    blended_video = cv2.VideoWriter(blended_path, fourcc, fps, (width, height))
-
-    for i in range(frame_count):
-        top_img_path = os.path.join(top_folder, top_frames[i])
-        bottom_img_path = os.path.join(bottom_folder, bottom_frames[i])
-        top_frame = cv2.imread(top_img_path)
-        bottom_frame = cv2.imread(bottom_img_path)
-        if top_frame is None or bottom_frame is None:
+    def read(i):
+        # Frames from a store are views of its memory maps, without decoding.
+        try:
+            top_frame = top_frames.frame(top_frames.names[i], 'BGR')
+            bottom_frame = None
+            if outputs.needs_afterimage:
+                bottom_frame = bottom_frames.frame(bottom_frames.names[i], 'BGR')
+        except FileNotFoundError:
             print(f"Skipping frame {i} due to read error.")
-            continue
+            return None
 
         # Resize frames if target resolution is set.
         if target_resolution is not None:
-            top_frame = cv2.resize(top_frame, (width, height))
-            bottom_frame = cv2.resize(bottom_frame, (width, height))
-
-        # Create blended frame.
-        blended_frame = cv2.addWeighted(top_frame, alpha, bottom_frame, 1 - alpha, 0)
-        # Create combined frame by stacking original, afterimage, and blended frames.
-        combined_frame = np.vstack((top_frame, bottom_frame, blended_frame))
-
-        combined_video.write(combined_frame)
-        original_video.write(top_frame)
-        afterimage_video.write(bottom_frame)
-        blended_video.write(blended_frame)
-
-    combined_video.release()
-    original_video.release()
-    afterimage_video.release()
-    blended_video.release()
+            top_frame = cv2.resize(top_frame, target_resolution)
+            if bottom_frame is not None:
+                bottom_frame = cv2.resize(bottom_frame, target_resolution)
+        return top_frame, bottom_frame
+
+    def compose(i, frames):
+        # The output stage builds the blended and combined frames, each video on its own
+        # encoder thread.
+        if frames is not None:
+            outputs.write(*frames)
+
+    try:
+        stats = run_staged(range(frame_count), read, compose, lambda i, result: None,
+                           readers=io_threads, writers=1 if io_threads else 0)
+    finally:
+        outputs.close()
+    if io_threads:
+        print(format_stage_report(stats))
 
     print("Videos saved to:")
-    print("  Combined video:", combined_path)
-    print("  Original video:", original_path)
-    print("  Afterimage video:", afterimage_path)
-    print("  Blended video:", blended_path)
+    for name, path in outputs.paths.items():
+        print(f"  {name.replace('_', ' ').capitalize()} video:", path)
 
 
 def main():
@@ -126,14 +109,35 @@ def main():
                         help="Blending factor for the blended video (default: 0.5)")
     parser.add_argument("--width", type=int, default=None, help="Target frame width (optional)")
     parser.add_argument("--height", type=int, default=None, help="Target frame height (optional)")
+    parser.add_argument(
+        "--io_threads",
+        type=int,
+        default=0,
+        help="Frame reader threads (default: 0, serial)",
+    )
+    parser.add_argument(
+        "--renditions",
+        nargs="+",
+        default=list(COMBINED_RENDITIONS),
+        choices=FRAME_RENDITIONS,
+        help="Videos to generate (default: combined original afterimage blended)",
+    )
     args = parser.parse_args()
 
     target_resolution = None
     if args.width is not None and args.height is not None:
         target_resolution = (args.width, args.height)
 
-    generate_combined_and_separate_videos(args.top_folder, args.bottom_folder, args.output_folder, args.fps, args.alpha,
-                                          target_resolution)
+    generate_combined_and_separate_videos(
+        args.top_folder,
+        args.bottom_folder,
+        args.output_folder,
+        args.fps,
+        args.alpha,
+        target_resolution,
+        args.io_threads,
+        args.renditions,
+    )
 
 
 if __name__ == "__main__":
@@ -1,51 +1,46 @@
+import math
 import os
 
 import cv2
 
-from model.processing.afterimage_batch import process_frame_sequence  # Reuse your batch processing module
+from model.core.anatomical import gaze_density_map
+from model.model_config import ModelConfig
+# Reuse your batch module
+from model.processing.afterimage_batch import AfterimageState, process_frame_sequence
+from model.utils.file_utils import to_uint8
+from model.utils.frame_store import open_frames
+from model.utils.gaze_track import GazeTrack
+from model.utils.stage_cache import StageCache, file_digest
+from model.video.extract_video import extract_frames, iter_frames
+from model.video.video_outputs import RENDITIONS, VideoOutputs
 
 
 # --- Step 1: Extract Frames from Video ---
-def extract_frames(video_path, output_dir, fps_target=None):
-    """
-    Extract frames from a video file and save them as JPEG images.
-    """
-    os.makedirs(output_dir, exist_ok=True)
-    cap = cv2.VideoCapture(video_path)
-    if not cap.isOpened():
-        raise IOError(f"Cannot open video {video_path}")
-    video_fps = cap.get(cv2.CAP_PROP_FPS)
-    if fps_target is None:
-        fps_target = video_fps
-    frame_interval = int(round(video_fps / fps_target))
-    count, saved = 0, 0
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-        if count % frame_interval == 0:
-            filename = os.path.join(output_dir, f"frame_{saved:04d}.jpg")
-            cv2.imwrite(filename, frame)
-            print(f"Extracted frame {saved}: {filename}")
-            saved += 1
-        count += 1
-    cap.release()
-    print(f"Extraction complete. {saved} frames saved in '{output_dir}'.")
+# extract_frames is shared with model.video.extract_video (imported above).
 
 
 # --- Step 2: Generate Afterimage and Persistent Overlay Frames Using Your Batch Module ---
 # This call will read frames from the extracted frames folder and write:
 #   - Afterimage frames to afterimage_dir, and
 #   - Persistent overlay frames into afterimage_dir/persistent_overlay
-def generate_afterimage_and_overlay_frames(input_dir, afterimage_dir):
-    process_frame_sequence(input_dir, afterimage_dir)
+def generate_afterimage_and_overlay_frames(input_dir, afterimage_dir, cache=None):
+    process_frame_sequence(input_dir, afterimage_dir, cache=cache)
 
 
 # --- Step 3: Generate Videos from Frames ---
+PIPELINE_RENDITIONS = ('original', 'afterimage', 'blended', 'persistent_overlay')
+
+
+def _print_videos(outputs):
+    print("Videos generated successfully:")
+    for name, path in outputs.paths.items():
+        print(f"  {name.replace('_', ' ').title()} Video:", path)
+
+
 def generate_videos(original_dir, afterimage_dir, persistent_overlay_dir, output_dir, fps=30, alpha=0.7,
-                    target_resolution=None):
+                    target_resolution=None, renditions=PIPELINE_RENDITIONS):
     """
-    Generate four videos:
+    Generate the requested videos (by default all four):
       1. Original Video: frames from original_dir.
       2. Afterimage Video: frames from afterimage_dir.
       3. Blended Video: each frame is blended (alpha) from original and afterimage.
@@ -55,99 +50,328 @@ def generate_videos(original_dir, afterimage_dir, persistent_overlay_dir, output
       original_dir (str): Directory containing original frames.
       afterimage_dir (str): Directory containing afterimage frames.
       persistent_overlay_dir (str): Directory with persistent overlay frames.
+        Each of the three may also be a frame store (.frames), read without decoding.
       output_dir (str): Directory to save the videos.
       fps (int): Frames per second.
       alpha (float): Blending factor for creating a blended frame (only used here for the blended video).
       target_resolution (tuple, optional): (width, height) to which frames are resized.
+      renditions (tuple): Videos to build, names from video_outputs.RENDITIONS. Only
+        the frame directories and composites these need are read and computed.
     """
-    os.makedirs(output_dir, exist_ok=True)
+    outputs = VideoOutputs(
+        output_dir,
+        renditions,
+        fps=fps,
+        alpha=alpha,
+        target_resolution=target_resolution,
+    )
+
+    def open_jpgs(folder):
+        return open_frames(folder, extensions=('.jpg',))
 
-    original_frames = sorted([f for f in os.listdir(original_dir) if f.lower().endswith('.jpg')])
-    afterimage_frames = sorted([f for f in os.listdir(afterimage_dir) if f.lower().endswith('.jpg')])
-    overlay_frames = sorted([f for f in os.listdir(persistent_overlay_dir) if f.lower().endswith('.jpg')])
+    def read(frames, i):
+        return frames.frame(frames.names[i], 'BGR') if frames is not None else None
 
-    if not original_frames or not afterimage_frames or not overlay_frames:
+    original_frames = open_jpgs(original_dir)
+    afterimage_frames = open_jpgs(afterimage_dir) if outputs.needs_afterimage else None
+    overlay_frames = (
+        open_jpgs(persistent_overlay_dir) if outputs.needs_overlay else None
+    )
+    listings = [
+        frames
+        for frames in (original_frames, afterimage_frames, overlay_frames)
+        if frames is not None
+    ]
+
+    if not all(len(frames) for frames in listings):
         print("No frames found in one or more directories.")
         return
-    frame_count = min(len(original_frames), len(afterimage_frames), len(overlay_frames))
+    frame_count = min(len(frames) for frames in listings)
 
-    first_frame = cv2.imread(os.path.join(original_dir, original_frames[0]))
-    if first_frame is None:
-        print("Failed to read the first frame.")
-        return
-    if target_resolution:
-        width, height = target_resolution
+    try:
+        for i in range(frame_count):
+            try:
+                orig_frame = read(original_frames, i)
+                af_frame = read(afterimage_frames, i)
+                ol_frame = read(overlay_frames, i)
+            except FileNotFoundError:
+                print(f"Skipping frame {i + 1} due to read error.")
+                continue
+
+            outputs.write(orig_frame, af_frame, ol_frame)
+            print(f"Processed frame {i + 1}/{frame_count}")
+    finally:
+        outputs.close()
+
+    _print_videos(outputs)
+
+
+# --- Streaming Pipeline: VideoCapture -> kinetics -> VideoWriter, no frame folders ---
+def iter_video_frames(video_path, fps_target=None, selection='interval'):
+    """
+    Yield BGR frames of a video, keeping the same frames extract_frames would save.
+    """
+    for _, frame in iter_frames(video_path, fps_target, selection):
+        yield frame
+
+
+def iter_afterimage_frames(
+    frames,
+    frames_dir=None,
+    afterimage_dir=None,
+    overlay=True,
+    cache=None,
+    source=None,
+    gaze_track=None,
+    fovea_radius=None,
+):
+    """
+    Run the afterimage model over a stream of BGR frames.
+
+    Yields (original, afterimage, persistent_overlay) as BGR uint8 frames; the overlay
+    is None when overlay=False. If frames_dir or afterimage_dir are given, the frames
+    are also dumped there with the directory layout of extract_frames and
+    process_frame_sequence.
+
+    With a StageCache, the opsin state after each frame is cached; `source` must then
+    identify the frame stream (e.g. the video's content hash and the frame selection).
+
+    With a GazeTrack the kinetics see each frame modulated by the cone density map
+    centred on that frame's gaze (radius `fovea_radius`, default
+    ModelConfig.FOVEA_RADIUS). The maps are views of one cached canvas (see
+    gaze_density_map), so following the gaze costs no per-frame allocations.
+    """
+    if cache is not None and source is None:
+        raise ValueError("A stage cache needs the source of the frames")
+    if fovea_radius is None:
+        fovea_radius = ModelConfig.FOVEA_RADIUS
+    overlay_dir = None
+    for folder in (frames_dir, afterimage_dir):
+        if folder is not None:
+            os.makedirs(folder, exist_ok=True)
+    if afterimage_dir is not None:
+        overlay = True
+        overlay_dir = os.path.join(afterimage_dir, "persistent_overlay")
+        os.makedirs(overlay_dir, exist_ok=True)
+
+    state = AfterimageState(layout='BGR')
+    for i, frame in enumerate(frames):
+        density, frame_source = None, f"{source}#{i}"
+        if gaze_track is not None:
+            gaze = gaze_track.at(i)
+            density = gaze_density_map(frame.shape, gaze, fovea_radius)
+            frame_source = f"{frame_source}@gaze{gaze}r{fovea_radius}"
+        afterimage, persistent_overlay = state.step(
+            frame, overlay=overlay, cache=cache, source=frame_source, density=density
+        )
+        afterimage = to_uint8(afterimage)
+
+        fname = f"frame_{i:04d}.jpg"
+        if frames_dir is not None:
+            cv2.imwrite(os.path.join(frames_dir, fname), frame)
+        if afterimage_dir is not None:
+            cv2.imwrite(os.path.join(afterimage_dir, fname), afterimage)
+            cv2.imwrite(os.path.join(overlay_dir, fname), persistent_overlay)
+        yield frame, afterimage, persistent_overlay
+
+
+def stream_video_pipeline(
+    video_path,
+    output_dir,
+    fps_target=None,
+    alpha=0.7,
+    target_resolution=None,
+    frames_dir=None,
+    afterimage_dir=None,
+    renditions=PIPELINE_RENDITIONS,
+    cache=None,
+    gaze_track=None,
+    fovea_radius=None,
+):
+    """
+    Decode, process and encode a video in one pass without intermediate JPEG files.
+
+    The stages are chained generators, so only one frame per stage is in memory at a
+    time, plus a few queued frames per encoder thread. Pass frames_dir / afterimage_dir
+    to also dump the frames to disk. When every source frame is kept at its own rate and
+    size, the original video is copied instead of re-encoded. With a StageCache the
+    opsin states are reused from earlier runs on the same video and frame rate (e.g.
+    when only alpha changed). A GazeTrack makes the kinetics gaze-contingent (see
+    iter_afterimage_frames).
+
+    Returns:
+        int: The number of frames written.
+    """
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise IOError(f"Cannot open video {video_path}")
+    video_fps = cap.get(cv2.CAP_PROP_FPS)
+    cap.release()
+    fps = fps_target if fps_target is not None else video_fps
+    # Only an exact pass-through keeps the copy in step with the re-encoded renditions:
+    # e.g. 20 fps from a 30 fps source keeps every frame but encodes them at 20 fps.
+    same_rate = fps_target is None or math.isclose(fps_target, video_fps)
+    unmodified = same_rate and target_resolution is None
+
+    outputs = VideoOutputs(
+        output_dir,
+        renditions,
+        fps=fps,
+        alpha=alpha,
+        target_resolution=target_resolution,
+        original_source=video_path if unmodified else None,
+    )
+    frames = iter_video_frames(video_path, fps_target)
+    if (
+        outputs.needs_afterimage
+        or outputs.needs_overlay
+        or frames_dir
+        or afterimage_dir
+    ):
+        source = (
+            f"{file_digest(video_path)}@{fps_target}" if cache is not None else None
+        )
+        processed = iter_afterimage_frames(
+            frames,
+            frames_dir,
+            afterimage_dir,
+            overlay=outputs.needs_overlay,
+            cache=cache,
+            source=source,
+            gaze_track=gaze_track,
+            fovea_radius=fovea_radius,
+        )
+    elif outputs.encoded:
+        processed = ((frame, None, None) for frame in frames)
     else:
-        height, width, _ = first_frame.shape
-
-    # Set video output paths.
-    original_video_path = os.path.join(output_dir, "original_video.mp4")
-    afterimage_video_path = os.path.join(output_dir, "afterimage_video.mp4")
-    blended_video_path = os.path.join(output_dir, "blended_video.mp4")
-    overlay_video_path = os.path.join(output_dir, "persistent_overlay_video.mp4")
-
-    fourcc = cv2.VideoWriter_fourcc(*'avc1')
-    original_video = cv2.VideoWriter(original_video_path, fourcc, fps, (width, height))
-    afterimage_video = cv2.VideoWriter(afterimage_video_path, fourcc, fps, (width, height))
-    blended_video = cv2.VideoWriter(blended_video_path, fourcc, fps, (width, height))
-    overlay_video = cv2.VideoWriter(overlay_video_path, fourcc, fps, (width, height))
-
-    for i in range(frame_count):
-        orig_path = os.path.join(original_dir, original_frames[i])
-        af_path = os.path.join(afterimage_dir, afterimage_frames[i])
-        ol_path = os.path.join(persistent_overlay_dir, overlay_frames[i])
-
-        orig_frame = cv2.imread(orig_path)
-        af_frame = cv2.imread(af_path)
-        ol_frame = cv2.imread(ol_path)
-        if orig_frame is None or af_frame is None or ol_frame is None:
-            print(f"Skipping frame {i + 1} due to read error.")
-            continue
-
-        if target_resolution:
-            orig_frame = cv2.resize(orig_frame, (width, height))
-            af_frame = cv2.resize(af_frame, (width, height))
-            ol_frame = cv2.resize(ol_frame, (width, height))
-
-        # Blended frame: blend original and afterimage using alpha weight.
-        blended = cv2.addWeighted(orig_frame, alpha, af_frame, 1 - alpha, 0)
-
-        original_video.write(orig_frame)
-        afterimage_video.write(af_frame)
-        blended_video.write(blended)
-        overlay_video.write(ol_frame)
-
-        print(f"Processed frame {i + 1}/{frame_count}")
-
-    original_video.release()
-    afterimage_video.release()
-    blended_video.release()
-    overlay_video.release()
+        processed = ()
+    try:
+        for frame, afterimage, persistent_overlay in processed:
+            outputs.write(frame, afterimage, persistent_overlay)
+            print(f"Streamed frame {outputs.frame_count}")
+    finally:
+        outputs.close()
 
-    print("Videos generated successfully:")
-    print("  Original Video:", original_video_path)
-    print("  Afterimage Video:", afterimage_video_path)
-    print("  Blended Video:", blended_video_path)
-    print("  Persistent Overlay Video:", overlay_video_path)
+    _print_videos(outputs)
+    if cache is not None:
+        print(cache.report())
+    return outputs.frame_count
 
 
 # --- Main Pipeline ---
-if __name__ == "__main__":
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Extract frames from a video, generate afterimages and compile "
+        "videos."
+    )
     # Define paths (update if needed)
-    video_path = "data/afterimage/2_video/IMG_1124.mov"
-    frames_dir = "data/afterimage/2_video/extracted_frames"
-    afterimage_dir = "data/afterimage/2_video/afterimage_frames"
-    # The persistent overlay frames are expected to be saved in a subfolder of afterimage_dir:
-    persistent_overlay_dir = os.path.join(afterimage_dir, "persistent_overlay")
-    videos_dir = "data/afterimage/2_video/output"
+    parser.add_argument(
+        "--video_path",
+        default="data/afterimage/2_video/IMG_1124.mov",
+        help="Input video",
+    )
+    parser.add_argument(
+        "--frames_dir",
+        default="data/afterimage/2_video/extracted_frames",
+        help="Folder for the extracted frames",
+    )
+    parser.add_argument(
+        "--afterimage_dir",
+        default="data/afterimage/2_video/afterimage_frames",
+        help="Folder for the afterimage frames "
+        "(persistent overlay frames go in a subfolder)",
+    )
+    parser.add_argument(
+        "--videos_dir",
+        default="data/afterimage/2_video/output",
+        help="Folder for the videos",
+    )
+    parser.add_argument(
+        "--fps", type=float, default=15, help="Target frame rate (default: 15)"
+    )
+    parser.add_argument(
+        "--alpha", type=float, default=0.7, help="Blending factor for the blended video"
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Process the video in memory without intermediate frame directories",
+    )
+    parser.add_argument(
+        "--dump_frames",
+        action="store_true",
+        help="With --stream, also write the frame directories",
+    )
+    parser.add_argument(
+        "--renditions",
+        nargs="+",
+        default=list(PIPELINE_RENDITIONS),
+        choices=list(RENDITIONS),
+        help="Videos to generate "
+        "(default: original afterimage blended persistent_overlay)",
+    )
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        help="Reuse opsin states (and decoded frames) from ModelConfig.STAGE_CACHE_DIR",
+    )
+    parser.add_argument(
+        "--gaze_track",
+        default=None,
+        help="With --stream, CSV of frame,x,y gaze samples for gaze-contingent "
+        "cone density",
+    )
+    parser.add_argument(
+        "--fovea_radius",
+        type=float,
+        default=None,
+        help="Fovea radius in pixels for --gaze_track "
+        "(default: ModelConfig.FOVEA_RADIUS)",
+    )
+    args = parser.parse_args()
+    if args.gaze_track and not args.stream:
+        parser.error("--gaze_track requires --stream")
+    cache = StageCache() if args.cache else None
+
+    if args.stream:
+        print("Streaming video through the afterimage model...")
+        stream_video_pipeline(
+            args.video_path,
+            args.videos_dir,
+            fps_target=args.fps,
+            alpha=args.alpha,
+            frames_dir=args.frames_dir if args.dump_frames else None,
+            afterimage_dir=args.afterimage_dir if args.dump_frames else None,
+            renditions=args.renditions,
+            cache=cache,
+            gaze_track=GazeTrack.load(args.gaze_track) if args.gaze_track else None,
+            fovea_radius=args.fovea_radius,
+        )
+        print("Video processing pipeline completed!")
+        return
 
-    fps_target = 15
-    blend_alpha = 0.7
+    # The persistent overlay frames are expected in a subfolder of afterimage_dir:
+    persistent_overlay_dir = os.path.join(args.afterimage_dir, "persistent_overlay")
 
     print("Extracting frames from video...")
-    extract_frames(video_path, frames_dir, fps_target)
+    extract_frames(args.video_path, args.frames_dir, args.fps)
     print("Generating afterimage and persistent overlay frames using batch processing...")
-    generate_afterimage_and_overlay_frames(frames_dir, afterimage_dir)
+    generate_afterimage_and_overlay_frames(
+        args.frames_dir, args.afterimage_dir, cache=cache
+    )
     print("Generating videos...")
-    generate_videos(frames_dir, afterimage_dir, persistent_overlay_dir, videos_dir, fps=fps_target, alpha=blend_alpha)
+    generate_videos(
+        args.frames_dir,
+        args.afterimage_dir,
+        persistent_overlay_dir,
+        args.videos_dir,
+        fps=args.fps,
+        alpha=args.alpha,
+        renditions=args.renditions,
+    )
     print("Video processing pipeline completed!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+import os
+import queue
+import shutil
+import subprocess
+import threading
+
+import cv2
+import numpy as np
+
+# Rendition name -> (file name, (width, height) multiples of the frame size).
+RENDITIONS = {
+    'original': ("original_video.mp4", (1, 1)),
+    'afterimage': ("afterimage_video.mp4", (1, 1)),
+    'blended': ("blended_video.mp4", (1, 1)),
+    'side_by_side': ("side_by_side_video.mp4", (2, 1)),
+    'combined': ("combined_video.mp4", (1, 3)),
+    'persistent_overlay': ("persistent_overlay_video.mp4", (1, 1)),
+}
+
+# Renditions that need the blended composite, and those that need the afterimage at all.
+BLENDED_RENDITIONS = {'blended', 'side_by_side', 'combined'}
+AFTERIMAGE_RENDITIONS = BLENDED_RENDITIONS | {'afterimage'}
+
+# Renditions that can be built without the persistent overlay.
+FRAME_RENDITIONS = [name for name in RENDITIONS if name != 'persistent_overlay']
+
+# Queue item that stops an encoder thread (frames themselves are never None).
+_STOP = object()
+
+
+def passthrough_video(source_path: str, output_path: str) -> bool:
+    """
+    Copy a video stream into output_path without decoding and re-encoding it.
+
+    Same-container files are copied as-is; otherwise the stream is remuxed with ffmpeg
+    if it is installed. Returns False when neither is possible.
+    """
+    source_ext = os.path.splitext(source_path)[1].lower()
+    if source_ext == os.path.splitext(output_path)[1].lower():
+        shutil.copyfile(source_path, output_path)
+        return True
+    if shutil.which("ffmpeg") is None:
+        return False
+    command = ["ffmpeg", "-y", "-loglevel", "error", "-i", source_path]
+    result = subprocess.run(command + ["-map", "0:v", "-c", "copy", output_path])
+    return result.returncode == 0
+
+
+class _EncoderThread:
+    """
+    A cv2.VideoWriter fed through a bounded queue on its own thread.
+    OpenCV releases the GIL while encoding, so several encoders run in parallel.
+    """
+
+    def __init__(
+        self, path: str, fourcc: int, fps: float, size: tuple, queue_size: int = 4
+    ):
+        self.writer = cv2.VideoWriter(path, fourcc, fps, size)
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.error = None
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            frame = self.queue.get()
+            if frame is _STOP:
+                break
+            try:
+                self.writer.write(frame)
+            except Exception as exc:
+                self.error = exc
+
+    def write(self, frame: np.ndarray):
+        self.queue.put(frame)
+
+    def close(self) -> Exception:
+        """
+        Flush and release the writer; returns the error raised while encoding, if any.
+        """
+        self.queue.put(_STOP)
+        self.thread.join()
+        self.writer.release()
+        return self.error
+
+
+class VideoOutputs:
+    """
+    Single-pass output stage that encodes only the requested renditions.
+
+    Composites are computed once per frame and only when a requested rendition needs
+    them (e.g. the blend only for 'blended', 'side_by_side' and 'combined'). Each
+    rendition is encoded on its own thread. If `original_source` is given, the
+    'original' rendition is copied from that file instead of being re-encoded when
+    possible; pass it only when the frames written are the unmodified frames of that
+    file.
+
+    Parameters:
+        output_dir (str): Folder for the videos.
+        renditions (list): Names from RENDITIONS.
+        fps (float): Frames per second.
+        alpha (float): Weight of the original in the blended frame.
+        target_resolution (tuple, optional): (width, height) to resize frames to.
+        original_source (str, optional): Video that can stand in for the original.
+        fourcc (str): Codec for the encoded renditions (default H.264 via 'avc1').
+    """
+
+    def __init__(
+        self,
+        output_dir: str,
+        renditions,
+        fps: float = 30,
+        alpha: float = 0.5,
+        target_resolution: tuple = None,
+        original_source: str = None,
+        fourcc: str = 'avc1',
+    ):
+        unknown = set(renditions) - set(RENDITIONS)
+        if unknown:
+            raise ValueError(
+                f"Unknown renditions {sorted(unknown)}, "
+                f"expected some of {list(RENDITIONS)}"
+            )
+        os.makedirs(output_dir, exist_ok=True)
+        self.renditions = list(dict.fromkeys(renditions))
+        self.paths = {
+            name: os.path.join(output_dir, RENDITIONS[name][0])
+            for name in self.renditions
+        }
+        self.fps = fps
+        self.alpha = alpha
+        self.target_resolution = target_resolution
+        self.fourcc = fourcc
+        self.frame_count = 0
+        self._encoders = {}
+        # Renditions encoded frame by frame (all but a passed-through original).
+        self.encoded = list(self.renditions)
+        if 'original' in self.encoded and original_source is not None:
+            if passthrough_video(original_source, self.paths['original']):
+                self.encoded.remove('original')
+                print("  Original video copied without re-encoding.")
+
+    @property
+    def needs_afterimage(self) -> bool:
+        return bool(AFTERIMAGE_RENDITIONS & set(self.encoded))
+
+    @property
+    def needs_overlay(self) -> bool:
+        return 'persistent_overlay' in self.encoded
+
+    def _open(self, height: int, width: int):
+        fourcc = cv2.VideoWriter_fourcc(*self.fourcc)
+        for name in self.encoded:
+            scale_w, scale_h = RENDITIONS[name][1]
+            self._encoders[name] = _EncoderThread(self.paths[name], fourcc, self.fps,
+                                                  (width * scale_w, height * scale_h))
+
+    def write(
+        self,
+        original: np.ndarray,
+        afterimage: np.ndarray = None,
+        overlay: np.ndarray = None,
+    ):
+        """
+        Add one frame. Frames are BGR uint8; afterimage and overlay may be None when no
+        requested rendition needs them, otherwise a ValueError is raised before anything
+        is queued.
+        """
+        if not self.encoded:
+            self.frame_count += 1
+            return
+        missing = [
+            name
+            for name in self.encoded
+            if (name in AFTERIMAGE_RENDITIONS and afterimage is None)
+            or (name == 'persistent_overlay' and overlay is None)
+        ]
+        if missing:
+            raise ValueError(f"No input frame for renditions {missing}")
+        if self.target_resolution:
+            width, height = self.target_resolution
+            original = cv2.resize(original, (width, height))
+            if afterimage is not None:
+                afterimage = cv2.resize(afterimage, (width, height))
+            if overlay is not None:
+                overlay = cv2.resize(overlay, (width, height))
+        if not self._encoders:
+            self._open(*original.shape[:2])
+
+        frames = {
+            'original': original,
+            'afterimage': afterimage,
+            'persistent_overlay': overlay,
+        }
+        if BLENDED_RENDITIONS & set(self.encoded):
+            frames['blended'] = cv2.addWeighted(
+                original, self.alpha, afterimage, 1 - self.alpha, 0
+            )
+            if 'side_by_side' in self.encoded:
+                frames['side_by_side'] = np.hstack((original, frames['blended']))
+            if 'combined' in self.encoded:
+                frames['combined'] = np.vstack(
+                    (original, afterimage, frames['blended'])
+                )
+
+        for name, encoder in self._encoders.items():
+            encoder.write(frames[name])
+        self.frame_count += 1
+
+    def close(self):
+        errors = [encoder.close() for encoder in self._encoders.values()]
+        self._encoders = {}
+        for error in errors:
+            if error is not None:
+                raise error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,44 @@
+import cv2
+import numpy as np
+
+from model.model_config import ModelConfig
+from model.processing.afterimage_batch import AfterimageState, process_frame_sequence
+
+
+def _overshooting_euler(monkeypatch):
+    # k * dt > 1 for bright pixels, so fixed stepping iterates every step.
+    monkeypatch.setattr(ModelConfig, 'INTEGRATOR', 'euler')
+    monkeypatch.setattr(ModelConfig, 'TIME_STEP', 2.5)
+    monkeypatch.setattr(ModelConfig, 'ITERATIONS', 100)
+
+
+def test_adaptive_state_matches_fixed_stepping(monkeypatch):
+    _overshooting_euler(monkeypatch)
+    rng = np.random.default_rng(0)
+    fixed, adaptive = AfterimageState(), AfterimageState(adaptive=True)
+    for _ in range(3):
+        frame = rng.integers(0, 256, (16, 24, 3), dtype=np.uint8)
+        expected, _ = fixed.step(frame)
+        afterimage, _ = adaptive.step(frame)
+        assert adaptive.iterations < ModelConfig.ITERATIONS
+        assert adaptive.residual <= ModelConfig.ADAPTIVE_TOLERANCE
+        assert (
+            np.abs(afterimage - expected).max()
+            <= ModelConfig.INTENSITY * ModelConfig.ADAPTIVE_TOLERANCE + 1e-6
+        )
+
+
+def test_process_frame_sequence_reports_adaptive_steps(tmp_path, monkeypatch, capsys):
+    _overshooting_euler(monkeypatch)
+    input_folder = tmp_path / "frames"
+    input_folder.mkdir()
+    rng = np.random.default_rng(1)
+    for i in range(2):
+        cv2.imwrite(
+            str(input_folder / f"frame_{i:04d}.png"),
+            rng.integers(0, 256, (12, 18, 3), dtype=np.uint8),
+        )
+    process_frame_sequence(str(input_folder), str(tmp_path / "out"), adaptive=True)
+    out = capsys.readouterr().out
+    assert "/100 steps, residual" in out
+    assert "Adaptive stepping took" in out
@@ -0,0 +1,41 @@
+import sys
+
+import pytest
+
+from model.processing import afterimage_batch
+from model.processing.afterimage_batch import check_modes
+
+
+def test_check_modes_rejects_unsupported_combinations():
+    check_modes('serial', level=1, verify=True, checkpoint=False)
+    check_modes('segments', verify=True)
+    for path, modes in (
+        ('tiles', {'level': 1}),
+        ('tiles', {'verify': True}),
+        ('tiles', {'use_lut': True}),
+        ('segments', {'cache': True}),
+        ('segments', {'io_threads': 2}),
+        ('segments', {'checkpoint': True}),
+        ('serial', {'fovea': (1, 2, 3), 'incremental': True}),
+        ('serial', {'adaptive': True, 'use_lut': True}),
+        ('serial', {'checkpoint': True, 'output_folder': "out.frames"}),
+    ):
+        with pytest.raises(ValueError):
+            check_modes(path, **modes)
+
+
+def test_main_reports_unsupported_combinations(monkeypatch, capsys):
+    monkeypatch.setattr(
+        sys, 'argv', ['afterimage_batch', '--workers', '2', '--incremental']
+    )
+    with pytest.raises(SystemExit):
+        afterimage_batch.main()
+    assert (
+        "without segments or band workers, supports the incremental mode"
+        in capsys.readouterr().err
+    )
+
+
+if __name__ == "__main__":
+    test_check_modes_rejects_unsupported_combinations()
+    print("afterimage batch tests passed.")
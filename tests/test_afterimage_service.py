@@ -0,0 +1,124 @@
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from model.model_config import ModelConfig
+from model.processing.afterimage import render_afterimage, spectral_afterimages
+from model.processing import afterimage_service
+from model.processing.afterimage_service import AfterimageService, LatencyStats
+
+
+def _write_frames(folder, sizes):
+    rng = np.random.default_rng(0)
+    paths = []
+    for i, size in enumerate(sizes):
+        path = folder / f"frame_{i}.png"
+        cv2.imwrite(str(path), rng.integers(0, 256, size + (3,), dtype=np.uint8))
+        paths.append(str(path))
+    return paths
+
+
+def test_batched_spectral_afterimages_match_single_images(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        ModelConfig, 'EXCITATION_CACHE_DIR', str(tmp_path / "excitation")
+    )
+    paths = _write_frames(tmp_path, [(6, 9), (11, 4), (5, 5)])
+    afterimages = spectral_afterimages([cv2.imread(path) for path in paths])
+    for path, afterimage in zip(paths, afterimages):
+        assert np.array_equal(afterimage, render_afterimage(path))
+
+
+def test_latency_percentiles():
+    stats = LatencyStats(window=100)
+    assert stats.percentiles() == {}
+    for ms in range(1, 201):
+        stats.add(ms / 1000)
+    percentiles = stats.percentiles()  # of the last 100 latencies, 101 to 200 ms
+    assert list(percentiles) == ['p50', 'p90', 'p99']
+    assert np.allclose(list(percentiles.values()), [150.5, 190.1, 199.01])
+
+
+def test_service_batches_concurrent_jobs(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        ModelConfig, 'EXCITATION_CACHE_DIR', str(tmp_path / "excitation")
+    )
+    paths = _write_frames(tmp_path, [(8, 8)] * 4 + [(10, 6)])
+    socket_path = str(tmp_path / "service.sock")
+
+    async def call(message):
+        reader, writer = await asyncio.open_unix_connection(socket_path)
+        writer.write(json.dumps(message).encode() + b"\n")
+        reply = json.loads(await reader.readline())
+        writer.close()
+        return reply
+
+    async def scenario():
+        service = AfterimageService(max_batch=8, batch_window=0.2, workers=1)
+        server = asyncio.create_task(service.serve(socket_path))
+        while service._stopped is None or not (tmp_path / "service.sock").exists():
+            await asyncio.sleep(0.01)
+        jobs = [
+            {'input': path, 'output': path.replace("frame", "afterimage")}
+            for path in paths
+        ]
+        opponent = str(tmp_path / "opponent.png")
+        jobs.append({'input': paths[0], 'output': opponent, 'model': 'opponent'})
+        replies = await asyncio.gather(*(call(job) for job in jobs))
+        missing = str(tmp_path / "missing.png")
+        bad = await call({'input': missing, 'output': str(tmp_path / "x.png")})
+        stats = await call({'op': 'stats'})
+        assert (await call({'op': 'shutdown'}))['ok']
+        await server
+        return replies, bad, stats
+
+    replies, bad, stats = asyncio.run(scenario())
+    assert all(reply['ok'] for reply in replies)
+    assert max(reply['batch'] for reply in replies) > 1
+    assert not bad['ok'] and "missing.png" in bad['error']
+    assert stats['jobs'] == 7 and stats['failures'] == 1 and stats['queue_depth'] == 0
+    assert set(stats['latency_ms']) == {'p50', 'p90', 'p99'}
+    for path in paths:
+        expected = (np.clip(render_afterimage(path), 0, 1) * 255).astype(np.uint8)
+        afterimage = cv2.imread(path.replace("frame", "afterimage")).astype(int)
+        assert np.abs(afterimage - expected).max() <= 1
+    assert cv2.imread(str(tmp_path / "opponent.png")).shape == (8, 8, 3)
+
+
+def test_stop_finishes_running_batches_and_fails_queued_jobs(monkeypatch):
+    def render_jobs(jobs):
+        time.sleep(0.2)
+        return [None] * len(jobs)
+
+    monkeypatch.setattr(afterimage_service, 'render_jobs', render_jobs)
+    monkeypatch.setattr(AfterimageService, 'warm', lambda self: None)
+
+    async def scenario():
+        service = AfterimageService(batch_window=0, workers=1)
+        service.executor = ThreadPoolExecutor(1)
+        await service.start()
+        running = asyncio.create_task(service.submit({'input': "a", 'output': "b"}))
+        while not service.in_flight:
+            await asyncio.sleep(0.01)
+        # One worker: these wait for its slot, in the batcher and in the queue.
+        queued = [
+            asyncio.create_task(service.submit({'input': "c", 'output': "d"}))
+            for _ in range(2)
+        ]
+        await asyncio.sleep(0.05)
+        await service.stop()
+        late = await service.submit({'input': "e", 'output': "f"})
+        return await running, await asyncio.gather(*queued), late
+
+    running, queued, late = asyncio.run(scenario())
+    assert running['ok']
+    assert [reply['ok'] for reply in queued] == [False, False]
+    assert not late['ok']
+
+
+if __name__ == "__main__":
+    test_latency_percentiles()
+    print("afterimage service tests passed.")
@@ -0,0 +1,39 @@
+import numpy as np
+
+from model.core.anatomical import (
+    density_canvas,
+    density_region,
+    gaze_density_map,
+    get_cone_density_map,
+)
+
+
+def test_density_region_bounds_the_thresholded_map():
+    density = get_cone_density_map((60, 80), (50, 20), 10)
+    top, bottom, left, right = density_region(density, 0.01)
+    inside = np.zeros(density.shape, dtype=bool)
+    inside[top:bottom, left:right] = True
+    assert (density[~inside] < 0.01).all()
+    assert density[top:bottom, left:right].max() == 1.0
+    assert density_region(density, 2.0) == (0, 0, 0, 0)
+
+
+def test_gaze_density_map_is_a_view_matching_the_full_map():
+    shape = (40, 70)
+    canvas = density_canvas(shape, 12)
+    for gaze in ((0, 0), (35, 20), (69, 39), (12.4, 30.6)):
+        window = gaze_density_map(shape, gaze, 12)
+        assert window.base is canvas and window.shape == shape
+        expected = get_cone_density_map(shape, (round(gaze[0]), round(gaze[1])), 12)
+        assert np.allclose(window, expected, atol=1e-6)
+    assert density_canvas(shape, 12) is canvas
+    # Gaze outside the image is clamped to its border.
+    assert np.array_equal(
+        gaze_density_map(shape, (-5, 100), 12), gaze_density_map(shape, (0, 39), 12)
+    )
+
+
+if __name__ == "__main__":
+    test_density_region_bounds_the_thresholded_map()
+    test_gaze_density_map_is_a_view_matching_the_full_map()
+    print("anatomical tests passed.")
@@ -0,0 +1,120 @@
+import json
+import os
+
+import cv2
+import numpy as np
+
+from model.video import batch_scheduler
+from model.video.batch_scheduler import (
+    collect_videos,
+    load_state,
+    process_video_batch,
+    schedule,
+)
+
+
+def _write_video(path, frame_count, size=(32, 24), fps=20):
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*'MJPG'), fps, size)
+    for i in range(frame_count):
+        writer.write(np.full((size[1], size[0], 3), i * 10, dtype=np.uint8))
+    writer.release()
+
+
+def _run_or_crash(path, *args):
+    if "crash" in path:
+        os._exit(1)
+    return _run_video_job(path, *args)
+
+
+_run_video_job = batch_scheduler.run_video_job
+
+
+def _job(name, work, memory_mb):
+    return {'path': name, 'work': work, 'memory_mb': memory_mb}
+
+
+def test_collect_videos_from_manifest_and_globs(tmp_path):
+    for name in ("a.avi", "b.mp4", "notes.txt"):
+        (tmp_path / name).write_bytes(b"")
+    (tmp_path / "list.txt").write_text("# nightly\nb.mp4\n\nclips/c.mov\n")
+    videos = collect_videos(
+        [str(tmp_path / "*"), str(tmp_path)], manifest=str(tmp_path / "list.txt")
+    )
+    expected = [tmp_path / "b.mp4", tmp_path / "clips" / "c.mov", tmp_path / "a.avi"]
+    assert videos == [str(path) for path in expected]
+
+
+def test_schedule_runs_longest_first_within_the_memory_budget():
+    jobs = [
+        _job('short', 10, 100),
+        _job('long', 50, 300),
+        _job('huge', 40, 900),
+        _job('mid', 20, 200),
+    ]
+    order = schedule(jobs, workers=2, budget_mb=600)
+    # 'huge' does not fit next to 'long', so 'short' goes ahead of it; it runs once
+    # 'long' is done.
+    expected = [(0, 'long'), (0, 'mid'), (1, 'short'), (3, 'huge')]
+    assert [(slot, job['path']) for slot, job in order] == expected
+
+
+def test_process_video_batch_resumes_from_the_state_file(tmp_path, capsys):
+    videos = []
+    for name, frames in (("first.avi", 4), ("second.avi", 6)):
+        _write_video(tmp_path / name, frames)
+        videos.append(str(tmp_path / name))
+    output_root = tmp_path / "out"
+    records = process_video_batch(
+        videos, str(output_root), workers=1, renditions=('afterimage',)
+    )
+    assert [records[video]['status'] for video in videos] == ['done', 'done']
+    assert records[videos[1]]['frames'] == 6
+    assert os.path.exists(output_root / "second" / "pipeline.log")
+    state = load_state(str(output_root / "batch_state.json"))
+    assert state == json.loads(json.dumps(records))
+    assert "Batch: 2 videos done, 0 failed" in capsys.readouterr().out
+
+    # As after a crash during 'first': only that video runs again.
+    state = load_state(str(output_root / "batch_state.json"))
+    del state[videos[0]]
+    (output_root / "batch_state.json").write_text(json.dumps(state))
+    process_video_batch(videos, str(output_root), workers=1, renditions=('afterimage',))
+    out = capsys.readouterr().out
+    assert "1 videos to process (1 done or unreadable)" in out
+    assert f"Started {videos[0]}" in out and f"Started {videos[1]}" not in out
+    with open(output_root / "batch_summary.csv") as f:
+        assert len(f.readlines()) == 3
+
+
+def test_unknown_memory_runs_one_video_at_a_time(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(batch_scheduler, 'available_memory_mb', lambda: None)
+    _write_video(tmp_path / "clip.avi", 4)
+    process_video_batch(
+        [str(tmp_path / "clip.avi")], str(tmp_path / "out"), workers=4, dry_run=True
+    )
+    out = capsys.readouterr().out
+    assert "Available memory unknown" in out
+    assert "1 workers" in out
+
+
+def test_a_dead_worker_fails_its_job_and_the_batch_goes_on(tmp_path, monkeypatch):
+    monkeypatch.setattr(batch_scheduler, 'run_video_job', _run_or_crash)
+    _write_video(tmp_path / "crash.avi", 8)
+    _write_video(tmp_path / "clip.avi", 4)
+    videos = [str(tmp_path / name) for name in ("crash.avi", "clip.avi", "gone.avi")]
+    records = process_video_batch(
+        videos, str(tmp_path / "out"), workers=1, renditions=('afterimage',)
+    )
+    statuses = [records[video]['status'] for video in videos]
+    assert statuses == ['failed', 'done', 'failed']
+    assert records[videos[0]]['error'].startswith("BrokenProcessPool")
+    assert records[videos[2]] == {
+        'status': 'failed',
+        'error': f"Missing video {videos[2]}",
+        'signature': None,
+    }
+
+
+if __name__ == "__main__":
+    test_schedule_runs_longest_first_within_the_memory_budget()
+    print("batch scheduler tests passed.")
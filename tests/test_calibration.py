@@ -0,0 +1,83 @@
+import json
+
+import cv2
+import numpy as np
+
+from model.model_config import ModelConfig, load_config
+from model.processing.calibration import afterimage_response, calibrate, frame_rmse
+
+
+def test_afterimage_response_derivatives_match_finite_differences():
+    rng = np.random.default_rng(0)
+    radiance = rng.random((50, 3))
+    ca, cd, intensity = np.array([0.2, 0.3, 0.5]), np.array([0.1, 0.15, 0.2]), 1.5
+    for method in ('exact', 'euler'):
+        _, d_ca, d_cd, d_intensity = afterimage_response(
+            radiance, ca, cd, intensity, method=method
+        )
+        eps = 1e-6
+
+        def response(ca, cd, intensity):
+            return afterimage_response(radiance, ca, cd, intensity, method=method)[0]
+
+        for c in range(3):
+            shift = np.eye(3)[c] * eps
+            numeric = (
+                response(ca + shift, cd, intensity)
+                - response(ca - shift, cd, intensity)
+            ) / (2 * eps)
+            assert np.allclose(d_ca[:, c], numeric[:, c], atol=1e-6)
+            numeric = (
+                response(ca, cd + shift, intensity)
+                - response(ca, cd - shift, intensity)
+            ) / (2 * eps)
+            assert np.allclose(d_cd[:, c], numeric[:, c], atol=1e-6)
+        numeric = (
+            response(ca, cd, intensity + eps) - response(ca, cd, intensity - eps)
+        ) / (2 * eps)
+        assert np.allclose(d_intensity, numeric, atol=1e-6)
+
+
+def test_calibration_recovers_generating_parameters(tmp_path, monkeypatch):
+    true_ca, true_cd, true_intensity = (0.5, 0.8, 1.2), (0.3, 0.6, 0.4), 1.6
+    (tmp_path / "input").mkdir()
+    (tmp_path / "reference").mkdir()
+    rng = np.random.default_rng(1)
+    for i in range(2):
+        frame = rng.integers(0, 256, (32, 48, 3), dtype=np.uint8)
+        bleaching = afterimage_response(
+            frame.reshape(-1, 3) / 255.0, true_ca, true_cd, true_intensity
+        )[0]
+        reference = np.round(bleaching.reshape(frame.shape) * 255).astype(np.uint8)
+        assert frame_rmse(frame, reference, true_ca, true_cd, true_intensity) < 0.005
+        cv2.imwrite(
+            str(tmp_path / "input" / f"{i}.png"),
+            cv2.cvtColor(frame, cv2.COLOR_RGB2BGR),
+        )
+        cv2.imwrite(
+            str(tmp_path / "reference" / f"{i}.png"),
+            cv2.cvtColor(reference, cv2.COLOR_RGB2BGR),
+        )
+
+    output = tmp_path / "fitted.json"
+    result = calibrate(
+        str(tmp_path / "input"),
+        str(tmp_path / "reference"),
+        str(output),
+        samples=2000,
+        level=0,
+    )
+    assert result['rmse'] < 0.003 < result['initial_rmse']
+
+    for name in ('CA_RGB', 'CD_RGB', 'INTENSITY'):
+        monkeypatch.setattr(ModelConfig, name, getattr(ModelConfig, name))
+    with open(output) as f:
+        assert set(json.load(f)) == {'CA_RGB', 'CD_RGB', 'INTENSITY'}
+    load_config(str(output))
+    assert ModelConfig.CA_RGB == result['CA_RGB']
+    assert ModelConfig.INTENSITY == result['INTENSITY']
+
+
+if __name__ == "__main__":
+    test_afterimage_response_derivatives_match_finite_differences()
+    print("calibration tests passed.")
@@ -0,0 +1,90 @@
+import filecmp
+import json
+
+import cv2
+import numpy as np
+import pytest
+
+from model.model_config import ModelConfig
+from model.processing import afterimage_batch
+from model.processing.afterimage_batch import AfterimageState, process_frame_sequence
+from model.utils.checkpoint import SequenceCheckpoint
+
+
+def _write_frames(folder, start, stop):
+    folder.mkdir(exist_ok=True)
+    rng = np.random.default_rng(start)
+    for i in range(start, stop):
+        cv2.imwrite(
+            str(folder / f"frame_{i:04d}.png"),
+            rng.integers(0, 256, (10, 14, 3), dtype=np.uint8),
+        )
+
+
+def _assert_same_outputs(folder, expected, count):
+    for i in range(count):
+        for sub in ("", "persistent_overlay/"):
+            name = f"{sub}frame_{i:04d}.png"
+            assert filecmp.cmp(folder / name, expected / name, shallow=False), name
+
+
+def test_snapshot_commits_only_written_frames(tmp_path):
+    state = AfterimageState(ring=1)
+    checkpoints = SequenceCheckpoint(str(tmp_path))
+    frames = [np.full((4, 5, 3), value, dtype=np.uint8) for value in (10, 200, 90)]
+    for frame in frames[:2]:
+        state.step(frame)
+    checkpoints.snapshot(state, "frame_0001.png")
+    assert checkpoints.read() is None  # frames 1 and 2 are not written yet
+    checkpoints.written(2)
+    assert checkpoints.read() is None
+    checkpoints.written(1)
+    assert checkpoints.read()['last_file'] == "frame_0001.png"
+
+    restored = AfterimageState(ring=1)
+    SequenceCheckpoint(str(tmp_path)).restore(restored)
+    expected, _ = state.step(frames[2])
+    afterimage, _ = restored.step(frames[2])
+    assert restored.frame_index == 3 and np.array_equal(afterimage, expected)
+
+
+def test_resume_and_append_match_an_uninterrupted_run(tmp_path, monkeypatch):
+    monkeypatch.setattr(ModelConfig, 'CHECKPOINT_INTERVAL', 3)
+    input_folder, output_folder = tmp_path / "frames", tmp_path / "out"
+    _write_frames(input_folder, 0, 7)
+    process_frame_sequence(str(input_folder), str(tmp_path / "expected"))
+
+    # Crash while writing frame 5: the checkpoint after frame 3 survives.
+    save_frame = afterimage_batch.save_frame
+
+    def failing_save(path, frame):
+        if path.endswith("frame_0004.png"):
+            raise IOError("disk full")
+        save_frame(path, frame)
+
+    monkeypatch.setattr(afterimage_batch, 'save_frame', failing_save)
+    with pytest.raises(IOError):
+        process_frame_sequence(str(input_folder), str(output_folder), checkpoint=True)
+    monkeypatch.setattr(afterimage_batch, 'save_frame', save_frame)
+    with open(output_folder / ".checkpoint" / "checkpoint.json") as f:
+        assert json.load(f)['last_file'] == "frame_0002.png"
+    with pytest.raises(ValueError):
+        # Not finished yet
+        process_frame_sequence(str(input_folder), str(output_folder), append=True)
+
+    process_frame_sequence(str(input_folder), str(output_folder), resume=True)
+    _assert_same_outputs(output_folder, tmp_path / "expected", 7)
+
+    _write_frames(input_folder, 7, 9)
+    process_frame_sequence(str(input_folder), str(tmp_path / "expected"))
+    process_frame_sequence(str(input_folder), str(output_folder), append=True)
+    _assert_same_outputs(output_folder, tmp_path / "expected", 9)
+
+
+def test_resume_rejects_other_settings(tmp_path, monkeypatch):
+    _write_frames(tmp_path / "frames", 0, 2)
+    input_folder, output_folder = str(tmp_path / "frames"), str(tmp_path / "out")
+    process_frame_sequence(input_folder, output_folder, checkpoint=True)
+    monkeypatch.setattr(ModelConfig, 'CD_RGB', (0.2, 0.2, 0.2))
+    with pytest.raises(ValueError, match="other model settings"):
+        process_frame_sequence(input_folder, output_folder, append=True)
@@ -0,0 +1,63 @@
+import os
+
+import cv2
+import numpy as np
+
+from model.video.extract_video import extract_frames, iter_frames
+
+
+def _write_video(path, frame_count, fps=20):
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*'MJPG'), fps, (16, 16))
+    for i in range(frame_count):
+        writer.write(np.full((16, 16, 3), i * 8, dtype=np.uint8))
+    writer.release()
+
+
+def _source_index(frame):
+    return int(round(frame.mean() / 8))
+
+
+def test_interval_selection_matches_every_nth_frame(tmp_path):
+    video_path = tmp_path / "clip.avi"
+    _write_video(video_path, 30)
+    selected = [
+        _source_index(frame) for _, frame in iter_frames(str(video_path), fps_target=6)
+    ]
+    assert selected == list(range(0, 30, 3))
+
+
+def test_nearest_selection_handles_fractional_ratios(tmp_path):
+    video_path = tmp_path / "clip.avi"
+    _write_video(video_path, 30)
+    selected = [
+        _source_index(frame)
+        for _, frame in iter_frames(str(video_path), fps_target=8, selection='nearest')
+    ]
+    assert selected == [int(np.floor(k * 2.5 + 0.5)) for k in range(12)]
+
+
+def test_parallel_ranges_extract_the_same_frames(tmp_path):
+    video_path = tmp_path / "clip.avi"
+    _write_video(video_path, 30)
+    serial = extract_frames(
+        str(video_path), str(tmp_path / "serial"), fps_target=8, selection='nearest'
+    )
+    parallel = extract_frames(
+        str(video_path),
+        str(tmp_path / "parallel"),
+        fps_target=8,
+        selection='nearest',
+        workers=3,
+    )
+    assert serial == parallel == 12
+    names = sorted(os.listdir(tmp_path / "serial"))
+    assert names == sorted(os.listdir(tmp_path / "parallel"))
+    for name in names:
+        expected = cv2.imread(str(tmp_path / "serial" / name))
+        np.testing.assert_array_equal(
+            cv2.imread(str(tmp_path / "parallel" / name)), expected
+        )
+    sources = [
+        _source_index(cv2.imread(str(tmp_path / "parallel" / name))) for name in names
+    ]
+    assert sources == [int(np.floor(k * 2.5 + 0.5)) for k in range(12)]
@@ -0,0 +1,40 @@
+import cv2
+import numpy as np
+
+from model.core.anatomical import apply_anatomical_constraints, get_cone_density_map
+from model.processing.afterimage_batch import AfterimageState, process_frame_sequence
+from model.processing.foveated import DEFAULT_TOLERANCE, FoveatedAfterimageState
+
+
+def _frames(count, shape=(48, 120, 3)):
+    rng = np.random.default_rng(0)
+    return [rng.integers(0, 256, shape, dtype=np.uint8) for _ in range(count)]
+
+
+def test_foveated_state_matches_the_modulated_full_frame():
+    frames = _frames(12)
+    center, radius = (40, 20), 8
+    density = get_cone_density_map(frames[0].shape[:2], center, radius)[..., None]
+    full = AfterimageState()
+    foveated = FoveatedAfterimageState(center, radius)
+    for frame in frames:
+        expected, _ = full.step(apply_anatomical_constraints(frame / 255.0, density))
+        afterimage, overlay = foveated.step(frame)
+        assert afterimage.shape == frame.shape and overlay.shape == frame.shape
+        assert np.abs(afterimage - expected).max() <= DEFAULT_TOLERANCE
+    assert foveated.active_fraction < 0.5
+
+
+def test_process_frame_sequence_in_foveated_mode(tmp_path, capsys):
+    input_folder = tmp_path / "frames"
+    input_folder.mkdir()
+    for i, frame in enumerate(_frames(2)):
+        cv2.imwrite(str(input_folder / f"frame_{i:04d}.png"), frame)
+    process_frame_sequence(str(input_folder), str(tmp_path / "out"), fovea=(60, 24, 6))
+    assert cv2.imread(str(tmp_path / "out" / "frame_0001.png")).shape == (48, 120, 3)
+    assert "Foveated mode integrated" in capsys.readouterr().out
+
+
+if __name__ == "__main__":
+    test_foveated_state_matches_the_modulated_full_frame()
+    print("foveated tests passed.")
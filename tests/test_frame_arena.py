@@ -0,0 +1,90 @@
+import os
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from model.core.receptor_kinetics import advance_opsin
+from model.processing.afterimage_batch import AfterimageState, process_frame_sequence
+from model.utils.frame_arena import FrameArena
+
+
+def test_arena_reuses_buffers():
+    arena = FrameArena()
+    first = arena.get('a', (4, 3), np.float32)
+    assert arena.get('a', (4, 3), np.float32) is first
+    assert arena.get('a', (4, 3), np.uint8) is not first
+    assert arena.allocations == 2 and arena.nbytes == first.nbytes + 12
+
+
+def test_in_place_kinetics_matches():
+    rng = np.random.default_rng(0)
+    opsin = rng.random((9, 7, 3)).astype(np.float32)
+    frame = rng.integers(0, 256, (9, 7, 3), dtype=np.uint8)
+    arena = FrameArena()
+    # The last case takes the iterated Euler fallback (rate * dt > 1).
+    for method, ca in (('exact', None), ('euler', None), ('euler', (30, 30, 30))):
+        expected = advance_opsin(opsin, frame, ca=ca, method=method)
+        state = opsin.copy()
+        result = advance_opsin(
+            state, frame, ca=ca, method=method, out=state, arena=arena
+        )
+        assert result is state
+        assert np.array_equal(state, expected)
+
+
+def test_ring_outputs_match_and_stop_allocating():
+    rng = np.random.default_rng(1)
+    frames = [rng.integers(0, 256, (32, 24, 3), dtype=np.uint8) for _ in range(6)]
+    fresh, ringed = AfterimageState(), AfterimageState(ring=2)
+    for i, frame in enumerate(frames):
+        expected = fresh.step(frame)
+        actual = ringed.step(frame)
+        for a, b in zip(actual, expected):
+            assert np.array_equal(a, b)
+        if i == 1:
+            allocations = ringed.arena.allocations
+    assert ringed.arena.allocations == allocations
+
+
+def test_steady_state_steps_do_not_allocate_frames():
+    rng = np.random.default_rng(3)
+    frames = [rng.integers(0, 256, (240, 320, 3), dtype=np.uint8) for _ in range(4)]
+    state = AfterimageState(ring=1)
+    # The second step allocates the overlay's scratch buffer.
+    state.step(frames[0])
+    state.step(frames[1])
+    tracemalloc.start()
+    for frame in frames:
+        state.step(frame)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # One uint8 frame is smaller than any frame-sized temporary of the float32 kinetics.
+    assert peak < frames[0].nbytes
+
+
+def test_staged_ring_outputs_match_serial(tmp_path):
+    input_folder = tmp_path / "input"
+    input_folder.mkdir()
+    rng = np.random.default_rng(2)
+    for i in range(20):
+        cv2.imwrite(
+            str(input_folder / f"frame_{i:04d}.png"),
+            rng.integers(0, 256, (16, 16, 3), dtype=np.uint8),
+        )
+
+    process_frame_sequence(str(input_folder), str(tmp_path / "serial"))
+    process_frame_sequence(str(input_folder), str(tmp_path / "staged"), io_threads=3)
+    for folder in ("", "persistent_overlay"):
+        for fname in os.listdir(input_folder):
+            serial = cv2.imread(os.path.join(tmp_path, "serial", folder, fname))
+            staged = cv2.imread(os.path.join(tmp_path, "staged", folder, fname))
+            assert np.array_equal(serial, staged)
+
+
+if __name__ == "__main__":
+    test_arena_reuses_buffers()
+    test_in_place_kinetics_matches()
+    test_ring_outputs_match_and_stop_allocating()
+    test_steady_state_steps_do_not_allocate_frames()
+    print("frame arena tests passed.")
@@ -0,0 +1,157 @@
+import json
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+from model.processing.afterimage_batch import process_frame_sequence
+from model.utils.frame_store import (
+    INDEX_FILE,
+    FrameStore,
+    FrameStoreWriter,
+    is_frame_store,
+    open_frames,
+    pack_images,
+    unpack_images,
+)
+from model.video.extract_video import extract_frames
+
+
+def _frames(count, shape=(6, 8, 3), seed=0):
+    rng = np.random.default_rng(seed)
+    return [rng.integers(0, 256, shape, dtype=np.uint8) for _ in range(count)]
+
+
+def test_store_round_trip_with_random_access(tmp_path):
+    frames = _frames(10)
+    path = str(tmp_path / "clip.frames")
+    with FrameStoreWriter(path, fps=5, chunk_frames=4) as writer:
+        for frame in frames:
+            writer.write(frame)
+    store = FrameStore(path)
+    assert len(store) == 10 and store.shape == (6, 8, 3)
+    assert sorted(f for f in os.listdir(path) if f.startswith("chunk_")) == [
+        "chunk_00000.npy", "chunk_00001.npy", "chunk_00002.npy"]
+    for i in (9, 0, 5, -1):
+        np.testing.assert_array_equal(store[i], frames[i])
+    assert store.names[3] == "frame_0003.jpg"
+    np.testing.assert_allclose(store.timestamps, np.arange(10) / 5)
+    with pytest.raises(IndexError):
+        store[10]
+
+
+def test_reads_are_read_only_views(tmp_path):
+    path = str(tmp_path / "clip.frames")
+    with FrameStoreWriter(path) as writer:
+        writer.write(_frames(1)[0])
+    store = FrameStore(path)
+    frame = store[0]
+    assert np.shares_memory(frame, store[0]) and not frame.flags.writeable
+    rgb = store.frame("frame_0000.jpg", 'RGB')
+    np.testing.assert_array_equal(rgb, frame[..., ::-1])
+
+
+def test_uncommitted_frames_are_ignored_and_append_continues(tmp_path):
+    frames = _frames(7)
+    path = str(tmp_path / "clip.frames")
+    writer = FrameStoreWriter(path, chunk_frames=4)
+    for frame in frames[:6]:
+        writer.write(frame)
+    # A crash before close(): only the full first chunk was committed.
+    assert len(FrameStore(path)) == 4
+    writer = FrameStoreWriter(path, append=True)
+    writer.write(frames[6], "frame_0004.jpg")
+    writer.close()
+    store = FrameStore(path)
+    assert store.names == [f"frame_{i:04d}.jpg" for i in range(5)]
+    np.testing.assert_array_equal(store[4], frames[6])
+
+
+def test_a_store_closed_without_frames_is_empty(tmp_path):
+    path = str(tmp_path / "clip.frames")
+    FrameStoreWriter(path).close()
+    store = FrameStore(path)
+    assert len(store) == 0 and store.shape is None and list(store) == []
+    assert unpack_images(path, str(tmp_path / "images")) == 0
+    frames = _frames(2)
+    with FrameStoreWriter(path, append=True) as writer:
+        for frame in frames:
+            writer.write(frame)
+    store = FrameStore(path)
+    assert len(store) == 2 and store.shape == (6, 8, 3)
+    np.testing.assert_array_equal(store[1], frames[1])
+
+
+def test_writer_rejects_other_shapes(tmp_path):
+    with FrameStoreWriter(str(tmp_path / "clip.frames")) as writer:
+        writer.write(np.zeros((4, 4, 3), np.uint8))
+        with pytest.raises(ValueError):
+            writer.write(np.zeros((4, 5, 3), np.uint8))
+
+
+def test_pack_and_unpack_image_folders(tmp_path):
+    frames = _frames(3)
+    folder = tmp_path / "images"
+    folder.mkdir()
+    for i, frame in enumerate(frames):
+        cv2.imwrite(str(folder / f"frame_{i:04d}.png"), frame)
+    store = str(tmp_path / "images.frames")
+    assert pack_images(str(folder), store) == 3
+    assert unpack_images(store, str(tmp_path / "unpacked")) == 3
+    assert sorted(os.listdir(tmp_path / "unpacked")) == sorted(os.listdir(folder))
+    for name in os.listdir(folder):
+        expected = cv2.imread(str(folder / name))
+        np.testing.assert_array_equal(open_frames(store).frame(name), expected)
+        decoded = open_frames(str(folder)).frame(name, 'BGR')
+        np.testing.assert_array_equal(decoded, expected)
+
+
+def test_batch_processor_reads_and_writes_stores(tmp_path):
+    frames = _frames(5, (8, 8, 3))
+    folder = tmp_path / "images"
+    folder.mkdir()
+    for i, frame in enumerate(frames):
+        cv2.imwrite(str(folder / f"frame_{i:04d}.png"), frame)
+    store = str(tmp_path / "input.frames")
+    pack_images(str(folder), store, fps=10)
+
+    process_frame_sequence(str(folder), str(tmp_path / "from_images"))
+    process_frame_sequence(store, str(tmp_path / "out.frames"), io_threads=2)
+    afterimages = FrameStore(str(tmp_path / "out.frames"))
+    overlays = FrameStore(str(tmp_path / "out.frames" / "persistent_overlay.frames"))
+    names = [f"frame_{i:04d}.png" for i in range(5)]
+    assert afterimages.names == overlays.names == names
+    np.testing.assert_allclose(afterimages.timestamps, np.arange(5) / 10)
+    image_overlays = tmp_path / "from_images" / "persistent_overlay"
+    for name in afterimages.names:
+        expected = cv2.imread(str(image_overlays / name))
+        np.testing.assert_array_equal(overlays.frame(name), expected)
+    with pytest.raises(ValueError):
+        process_frame_sequence(
+            store, str(tmp_path / "checkpointed.frames"), checkpoint=True
+        )
+
+
+def test_extract_frames_into_a_store(tmp_path):
+    video_path = str(tmp_path / "clip.avi")
+    writer = cv2.VideoWriter(video_path, cv2.VideoWriter_fourcc(*'MJPG'), 20, (16, 16))
+    for i in range(20):
+        writer.write(np.full((16, 16, 3), i * 8, dtype=np.uint8))
+    writer.release()
+    path = str(tmp_path / "clip.frames")
+    assert extract_frames(video_path, path, fps_target=5) == 5
+    store = FrameStore(path)
+    with open(os.path.join(path, INDEX_FILE)) as f:
+        assert json.load(f)['fps'] == 5
+    np.testing.assert_allclose(store.timestamps, np.arange(5) * 4 / 20)
+    assert [int(round(frame.mean() / 8)) for frame in store] == [0, 4, 8, 12, 16]
+
+
+def test_is_frame_store():
+    assert is_frame_store("out/clip.frames") and is_frame_store("clip.frames/")
+    assert not is_frame_store("out/frames")
+
+
+if __name__ == "__main__":
+    test_is_frame_store()
@@ -0,0 +1,20 @@
+from model.utils.gaze_track import GazeTrack
+
+
+def test_gaze_track_holds_the_previous_sample(tmp_path):
+    path = tmp_path / "gaze.csv"
+    path.write_text("frame,x,y\n2,10,20\n5,30.5,40\n# blink\n8,50,60\n")
+    track = GazeTrack.load(str(path))
+    assert len(track) == 3
+    assert track.at(0) == (10.0, 20.0)
+    assert track.at(4) == (10.0, 20.0)
+    assert track.at(5) == (30.5, 40.0)
+    assert track.at(100) == (50.0, 60.0)
+
+
+if __name__ == "__main__":
+    import pathlib
+    import tempfile
+    with tempfile.TemporaryDirectory() as folder:
+        test_gaze_track_holds_the_previous_sample(pathlib.Path(folder))
+    print("gaze track tests passed.")
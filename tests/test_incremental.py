@@ -0,0 +1,64 @@
+import cv2
+import numpy as np
+import pytest
+
+from model.model_config import ModelConfig
+from model.processing.afterimage_batch import AfterimageState, process_frame_sequence
+from model.processing.incremental import IncrementalAfterimageState, steady_state_gain
+
+
+def _moving_square(count, shape=(70, 90, 3)):
+    rng = np.random.default_rng(0)
+    background = cv2.resize(
+        rng.integers(0, 256, (3, 4, 3), dtype=np.uint8),
+        shape[1::-1],
+        interpolation=cv2.INTER_CUBIC,
+    )
+    frames = []
+    for i in range(count):
+        frame = background.copy()
+        x = (3 * i) % (shape[1] - 10)
+        frame[20:30, x:x + 10] = 255
+        frames.append(frame)
+    return frames
+
+
+def test_incremental_state_skips_converged_tiles_and_stays_close():
+    full = AfterimageState()
+    incremental = IncrementalAfterimageState(tile=16)
+    fractions = []
+    for frame in _moving_square(150):
+        expected, expected_overlay = full.step(frame)
+        afterimage, overlay = incremental.step(frame)
+        fractions.append(incremental.active_fraction)
+        assert afterimage.shape == frame.shape
+        tolerance = ModelConfig.INTENSITY * incremental.epsilon + 1e-6
+        assert np.abs(afterimage - expected).max() <= tolerance
+        assert np.abs(overlay.astype(int) - expected_overlay).max() <= 1
+    assert fractions[0] == 1.0
+    # With the background converged, only tiles around the moving square are integrated.
+    assert max(fractions[-10:]) < 0.35
+
+
+def test_process_frame_sequence_reports_integrated_fraction(tmp_path, capsys):
+    input_folder = tmp_path / "frames"
+    input_folder.mkdir()
+    for i, frame in enumerate(_moving_square(3, (40, 50, 3))):
+        cv2.imwrite(str(input_folder / f"frame_{i:04d}.png"), frame)
+    process_frame_sequence(str(input_folder), str(tmp_path / "out"), incremental=True)
+    out = capsys.readouterr().out
+    assert "100.0% of pixels integrated" in out
+    assert "Incremental mode integrated" in out
+
+
+def test_euler_gain_bounds_overshooting_steps(monkeypatch):
+    monkeypatch.setattr(ModelConfig, 'INTEGRATOR', 'euler')
+    # (ca + cd) * dt = 1.95 overshoots by 0.95 per step; cd * dt = 0.1 shrinks by 0.9.
+    decay = 0.95 ** ModelConfig.ITERATIONS
+    assert steady_state_gain([37.0], [2.0])[0] == pytest.approx(decay / (1 - decay))
+    assert steady_state_gain([40.0], [2.0])[0] == np.inf
+
+
+if __name__ == "__main__":
+    test_incremental_state_skips_converged_tiles_and_stays_close()
+    print("incremental tests passed.")
@@ -0,0 +1,78 @@
+import cv2
+import numpy as np
+
+from model.core.kinetics_lut import generate_afterimage_lut, get_opsin_lut
+from model.core.receptor_kinetics import advance_opsin
+from model.model_config import ModelConfig
+from model.processing.afterimage import render_afterimage
+from model.processing.afterimage_batch import AfterimageState
+from model.utils.frame_format import channel_params
+
+
+def _afterimage(image, layout='RGB'):
+    opsin = advance_opsin(
+        np.ones(image.shape),
+        image,
+        ca=channel_params(ModelConfig.CA_RGB, layout),
+        cd=channel_params(ModelConfig.CD_RGB, layout),
+    )
+    return np.clip((1.0 - opsin) * ModelConfig.INTENSITY, 0, 1)
+
+
+def test_afterimage_lut_matches_kinetics():
+    image = np.random.default_rng(0).integers(0, 256, (12, 10, 3), dtype=np.uint8)
+    for layout in ('RGB', 'BGR'):
+        expected = _afterimage(image / 255.0, layout)
+        assert np.allclose(generate_afterimage_lut(image, layout), expected, atol=1e-6)
+
+
+def test_afterimage_lut_falls_back_off_the_grid():
+    radiance = np.random.default_rng(2).random((7, 9, 3))
+    afterimage = generate_afterimage_lut(radiance)
+    assert afterimage.dtype == np.float32
+    assert np.allclose(afterimage, _afterimage(radiance), atol=1e-6)
+
+
+def test_rgb_model_matches_the_first_frame_of_a_sequence(tmp_path):
+    frame = np.random.default_rng(4).integers(0, 256, (9, 11, 3), dtype=np.uint8)
+    cv2.imwrite(str(tmp_path / "image.png"), frame)
+    afterimage, _ = AfterimageState(layout='BGR').step(frame)
+    rendered = render_afterimage(str(tmp_path / "image.png"), 'rgb')
+    assert np.allclose(rendered, afterimage, atol=1e-6)
+
+
+def test_opsin_lut_matches_kinetics():
+    rng = np.random.default_rng(1)
+    frame = rng.integers(0, 256, (12, 10, 3), dtype=np.uint8)
+    opsin = rng.random((12, 10, 3)).astype(np.float32)
+    expected = advance_opsin(opsin.astype(np.float64), frame / 255.0)
+    for levels in (None, 9):
+        lut = get_opsin_lut(levels)
+        assert lut.max_error < 1e-6
+        assert np.allclose(lut.advance(opsin, frame), expected, atol=1e-6)
+
+
+def test_opsin_lut_interpolates_the_clamped_euler_fallback(monkeypatch):
+    # k * dt > 1: the clamped Euler update is only piecewise affine in the state.
+    monkeypatch.setattr(ModelConfig, 'INTEGRATOR', 'euler')
+    monkeypatch.setattr(ModelConfig, 'TIME_STEP', 2.5)
+    rng = np.random.default_rng(3)
+    frame = rng.integers(0, 256, (40, 50, 3), dtype=np.uint8)
+    lut = get_opsin_lut()
+    assert lut.levels == 65
+    assert 0 < lut.max_error < 1e-4
+
+    # States on the table's levels are exact, states between them within max_error.
+    on_grid = rng.integers(0, lut.levels, frame.shape) / (lut.levels - 1)
+    off_grid = rng.random(frame.shape)
+    for opsin, tolerance in ((on_grid, 1e-6), (off_grid, lut.max_error)):
+        expected = advance_opsin(opsin, frame / 255.0)
+        result = lut.advance(opsin.astype(np.float32), frame)
+        assert np.abs(result - expected).max() <= tolerance
+
+
+if __name__ == "__main__":
+    test_afterimage_lut_matches_kinetics()
+    test_afterimage_lut_falls_back_off_the_grid()
+    test_opsin_lut_matches_kinetics()
+    print("kinetics lut tests passed.")
@@ -0,0 +1,84 @@
+import numpy as np
+
+from model.core.opponent_afterimage import STAGES, simulate_opponent_afterimage
+from model.model_config import ModelConfig
+
+M_RGB_TO_LMS = np.array([[0.3811, 0.5783, 0.0402],
+                         [0.1967, 0.7244, 0.0782],
+                         [0.0241, 0.1288, 0.8444]])
+M_LMS_TO_ORGB = np.array([[1 / np.sqrt(3), 1 / np.sqrt(3), 1 / np.sqrt(3)],
+                          [1 / np.sqrt(6), 1 / np.sqrt(6), -2 / np.sqrt(6)],
+                          [1 / np.sqrt(2), -1 / np.sqrt(2), 0]])
+
+
+def _gaussian_kernel(kernel_size, sigma):
+    ax = np.arange(-kernel_size // 2 + 1., kernel_size // 2 + 1.)
+    xx, yy = np.meshgrid(ax, ax, indexing='ij')
+    kernel = np.exp(-(xx ** 2 + yy ** 2) / (2. * sigma ** 2))
+    return kernel / kernel.sum()
+
+
+def _conv2d(image, kernel):
+    """
+    Dense per-channel correlation, zero-padded like F.conv2d(padding=k // 2, groups=3).
+    """
+    k = kernel.shape[0] // 2
+    padded = np.pad(image, ((k, k), (k, k), (0, 0)))
+    height, width = image.shape[:2]
+    out = np.zeros_like(image)
+    for dy in range(kernel.shape[0]):
+        for dx in range(kernel.shape[1]):
+            out += kernel[dy, dx] * padded[dy:dy + height, dx:dx + width]
+    return out
+
+
+def _notebook_pipeline(image, p):
+    """
+    process_image_debug from notebooks/afterimage_test_finetune.ipynb, in NumPy.
+    """
+    convert = (lambda img, m: np.einsum('ij,hwj->hwi', m, img))
+    radiance = _conv2d(image, _gaussian_kernel(p['kernel_size'], p['sigma_blur']))
+    radiance_lms = convert(radiance, M_RGB_TO_LMS)
+    r_lms = np.zeros_like(radiance_lms)
+    diff_kernel = _gaussian_kernel(p['kernel_size_diff'], p['N_sigma'] / np.sqrt(30))
+    for _ in range(p['num_steps']):
+        r_dot = p['c_a'] * radiance_lms * (1 - r_lms) - p['c_d'] * r_lms
+        r_lms = np.clip(r_lms + p['dt'] * r_dot, 0, 1)
+        r_lms = _conv2d(r_lms, diff_kernel)
+    afterimage_orgb = -convert(r_lms, M_LMS_TO_ORGB)
+    afterimage_lms = convert(afterimage_orgb, np.linalg.inv(M_LMS_TO_ORGB))
+    afterimage_rgb = np.clip(convert(afterimage_lms, np.linalg.inv(M_RGB_TO_LMS)), 0, 1)
+    final_output = np.clip(
+        (1 - p['alpha']) * radiance + p['alpha'] * afterimage_rgb, 0, 1
+    )
+    return {
+        'r_lms': r_lms,
+        'afterimage_lms': afterimage_lms,
+        'afterimage_rgb': afterimage_rgb,
+        'final_output': final_output,
+    }
+
+
+def test_matches_notebook_pipeline():
+    image = np.random.default_rng(0).random((24, 20, 3))
+    params = {'c_a': 3.0, 'num_steps': 12}
+    expected = _notebook_pipeline(image, dict(ModelConfig.OPPONENT_PARAMS, **params))
+    stages = simulate_opponent_afterimage(image, params, return_stages=True)
+    assert set(stages) == set(STAGES)
+    assert stages['r_lms'].max() > 0.1
+    for name, reference in expected.items():
+        assert np.allclose(stages[name], reference, atol=1e-5), name
+
+
+def test_bgr_uint8_input():
+    image = np.random.default_rng(1).integers(0, 256, (16, 16, 3), dtype=np.uint8)
+    rgb = simulate_opponent_afterimage(image / 255.0)
+    bgr = simulate_opponent_afterimage(image[:, :, ::-1].copy(), layout='BGR')
+    assert bgr.dtype == np.float32
+    assert np.allclose(bgr[:, :, ::-1], rgb, atol=1e-5)
+
+
+if __name__ == "__main__":
+    test_matches_notebook_pipeline()
+    test_bgr_uint8_input()
+    print("opponent afterimage tests passed.")
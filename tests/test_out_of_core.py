@@ -0,0 +1,91 @@
+import tracemalloc
+
+import cv2
+import numpy as np
+import pytest
+
+from model.core.anatomical import cone_density_tile, get_cone_density_map
+from model.core.hdr_processing import hdr_to_npy, iter_hdr_rows
+from model.processing.out_of_core import (
+    hdr_afterimage,
+    iter_tiles,
+    plan_tiles,
+    process_hdr_tiled,
+)
+
+
+def _write_hdr(path, shape=(90, 130, 3), compression=cv2.IMWRITE_HDR_COMPRESSION_RLE):
+    rng = np.random.default_rng(0)
+    image = (rng.random(shape) ** 3 * 20).astype(np.float32)
+    image[10:20, 30:100] = 2.5  # Runs for the run-length encoder
+    cv2.imwrite(str(path), image, [cv2.IMWRITE_HDR_COMPRESSION, compression])
+    return cv2.imread(str(path), -1)
+
+
+@pytest.mark.parametrize(
+    "compression", [cv2.IMWRITE_HDR_COMPRESSION_RLE, cv2.IMWRITE_HDR_COMPRESSION_NONE]
+)
+def test_streamed_hdr_rows_match_opencv(tmp_path, compression):
+    expected = _write_hdr(tmp_path / "image.hdr", compression=compression)
+    rows = list(iter_hdr_rows(str(tmp_path / "image.hdr")))
+    np.testing.assert_array_equal(np.stack(rows), expected)
+    hdr_to_npy(str(tmp_path / "image.hdr"), str(tmp_path / "image.npy"))
+    np.testing.assert_array_equal(np.load(tmp_path / "image.npy"), expected)
+
+
+def test_density_tile_matches_the_full_map():
+    for centre in [(10, 20), (10.4, -30), (200, 5.6)]:
+        full = get_cone_density_map((60, 90), centre, 25)
+        tile = cone_density_tile((60, 90), centre, 25, slice(5, 40), slice(30, 90))
+        np.testing.assert_allclose(tile, full[5:40, 30:90], atol=1e-6)
+
+
+def test_tiles_cover_the_image_once():
+    covered = np.zeros((50, 70), dtype=int)
+    for (top, bottom, left, right), outer in iter_tiles((50, 70), 16, 5):
+        covered[top:bottom, left:right] += 1
+        assert outer[0] == max(top - 5, 0) and outer[3] == min(right + 5, 70)
+    assert (covered == 1).all()
+
+
+@pytest.mark.parametrize(
+    "model, memory_mb, fovea",
+    [
+        ('spectral', 0.5, None),
+        ('spectral', 0.5, (40, 30, 50)),
+        ('opponent', 4, None),
+        ('opponent', 4, (40, 30, 50)),
+    ],
+)
+def test_tiled_matches_whole_image(tmp_path, model, memory_mb, fovea):
+    hdr = _write_hdr(tmp_path / "image.hdr", shape=(200, 260, 3))
+    source, target = str(tmp_path / "image.hdr"), str(tmp_path / "afterimage.npy")
+    stats = process_hdr_tiled(source, target, model, 0.5, fovea, memory_mb=memory_mb)
+    assert stats['tiles'] > 1
+    expected = hdr_afterimage(hdr, model, 0.5, fovea)
+    np.testing.assert_allclose(np.load(target), expected, atol=1e-6)
+
+
+def test_allocations_stay_within_the_budget(tmp_path):
+    _write_hdr(tmp_path / "image.hdr", shape=(300, 400, 3))
+    # Load the excitation transform first
+    hdr_afterimage(np.ones((4, 4, 3), np.float32))
+    source, target = str(tmp_path / "image.hdr"), str(tmp_path / "afterimage.png")
+    for model, memory_mb in (('spectral', 0.5), ('opponent', 4)):
+        tracemalloc.start()
+        process_hdr_tiled(source, target, model, memory_mb=memory_mb)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        assert peak <= memory_mb * 2 ** 20
+    assert cv2.imread(str(tmp_path / "afterimage.png")).shape == (300, 400, 3)
+
+
+def test_budget_too_small_for_the_halo():
+    with pytest.raises(ValueError):
+        plan_tiles((1000, 1000), 62, 1, 112)
+
+
+if __name__ == "__main__":
+    test_density_tile_matches_the_full_map()
+    test_tiles_cover_the_image_once()
+    test_budget_too_small_for_the_halo()
@@ -0,0 +1,114 @@
+import filecmp
+import json
+import os
+
+import cv2
+import numpy as np
+
+from model.core.receptor_kinetics import advance_opsin, stack_parameters
+from model.model_config import ModelConfig
+from model.processing.afterimage_batch import AfterimageState, process_frame_sequence
+from model.processing.parameter_sweep import (
+    ParameterSweep,
+    parameter_grid,
+    sweep_frame_sequence,
+)
+
+SETTINGS = [
+    dict(ca=(0.2, 0.3, 0.5), cd=(0.1, 0.15, 0.2), dt=0.05, steps=20, intensity=2.0),
+    dict(ca=(0.6, 0.1, 0.9), cd=(0.3, 0.05, 0.2), dt=0.1, steps=7, intensity=1.5),
+    dict(ca=(1.0, 1.0, 1.0), cd=(0.5, 0.5, 0.5), dt=0.02, steps=40, intensity=3.0),
+]
+
+
+def _use_setting(monkeypatch, setting):
+    monkeypatch.setattr(ModelConfig, 'CA_RGB', setting['ca'])
+    monkeypatch.setattr(ModelConfig, 'CD_RGB', setting['cd'])
+    monkeypatch.setattr(ModelConfig, 'TIME_STEP', setting['dt'])
+    monkeypatch.setattr(ModelConfig, 'ITERATIONS', setting['steps'])
+    monkeypatch.setattr(ModelConfig, 'INTENSITY', setting['intensity'])
+
+
+def test_batched_kinetics_match_single_settings():
+    rng = np.random.default_rng(0)
+    opsin = rng.random((9, 7, 3)).astype(np.float32)
+    radiance = rng.integers(0, 256, (9, 7, 3), dtype=np.uint8)
+    for method in ('exact', 'euler'):
+        batch = advance_opsin(
+            opsin, radiance, method=method, **stack_parameters(SETTINGS)
+        )
+        assert batch.shape == (len(SETTINGS),) + opsin.shape
+        for k, setting in enumerate(SETTINGS):
+            single = advance_opsin(
+                opsin,
+                radiance,
+                setting['steps'],
+                setting['dt'],
+                setting['ca'],
+                setting['cd'],
+                method=method,
+            )
+            assert np.array_equal(batch[k], single)
+
+
+def test_batched_euler_fallback_respects_step_counts():
+    rng = np.random.default_rng(1)
+    opsin = rng.random((5, 5, 3))
+    radiance = rng.random((5, 5, 3))
+    # The first setting needs the fallback.
+    settings = [{'dt': 2.0, 'steps': 3}, {'dt': 0.05, 'steps': 10}]
+    batch = advance_opsin(opsin, radiance, method='euler', **stack_parameters(settings))
+    for k, setting in enumerate(settings):
+        single = advance_opsin(
+            opsin, radiance, setting['steps'], setting['dt'], method='euler'
+        )
+        assert np.allclose(batch[k], single, atol=1e-12)
+
+
+def test_sweep_matches_afterimage_state(monkeypatch):
+    rng = np.random.default_rng(2)
+    frames = [rng.integers(0, 256, (12, 10, 3), dtype=np.uint8) for _ in range(3)]
+    sweep = ParameterSweep(SETTINGS)
+    swept = [tuple(output.copy() for output in sweep.step(frame)) for frame in frames]
+    for k, setting in enumerate(SETTINGS):
+        _use_setting(monkeypatch, setting)
+        state = AfterimageState()
+        for frame, (afterimages, overlays) in zip(frames, swept):
+            afterimage, overlay = state.step(frame)
+            assert np.array_equal(afterimages[k], afterimage)
+            assert np.array_equal(overlays[k], overlay)
+
+
+def test_sweep_frame_sequence_writes_one_folder_per_setting(tmp_path, monkeypatch):
+    frames_dir = tmp_path / "frames"
+    frames_dir.mkdir()
+    rng = np.random.default_rng(3)
+    for i in range(2):
+        cv2.imwrite(
+            str(frames_dir / f"frame_{i:04d}.png"),
+            rng.integers(0, 256, (8, 6, 3), dtype=np.uint8),
+        )
+    settings = parameter_grid(ca_scale=[1.0, 2.0])
+    sweep_frame_sequence(str(frames_dir), str(tmp_path / "sweep"), settings)
+
+    with open(tmp_path / "sweep" / "sweep.json") as f:
+        outputs = [entry['output'] for entry in json.load(f)]
+    assert outputs == ["setting_000", "setting_001"]
+    _use_setting(monkeypatch, settings[1])
+    process_frame_sequence(str(frames_dir), str(tmp_path / "single"))
+    for name in (
+        "frame_0000.png",
+        "frame_0001.png",
+        os.path.join("persistent_overlay", "frame_0001.png"),
+    ):
+        assert filecmp.cmp(
+            tmp_path / "sweep" / "setting_001" / name,
+            tmp_path / "single" / name,
+            shallow=False,
+        )
+
+
+if __name__ == "__main__":
+    test_batched_kinetics_match_single_settings()
+    test_batched_euler_fallback_respects_step_counts()
+    print("parameter sweep tests passed.")
@@ -0,0 +1,47 @@
+import numpy as np
+
+from model.core.photoreceptor_model import (
+    simulate_spectral_temporal_bleaching,
+    simulate_spectral_temporal_bleaching_adaptive,
+)
+from model.utils.excitation_engine import (
+    apply_excitation_transform,
+    clear_transform_cache,
+    get_excitation_transform,
+)
+
+
+def test_excitation_transform_cached(tmp_path):
+    clear_transform_cache()
+    transform = get_excitation_transform(cache_dir=str(tmp_path))
+    assert transform.shape == (4, 3)
+    assert np.allclose(transform.sum(axis=1), 1.0)
+    assert get_excitation_transform(cache_dir=str(tmp_path)) is transform
+
+    # A fresh process would load the same matrix from disk.
+    clear_transform_cache()
+    assert np.array_equal(get_excitation_transform(cache_dir=str(tmp_path)), transform)
+
+
+def test_apply_excitation_transform():
+    transform = np.arange(12, dtype=float).reshape(4, 3)
+    image = np.random.default_rng(0).random((5, 7, 3))
+    excitations = apply_excitation_transform(image, transform)
+    assert excitations.shape == (5, 7, 4)
+    assert np.allclose(excitations, np.einsum('hwc,nc->hwn', image, transform))
+
+
+def test_adaptive_bleaching_stays_within_tolerance():
+    image = np.random.default_rng(1).random((6, 5, 3))
+    fixed = simulate_spectral_temporal_bleaching(image, dt=0.5, iterations=200)
+    adaptive, iterations, residual = simulate_spectral_temporal_bleaching_adaptive(
+        image, 1e-4, dt=0.5, iterations=200
+    )
+    assert isinstance(fixed, np.ndarray) and fixed.shape == (6, 5, 4)
+    assert iterations <= 200 and residual <= 1e-4
+    assert np.abs(adaptive - fixed).max() <= 1e-4 + 1e-6
+
+
+if __name__ == "__main__":
+    test_apply_excitation_transform()
+    print("photoreceptor tests passed.")
@@ -0,0 +1,54 @@
+import cv2
+import numpy as np
+
+from model.processing.afterimage_batch import AfterimageState, process_frame_sequence
+from model.utils.image_metrics import psnr, ssim
+
+
+def _smooth_frames(count, shape=(64, 96, 3)):
+    rng = np.random.default_rng(0)
+    frames = []
+    for _ in range(count):
+        coarse = rng.integers(0, 256, (4, 6, 3), dtype=np.uint8)
+        frames.append(cv2.resize(coarse, shape[1::-1], interpolation=cv2.INTER_CUBIC))
+    return frames
+
+
+def test_metrics_of_identical_and_different_images():
+    rng = np.random.default_rng(1)
+    image = rng.random((20, 30, 3))
+    assert psnr(image, image) == float('inf')
+    assert abs(ssim(image, image) - 1) < 1e-12
+    noisy = np.clip(image + rng.normal(0, 0.1, image.shape), 0, 1)
+    assert 15 < psnr(noisy, image) < 25
+    assert ssim(noisy, image) < 0.99
+
+
+def test_pyramid_state_is_reduced_and_close_to_full_resolution():
+    frames = _smooth_frames(4)
+    full = AfterimageState(level=0)
+    reduced = AfterimageState(level=2)
+    for frame in frames:
+        expected, _ = full.step(frame)
+        afterimage, overlay = reduced.step(frame)
+        assert afterimage.shape == frame.shape and overlay.shape == frame.shape
+        assert psnr(afterimage, expected) > 35
+    assert reduced.opsin.shape == (16, 24, 3)
+
+
+def test_process_frame_sequence_reports_pyramid_quality(tmp_path, capsys):
+    input_folder = tmp_path / "frames"
+    input_folder.mkdir()
+    for i, frame in enumerate(_smooth_frames(2, (30, 45, 3))):
+        cv2.imwrite(str(input_folder / f"frame_{i:04d}.png"), frame)
+    process_frame_sequence(
+        str(input_folder), str(tmp_path / "out"), level=1, verify=True
+    )
+    assert cv2.imread(str(tmp_path / "out" / "frame_0001.png")).shape == (30, 45, 3)
+    assert "Pyramid level 1 against full resolution: PSNR" in capsys.readouterr().out
+
+
+if __name__ == "__main__":
+    test_metrics_of_identical_and_different_images()
+    test_pyramid_state_is_reduced_and_close_to_full_resolution()
+    print("pyramid state tests passed.")
@@ -0,0 +1,81 @@
+import numpy as np
+
+from model.core.receptor_kinetics import (
+    advance_opsin,
+    integrate_adaptive,
+    update_opsin_concentration,
+)
+from model.model_config import ModelConfig
+
+
+def _iterate(opsin, radiance, steps):
+    for _ in range(steps):
+        opsin = update_opsin_concentration(opsin, radiance)
+    return opsin
+
+
+def test_euler_mode_matches_iterated_updates():
+    rng = np.random.default_rng(0)
+    opsin = rng.random((16, 16, 3))
+    radiance = rng.random((16, 16, 3))
+    result = advance_opsin(
+        opsin, radiance, steps=ModelConfig.ITERATIONS, method='euler'
+    )
+    assert np.allclose(
+        result, _iterate(opsin, radiance, ModelConfig.ITERATIONS), atol=1e-12
+    )
+
+
+def test_default_integrator_reproduces_the_iterated_model():
+    rng = np.random.default_rng(4)
+    opsin = rng.random((8, 8, 3))
+    radiance = rng.integers(0, 256, (8, 8, 3)).astype(np.float64)
+    assert ModelConfig.INTEGRATOR == 'euler'
+    expected = _iterate(opsin, radiance, ModelConfig.ITERATIONS)
+    assert np.allclose(advance_opsin(opsin, radiance), expected, atol=1e-12)
+
+
+def test_exact_mode_is_the_small_step_limit():
+    rng = np.random.default_rng(1)
+    opsin = rng.random((8, 8, 3))
+    radiance = rng.random((8, 8, 3)) * 4
+    exact = advance_opsin(opsin, radiance, steps=1, dt=1.0, method='exact')
+    fine = advance_opsin(opsin, radiance, steps=100000, dt=1e-5, method='euler')
+    assert np.allclose(exact, fine, atol=1e-5)
+    assert exact.min() >= 0 and exact.max() <= 1
+
+
+def test_adaptive_stepping_stays_within_tolerance():
+    rng = np.random.default_rng(2)
+    opsin = rng.random((20, 30, 3)).astype(np.float32)
+    radiance = rng.integers(0, 256, (20, 30, 3), dtype=np.uint8)
+    radiance[:10] = 0  # dark half settles early
+    # The Euler step of 2.5 overshoots (k * dt > 1).
+    for method, dt in (('exact', 0.5), ('euler', 0.5), ('euler', 2.5)):
+        fixed = advance_opsin(opsin, radiance, steps=200, dt=dt, method=method)
+        adaptive, iterations, residual = integrate_adaptive(
+            opsin, radiance, steps=200, dt=dt, method=method, tolerance=1e-4
+        )
+        assert iterations < 200
+        assert residual <= 1e-4
+        assert np.abs(adaptive - fixed).max() <= 1e-4 + 1e-6
+
+
+def test_adaptive_stepping_without_settling_is_fixed_stepping():
+    rng = np.random.default_rng(3)
+    opsin = rng.random((8, 8, 3))
+    radiance = rng.random((8, 8, 3))
+    result, iterations, residual = integrate_adaptive(
+        opsin, radiance, steps=5, method='euler', tolerance=0
+    )
+    assert (iterations, residual) == (5, 0.0)
+    assert np.allclose(result, _iterate(opsin, radiance, 5), atol=1e-12)
+
+
+if __name__ == "__main__":
+    test_euler_mode_matches_iterated_updates()
+    test_default_integrator_reproduces_the_iterated_model()
+    test_exact_mode_is_the_small_step_limit()
+    test_adaptive_stepping_stays_within_tolerance()
+    test_adaptive_stepping_without_settling_is_fixed_stepping()
+    print("receptor kinetics tests passed.")
@@ -0,0 +1,97 @@
+import multiprocessing as mp
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+import pytest
+
+from model.model_config import ModelConfig, apply_config, config_snapshot
+from model.processing.segment_parallel import (
+    _process_segment,
+    frame_contraction,
+    process_frame_sequence_segmented,
+    split_segments,
+    warmup_frames,
+)
+
+
+def test_split_segments():
+    assert split_segments(10, 3) == [(0, 3), (3, 7), (7, 10)]
+    assert split_segments(2, 5) == [(0, 1), (1, 2)]
+
+
+def test_segmented_run_within_tolerance(tmp_path, monkeypatch):
+    monkeypatch.setattr(ModelConfig, 'CD_RGB', (0.5, 0.75, 1.0))
+    monkeypatch.setattr(ModelConfig, 'INTENSITY', 0.5)
+    input_folder = tmp_path / "input"
+    input_folder.mkdir()
+    rng = np.random.default_rng(0)
+    for i in range(24):
+        cv2.imwrite(
+            str(input_folder / f"frame_{i:04d}.png"),
+            rng.integers(0, 256, (8, 8, 3), dtype=np.uint8),
+        )
+
+    tolerance = 0.05
+    summary = process_frame_sequence_segmented(
+        str(input_folder),
+        str(tmp_path / "output"),
+        segments=3,
+        workers=2,
+        tolerance=tolerance,
+        verify=True,
+    )
+    assert summary['warmup_frames'] == warmup_frames(tolerance)
+    assert summary['warmup_frames'] < 8
+    assert 0 < summary['max_deviation'] <= tolerance
+    assert len(os.listdir(tmp_path / "output" / "persistent_overlay")) == 24
+
+
+def test_segments_return_their_first_afterimage_only_to_verify(tmp_path):
+    input_folder = tmp_path / "input"
+    input_folder.mkdir()
+    (tmp_path / "output" / "persistent_overlay").mkdir(parents=True)
+    rng = np.random.default_rng(1)
+    for i in range(4):
+        cv2.imwrite(
+            str(input_folder / f"frame_{i:04d}.png"),
+            rng.integers(0, 256, (6, 6, 3), dtype=np.uint8),
+        )
+    files = sorted(os.listdir(input_folder))
+    args = (str(input_folder), str(tmp_path / "output"), files, 2, 4, 1)
+    assert _process_segment(*args) == (2, None)
+    start, afterimage = _process_segment(*args, verify=True)
+    assert start == 2 and afterimage.shape == (6, 6, 3)
+
+
+def test_euler_contraction_bounds_overshooting_steps(monkeypatch):
+    monkeypatch.setattr(ModelConfig, 'INTEGRATOR', 'euler')
+    monkeypatch.setattr(ModelConfig, 'CD_RGB', (2.0, 2.0, 2.0))
+    monkeypatch.setattr(ModelConfig, 'CA_RGB', (37.0, 37.0, 37.0))
+    # (ca + cd) * dt = 1.95: a bright pixel's difference flips sign and shrinks by 0.95
+    # per step, less than the 0.9 of a dark pixel.
+    assert frame_contraction() == pytest.approx(0.95 ** ModelConfig.ITERATIONS)
+    monkeypatch.setattr(ModelConfig, 'CA_RGB', (40.0, 37.0, 37.0))
+    with pytest.raises(ValueError):
+        warmup_frames()
+
+
+def _cd_rgb():
+    return ModelConfig.CD_RGB
+
+
+def test_spawned_workers_get_the_config_overrides(monkeypatch):
+    monkeypatch.setattr(ModelConfig, 'CD_RGB', (0.5, 0.75, 1.0))
+    with ProcessPoolExecutor(
+        max_workers=1,
+        mp_context=mp.get_context('spawn'),
+        initializer=apply_config,
+        initargs=(config_snapshot(),),
+    ) as pool:
+        assert pool.submit(_cd_rgb).result() == (0.5, 0.75, 1.0)
+
+
+if __name__ == "__main__":
+    test_split_segments()
+    print("segment parallel tests passed.")
@@ -0,0 +1,120 @@
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from model.model_config import ModelConfig
+from model.processing.afterimage import render_afterimage
+from model.processing.afterimage_batch import AfterimageState, process_frame_sequence
+from model.utils.stage_cache import StageCache, file_digest, stage_key
+
+
+def test_stage_cache_hits_and_lru(tmp_path):
+    cache = StageCache(str(tmp_path), budget_mb=0.1)
+    array = np.arange(10000, dtype=np.float32)  # 40 kB
+    first, key = cache.stage('opsin', ('a',), lambda: array)
+    assert key == stage_key('opsin', ('a',))
+    loaded, _ = cache.stage('opsin', ('a',), lambda: None)
+    assert isinstance(loaded, np.memmap) and np.array_equal(loaded, array)
+    assert cache.stats['opsin'] == {'hits': 1, 'misses': 1}
+
+    # Two more entries exceed the 100 kB budget; 'b' was used least recently and goes.
+    cache.stage('opsin', ('b',), lambda: array)
+    cache.get('opsin', key)
+    cache.stage('opsin', ('c',), lambda: array)
+    assert cache.evicted == 1
+    assert cache.get('opsin', stage_key('opsin', ('b',))) is None
+    assert cache.get('opsin', key) is not None
+    assert cache.nbytes == 2 * os.path.getsize(cache._path('opsin', key))
+
+
+def test_stage_cache_indexes_the_folder_once(tmp_path, monkeypatch):
+    array = np.arange(10000, dtype=np.float32)  # 40 kB
+    first = StageCache(str(tmp_path), budget_mb=0.1)
+    for name in ('a', 'b'):
+        first.put('opsin', name, array)
+    os.utime(first._path('opsin', 'a'), ns=(0, 0))
+    cache = StageCache(str(tmp_path), budget_mb=0.1)
+    assert cache.nbytes == first.nbytes
+
+    def scandir(path):
+        raise AssertionError("the folder is listed again")
+
+    monkeypatch.setattr(os, 'scandir', scandir)
+    cache.put('opsin', 'c', array)
+    assert cache.evicted == 1 and cache.get('opsin', 'a') is None
+    assert cache.get('opsin', 'c') is not None
+
+
+def test_threads_put_the_same_key(tmp_path):
+    cache = StageCache(str(tmp_path), budget_mb=0.05)
+    array = np.arange(5000, dtype=np.float32)
+    with ThreadPoolExecutor(4) as pool:
+        list(pool.map(lambda i: cache.put('decode', f"key{i % 3}", array), range(200)))
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.tmp')]
+
+
+def test_file_digest_hashes_the_content(tmp_path):
+    path = tmp_path / "data.bin"
+    data = os.urandom(3 * 2 ** 20 + 5)
+    path.write_bytes(data)
+    assert file_digest(str(path)) == hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def test_stage_key_follows_config(monkeypatch):
+    key = stage_key('opsin', ('a',))
+    monkeypatch.setattr(ModelConfig, 'INTENSITY', 3.0)
+    assert stage_key('opsin', ('a',)) == key
+    monkeypatch.setattr(ModelConfig, 'CD_RGB', (0.2, 0.2, 0.2))
+    assert stage_key('opsin', ('a',)) != key
+
+
+def test_intensity_change_only_recomposites(tmp_path, monkeypatch):
+    input_folder = tmp_path / "input"
+    input_folder.mkdir()
+    rng = np.random.default_rng(0)
+    for i in range(4):
+        cv2.imwrite(
+            str(input_folder / f"frame_{i:04d}.png"),
+            rng.integers(0, 256, (8, 8, 3), dtype=np.uint8),
+        )
+
+    process_frame_sequence(
+        str(input_folder),
+        str(tmp_path / "first"),
+        cache=StageCache(str(tmp_path / "cache")),
+    )
+    monkeypatch.setattr(ModelConfig, 'INTENSITY', 0.5)
+    cache = StageCache(str(tmp_path / "cache"))
+    process_frame_sequence(str(input_folder), str(tmp_path / "cached"), cache=cache)
+    assert cache.stats['opsin'] == {'hits': 4, 'misses': 0}
+    assert cache.stats['decode'] == {'hits': 4, 'misses': 0}
+
+    process_frame_sequence(str(input_folder), str(tmp_path / "uncached"))
+    for fname in os.listdir(input_folder):
+        cached = cv2.imread(str(tmp_path / "cached" / fname))
+        assert np.array_equal(cached, cv2.imread(str(tmp_path / "uncached" / fname)))
+        assert not np.array_equal(cached, cv2.imread(str(tmp_path / "first" / fname)))
+
+
+def test_opsin_keys_depend_on_the_layout(tmp_path):
+    frame = np.random.default_rng(2).integers(0, 256, (6, 8, 3), dtype=np.uint8)
+    cache = StageCache(str(tmp_path))
+    for layout in ('RGB', 'BGR'):
+        AfterimageState(layout=layout).step(frame, cache=cache, source="clip#0")
+    assert cache.stats['opsin'] == {'hits': 0, 'misses': 2}
+
+
+def test_render_afterimage_reuses_kinetics(tmp_path, monkeypatch):
+    path = str(tmp_path / "input.png")
+    cv2.imwrite(
+        path, np.random.default_rng(1).integers(0, 256, (12, 10, 3), dtype=np.uint8)
+    )
+    cache = StageCache(str(tmp_path / "cache"))
+    render_afterimage(path, 'opponent', cache)
+    monkeypatch.setitem(ModelConfig.OPPONENT_PARAMS, 'alpha', 0.2)
+    cached = render_afterimage(path, 'opponent', cache)
+    assert cache.stats['opponent_opsin'] == {'hits': 1, 'misses': 1}
+    assert np.allclose(cached, render_afterimage(path, 'opponent'))
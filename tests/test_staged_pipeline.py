@@ -0,0 +1,62 @@
+import random
+import time
+
+import pytest
+
+from model.utils.staged_pipeline import run_staged
+
+
+def _slow_read(item):
+    time.sleep(random.random() * 0.002)
+    return item * 2
+
+
+def test_compute_and_single_writer_see_items_in_order():
+    computed, written = [], []
+
+    def compute(item, data):
+        computed.append(item)
+        return data + 1
+
+    stats = run_staged(
+        range(50),
+        _slow_read,
+        compute,
+        lambda item, result: written.append(result),
+        readers=4,
+        writers=1,
+        max_in_flight=5,
+    )
+    assert computed == list(range(50))
+    assert written == [2 * i + 1 for i in range(50)]
+    assert stats['items'] == 50
+    assert set(stats['stages']) == {'read', 'compute', 'write'}
+
+
+def test_serial_and_error_propagation():
+    written = []
+    run_staged(
+        [1, 2, 3],
+        _slow_read,
+        lambda item, data: data,
+        lambda item, result: written.append(result),
+    )
+    assert written == [2, 4, 6]
+
+    def failing_compute(item, data):
+        raise ValueError(item)
+
+    with pytest.raises(ValueError):
+        run_staged(
+            range(10),
+            _slow_read,
+            failing_compute,
+            lambda item, result: None,
+            readers=2,
+            writers=2,
+        )
+
+
+if __name__ == "__main__":
+    test_compute_and_single_writer_see_items_in_order()
+    print("staged pipeline tests passed.")
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from model.processing import tile_parallel
+from model.processing.afterimage_batch import AfterimageState
+from model.processing.tile_parallel import TileParallelEngine, split_bands
+from model.utils.file_utils import to_uint8
+
+
+def test_split_bands_covers_all_rows():
+    bands = split_bands(100, 3, tile_rows=7)
+    rows = sorted(
+        row for worker in bands for start, stop in worker for row in range(start, stop)
+    )
+    assert rows == list(range(100))
+
+
+def test_tile_parallel_engine_is_bit_identical():
+    rng = np.random.default_rng(0)
+    frames = [rng.integers(0, 256, (37, 20, 3), dtype=np.uint8) for _ in range(3)]
+
+    state = AfterimageState()
+    with TileParallelEngine(frames[0].shape, workers=2, tile_rows=5) as engine:
+        for frame in frames:
+            afterimage, overlay = state.step(frame)
+
+            parallel_afterimage, parallel_overlay = engine.process(frame)
+            assert np.array_equal(parallel_afterimage, to_uint8(afterimage))
+            assert np.array_equal(parallel_overlay, overlay)
+
+
+def test_engine_runs_serially_without_fork(monkeypatch):
+    monkeypatch.setattr(tile_parallel, 'FORK_AVAILABLE', False)
+    rng = np.random.default_rng(0)
+    frames = [rng.integers(0, 256, (37, 20, 3), dtype=np.uint8) for _ in range(3)]
+
+    state = AfterimageState()
+    with TileParallelEngine(frames[0].shape, workers=2) as engine:
+        assert engine.workers == 0
+        for frame in frames:
+            afterimage, overlay = state.step(frame)
+            serial_afterimage, serial_overlay = engine.process(frame)
+            assert np.array_equal(serial_afterimage, to_uint8(afterimage))
+            assert np.array_equal(serial_overlay, overlay)
+
+
+def test_dead_worker_raises():
+    frame = np.zeros((8, 8, 3), dtype=np.uint8)
+    with TileParallelEngine(frame.shape, workers=2, timeout=2) as engine:
+        engine.process(frame)
+        engine._processes[0].kill()
+        engine._processes[0].join()
+        with pytest.raises(RuntimeError, match="exited"):
+            engine.process(frame)
+
+
+if __name__ == "__main__":
+    test_split_bands_covers_all_rows()
+    test_tile_parallel_engine_is_bit_identical()
+    print("tile parallel tests passed.")
@@ -0,0 +1,60 @@
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+from model.video.video_outputs import VideoOutputs
+
+
+def _frame_count(path):
+    cap = cv2.VideoCapture(str(path))
+    count = 0
+    while cap.read()[0]:
+        count += 1
+    cap.release()
+    return count
+
+
+def test_only_requested_renditions_are_written(tmp_path):
+    original = np.full((16, 24, 3), 200, dtype=np.uint8)
+    afterimage = np.full((16, 24, 3), 50, dtype=np.uint8)
+    with VideoOutputs(
+        str(tmp_path), ['blended', 'side_by_side'], fps=10, fourcc='mp4v'
+    ) as outputs:
+        assert outputs.needs_afterimage and not outputs.needs_overlay
+        for _ in range(3):
+            outputs.write(original, afterimage)
+
+    assert sorted(os.listdir(tmp_path)) == [
+        "blended_video.mp4",
+        "side_by_side_video.mp4",
+    ]
+    assert _frame_count(tmp_path / "blended_video.mp4") == 3
+    cap = cv2.VideoCapture(str(tmp_path / "side_by_side_video.mp4"))
+    size = (cap.get(cv2.CAP_PROP_FRAME_WIDTH), cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    assert size == (48, 16)
+    cap.release()
+
+
+def test_original_passthrough(tmp_path):
+    source = tmp_path / "source.mp4"
+    source.write_bytes(b"not decoded")
+    outputs = VideoOutputs(
+        str(tmp_path / "out"), ['original'], original_source=str(source)
+    )
+    assert outputs.encoded == []
+    outputs.write(np.zeros((4, 4, 3), dtype=np.uint8))
+    outputs.close()
+    assert (tmp_path / "out" / "original_video.mp4").read_bytes() == b"not decoded"
+
+
+def test_missing_rendition_input_is_rejected_before_encoding(tmp_path):
+    original = np.zeros((8, 8, 3), dtype=np.uint8)
+    with VideoOutputs(
+        str(tmp_path), ['original', 'persistent_overlay'], fourcc='mp4v'
+    ) as outputs:
+        with pytest.raises(ValueError, match="persistent_overlay"):
+            outputs.write(original)
+        outputs.write(original, overlay=original)
+    assert _frame_count(tmp_path / "persistent_overlay_video.mp4") == 1
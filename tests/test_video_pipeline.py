@@ -0,0 +1,93 @@
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+from model.core.anatomical import get_cone_density_map
+from model.processing.afterimage_batch import AfterimageState
+from model.utils.file_utils import to_uint8
+from model.utils.gaze_track import GazeTrack
+from model.utils.stage_cache import StageCache
+from model.video import process_video_pipeline
+from model.video.process_video_pipeline import iter_afterimage_frames, iter_video_frames
+
+
+def _write_video(path, frame_count, size=(32, 24), fps=20):
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*'MJPG'), fps, size)
+    for i in range(frame_count):
+        writer.write(np.full((size[1], size[0], 3), i * 10, dtype=np.uint8))
+    writer.release()
+
+
+def test_iter_video_frames_decimates(tmp_path):
+    video_path = tmp_path / "clip.avi"
+    _write_video(video_path, 10)
+    frames = list(iter_video_frames(str(video_path), fps_target=10))
+    assert len(frames) == 5
+    assert frames[0].shape == (24, 32, 3)
+
+
+@pytest.mark.parametrize(
+    "fps_target, copied", [(None, True), (20, True), (15, False), (19, False)]
+)
+def test_original_is_copied_only_at_the_source_rate(
+    tmp_path, monkeypatch, fps_target, copied
+):
+    video_path = tmp_path / "clip.avi"
+    _write_video(video_path, 4)
+    sources = []
+
+    class Outputs(process_video_pipeline.VideoOutputs):
+        def __init__(self, *args, original_source=None, **kwargs):
+            sources.append(original_source)
+            super().__init__(*args, **kwargs)
+
+    monkeypatch.setattr(process_video_pipeline, 'VideoOutputs', Outputs)
+    process_video_pipeline.stream_video_pipeline(
+        str(video_path),
+        str(tmp_path / "videos"),
+        fps_target,
+        renditions=('afterimage',),
+    )
+    assert sources == [str(video_path) if copied else None]
+
+
+def test_iter_afterimage_frames_dumps(tmp_path):
+    frames = [np.full((6, 8, 3), value, dtype=np.uint8) for value in (0, 128, 255)]
+    outputs = list(
+        iter_afterimage_frames(frames, afterimage_dir=str(tmp_path / "afterimage"))
+    )
+    assert len(outputs) == 3
+    for original, afterimage, overlay in outputs:
+        assert afterimage.shape == original.shape and afterimage.dtype == np.uint8
+        assert overlay.shape == original.shape and overlay.dtype == np.uint8
+    assert sorted(os.listdir(tmp_path / "afterimage" / "persistent_overlay")) == [
+        "frame_0000.jpg", "frame_0001.jpg", "frame_0002.jpg"]
+
+
+def test_iter_afterimage_frames_needs_a_source_to_cache(tmp_path):
+    frames = [np.zeros((6, 8, 3), dtype=np.uint8)]
+    with pytest.raises(ValueError):
+        next(iter_afterimage_frames(frames, cache=StageCache(str(tmp_path))))
+
+
+def test_iter_afterimage_frames_follows_the_gaze():
+    rng = np.random.default_rng(0)
+    frames = [rng.integers(0, 256, (20, 30, 3), dtype=np.uint8) for _ in range(3)]
+    track = GazeTrack([0, 1], [(5, 5), (25, 15)])
+    outputs = list(
+        iter_afterimage_frames(frames, overlay=False, gaze_track=track, fovea_radius=8)
+    )
+
+    state = AfterimageState(layout='BGR')
+    for i, (frame, (_, afterimage, _)) in enumerate(zip(frames, outputs)):
+        density = get_cone_density_map(frame.shape[:2], track.at(i), 8)[..., None]
+        expected, _ = state.step(frame * density / 255.0, overlay=False)
+        assert np.abs(afterimage.astype(int) - to_uint8(expected)).max() <= 1
+
+
+if __name__ == "__main__":
+    frames = [np.zeros((6, 8, 3), dtype=np.uint8)] * 2
+    assert len(list(iter_afterimage_frames(frames))) == 2
+    print("video pipeline tests passed.")